@@ -76,20 +76,13 @@ def generate_event_html(events):
     """
     html_buffer = '<div class="event-container">'
     
-    for raw_text in events:
-        lines = raw_text.split('\n')
-        info = {}
-        for line in lines:
-            if ": " in line:
-                key, val = line.split(": ", 1)
-                info[key.strip()] = val.strip()
-
-        title = info.get("Event", "Unknown Event")
-        date = info.get("Date", "TBD")
-        loc = info.get("Location", "Check URL")
-        cost = info.get("Cost", "Free")
-        url = info.get("Source", "#")
-        desc = info.get("Description", "")
+    for ev in events:
+        title = ev.title
+        date = ev.date
+        loc = ev.location
+        cost = ev.cost
+        url = ev.url
+        desc = ev.description
 
         card = f"""
         <div class="event-card">
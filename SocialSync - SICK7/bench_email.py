@@ -0,0 +1,153 @@
+"""
+Outbound email throughput against a local aiosmtpd server (pip install
+aiosmtpd). No real mail leaves the machine.
+
+    python bench_email.py [sends]    # default 1000
+
+Compares the old one-connection-per-email path with EmailQueue over the
+SMTP pool, then reruns the queue with the server rejecting every 10th
+first attempt (451) and restarting halfway (every pooled connection is
+dropped), to check that retries and reconnects still deliver every
+message exactly once. Loopback without TLS/login: against a real server
+the per-call handshake costs far more than it does here.
+"""
+import asyncio
+import socket
+import statistics
+import sys
+import time
+from aiosmtpd.controller import Controller
+
+from email_service import EmailQueue, SMTPPool, build_event_email
+
+EVENT = {
+    "title": "Techno Night @ Control",
+    "date": "2025-11-21 23:00",
+    "location": "Control Club",
+    "cost": "60 RON",
+    "description": "All night long.",
+    "url": "https://example.com/techno-night",
+}
+
+
+class CountingHandler:
+    """Accepts mail; optionally answers 451 to every `flaky`-th new recipient once."""
+
+    def __init__(self, flaky=0):
+        self.flaky = flaky
+        self.delivered = {}
+        self.attempts = {}
+
+    async def handle_DATA(self, server, session, envelope):
+        to = envelope.rcpt_tos[0]
+        self.attempts[to] = self.attempts.get(to, 0) + 1
+        index = int(to.split("@")[0].split("-")[1])
+        if self.flaky and index % self.flaky == 0 and self.attempts[to] == 1:
+            return "451 Try again later"
+        self.delivered[to] = self.delivered.get(to, 0) + 1
+        return "250 OK"
+
+
+def start_server(handler):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    return controller, port
+
+
+def bench_per_call(port, sends):
+    """The old send_event_email: connect, send, quit for every single email."""
+    import smtplib
+    start = time.perf_counter()
+    for i in range(sends):
+        to = f"user-{i}@example.com"
+        server = smtplib.SMTP("127.0.0.1", port)
+        server.sendmail("bench@example.com", to, build_event_email(to, EVENT))
+        server.quit()
+    return time.perf_counter() - start
+
+
+async def bench_queue(port, sends, pool_size, retry_base=0.05):
+    pool = SMTPPool(host="127.0.0.1", port=port, user="bench@example.com", password="",
+                    starttls=False, size=pool_size)
+    queue = EmailQueue(pool, retry_base=retry_base)
+    queue.start()
+
+    submit_times = []
+    start = time.perf_counter()
+    job_ids = []
+    for i in range(sends):
+        t = time.perf_counter()
+        job_ids.append(queue.submit(f"user-{i}@example.com", EVENT))
+        submit_times.append(time.perf_counter() - t)
+    await queue.join()
+    elapsed = time.perf_counter() - start
+
+    statuses = [queue.status(job_id)["status"] for job_id in job_ids]
+    metrics = queue.metrics()
+    await queue.stop()
+    return elapsed, statistics.median(submit_times), statuses, metrics
+
+
+async def check_recovery(handler, controller, port, sends):
+    pool = SMTPPool(host="127.0.0.1", port=port, user="bench@example.com", password="",
+                    starttls=False, size=4)
+    queue = EmailQueue(pool, retry_base=0.05)
+    queue.start()
+    start = time.perf_counter()
+    job_ids = [queue.submit(f"user-{i}@example.com", EVENT) for i in range(sends // 2)]
+    await queue.join()
+    controller.stop()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    job_ids += [queue.submit(f"user-{i}@example.com", EVENT) for i in range(sends // 2, sends)]
+    await queue.join()
+    elapsed = time.perf_counter() - start
+    statuses = [queue.status(job_id)["status"] for job_id in job_ids]
+    metrics = queue.metrics()
+    await queue.stop()
+    return elapsed, statuses, metrics, controller
+
+
+def main(sends):
+    ok = True
+
+    handler = CountingHandler()
+    controller, port = start_server(handler)
+    try:
+        elapsed = bench_per_call(port, sends)
+        print(f"   per-call connections : {sends / elapsed:7.0f} mails/s ({elapsed:.2f} s for {sends})")
+        for pool_size in (1, 4):
+            handler.delivered.clear()
+            handler.attempts.clear()
+            elapsed, submit, statuses, metrics = asyncio.run(bench_queue(port, sends, pool_size))
+            print(f"   queue, pool of {pool_size}     : {sends / elapsed:7.0f} mails/s ({elapsed:.2f} s) | "
+                  f"submit p50 {submit * 1e6:.0f} µs | {metrics['pool']['connects']} connections")
+            if statuses.count("sent") != sends or len(handler.delivered) != sends:
+                print(f"   ❌ Only {statuses.count('sent')}/{sends} mails delivered.")
+                ok = False
+    finally:
+        controller.stop()
+
+    # Transient 451s on every 10th mail, and a server restart halfway
+    handler = CountingHandler(flaky=10)
+    controller, port = start_server(handler)
+    try:
+        elapsed, statuses, metrics, controller = asyncio.run(check_recovery(handler, controller, port, sends))
+        duplicates = sum(1 for count in handler.delivered.values() if count > 1)
+        print(f"   flaky server         : {statuses.count('sent')}/{sends} sent, "
+              f"{metrics['retries']} retries, {metrics['pool']['reconnects']} reconnects, "
+              f"{duplicates} duplicates ({elapsed:.2f} s)")
+        if statuses.count("sent") != sends or duplicates or len(handler.delivered) != sends:
+            ok = False
+    finally:
+        controller.stop()
+
+    print("   ✅ Every mail delivered exactly once." if ok else "   ❌ Delivery check failed.")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000) else 1)
@@ -0,0 +1,155 @@
+"""
+Embedding throughput of embed_in_batches at concurrency 1 vs
+EMBED_CONCURRENCY, against a fake embedder with fixed per-request latency
+and an occasional 429. No network, no OpenAI key.
+
+    python bench_embedding.py [sizes ...]         # default: 100 10000 100000
+    python bench_embedding.py http [sizes ...]    # same sizes, over HTTP
+    BENCH_EMBED_LATENCY_MS=100 BENCH_DIM=1536 python bench_embedding.py http
+
+The default run calls a Python function. `http` goes through the
+OpenAIEmbeddings client ingest.py builds (max_retries=0, so 429s reach
+embed_with_backoff) against a local FakeEmbeddingServer. Texts go out as
+strings: token-splitting needs tiktoken's encoding files, which is not what
+this measures. Exits 1 if any vector comes back wrong or out of order.
+"""
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from embedding_pipeline import EMBED_BATCH_SIZE, EMBED_CONCURRENCY, embed_in_batches
+
+SIZES = (100, 10_000, 100_000)
+LATENCY = float(os.getenv("BENCH_EMBED_LATENCY_MS", "50")) / 1000
+DIM = int(os.getenv("BENCH_DIM", "256"))
+
+
+class FakeEmbeddingServer:
+    """
+    Local stand-in for POST {OPENAI_BASE_URL}/embeddings: answers after
+    `latency` seconds, and every `rate_limit_every`-th request gets a 429
+    like the real API's. Vectors are [len(input) % 7] * dim.
+    """
+
+    def __init__(self, latency=LATENCY, dim=DIM, rate_limit_every=25):
+        self.latency = latency
+        self.dim = dim
+        self.rate_limit_every = rate_limit_every
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "rate_limited": 0}
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, payload = fake.respond(body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def respond(self, body):
+        with self.lock:
+            self.stats["requests"] += 1
+            n = self.stats["requests"]
+            limited = self.rate_limit_every and n % self.rate_limit_every == 0
+            if limited:
+                self.stats["rate_limited"] += 1
+        time.sleep(self.latency)
+        if limited:
+            return 429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        data = []
+        for i, item in enumerate(inputs):
+            vector = expected_vector(item)
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(len(item) for item in inputs)
+        return 200, {"object": "list", "data": data, "model": body.get("model"),
+                     "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    def close(self):
+        self.server.shutdown()
+
+
+def expected_vector(text):
+    return [float(len(text) % 7)] * DIM
+
+
+def synthetic_texts(size):
+    texts = [f"Event: Synthetic {i}\nCategory: Concert\nDate: 2026-01-{1 + i % 28:02d}" for i in range(size)]
+    return texts, [str(i) for i in range(size)]
+
+
+def run(label, sizes, embed_fn, server=None):
+    """Embeds each size at both concurrencies; True if every vector came back, in order."""
+    print(f"\n🧮 {label} ({LATENCY * 1000:.0f} ms per request, batches of {EMBED_BATCH_SIZE})")
+    ok = True
+    for size in sizes:
+        texts, hashes = synthetic_texts(size)
+        for concurrency in (1, EMBED_CONCURRENCY):
+            before = dict(server.stats) if server else None
+            vectors, stats = embed_in_batches(texts, hashes, embed_fn, batch_size=EMBED_BATCH_SIZE,
+                                              concurrency=concurrency)
+            correct = all(v == expected_vector(t) for t, v in zip(texts, vectors))
+            ok = ok and correct
+            line = f"   {size:>7,} docs, concurrency {concurrency}: {stats['docs_per_second']} docs/s"
+            if server:
+                line += (f" | {server.stats['requests'] - before['requests']} requests, "
+                         f"{server.stats['rate_limited'] - before['rate_limited']} answered 429 and retried")
+            print(f"{line} | vectors {'✅ complete' if correct else '❌ wrong or missing'}")
+    return ok
+
+
+def bench_function(sizes, rate_limit_every=50):
+    class FakeRateLimit(Exception):
+        status_code = 429
+
+    calls = {"n": 0}
+    lock = threading.Lock()
+
+    def fake_embed(texts):
+        with lock:
+            calls["n"] += 1
+            n = calls["n"]
+        time.sleep(LATENCY)
+        if rate_limit_every and n % rate_limit_every == 0:
+            raise FakeRateLimit("429 Too Many Requests")
+        return [expected_vector(t) for t in texts]
+
+    return run("In-process fake embedder", sizes, fake_embed)
+
+
+def bench_http(sizes):
+    from langchain_openai import OpenAIEmbeddings
+
+    server = FakeEmbeddingServer()
+    embeddings = OpenAIEmbeddings(model="text-embedding-3-small", max_retries=0, base_url=server.base_url,
+                                  api_key="bench", check_embedding_ctx_length=False)
+    try:
+        return run("OpenAIEmbeddings -> FakeEmbeddingServer", sizes, embeddings.embed_documents, server)
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    http = args[:1] == ["http"]
+    sizes = [int(a) for a in args[http:]] or SIZES
+    ok = bench_http(sizes) if http else bench_function(sizes)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,161 @@
+"""
+History compaction over a long conversation: prompt tokens sent and /chat
+latency per turn index, for one scripted 50-turn conversation, with
+compaction on (HISTORY_TOKEN_BUDGET / HISTORY_KEEP_TURNS) and off.
+
+    python bench_history.py
+    BENCH_REPLAYS=5 BENCH_LLM_DELAY_MS=300 BENCH_LLM_MS_PER_1K=50 python bench_history.py
+
+Offline, through main.app like bench_replay (scripted LLM, hashed
+embeddings). The scripted model answers after BENCH_LLM_DELAY_MS (default
+200) plus BENCH_LLM_MS_PER_1K per 1000 prompt tokens (default 30): both are
+assumptions standing in for a real model's fixed and prompt-size cost.
+Tokens are per turn, every LLM call of the turn included (the chat reply,
+search follow-ups and, with compaction, the summarizer call). Latency is
+the median over BENCH_REPLAYS runs (default 3).
+"""
+import os
+import sys
+
+os.environ.setdefault("BENCH_LLM_DELAY_MS", "200")
+
+import asyncio
+import contextlib
+import io
+import shutil
+import statistics
+import time
+
+import httpx
+
+import bench_replay
+import rag_logic
+from bench_replay import current_turn
+
+REPLAYS = int(os.getenv("BENCH_REPLAYS", "3"))
+MS_PER_1K = float(os.getenv("BENCH_LLM_MS_PER_1K", "30"))
+
+# --- THE CONVERSATION ---
+# Ten 5-turn episodes: two chat turns, a search, a "more" search, moving on
+TOPICS = [
+    ("jazz", "jazz concert", "jazz live music"),
+    ("techno", "dj set techno party", "party club night"),
+    ("theatre", "comedie teatru", "teatru spectacol"),
+    ("stand-up", "stand-up comedy", "comedy show"),
+    ("art", "expozitie de arta", "art exhibition gallery"),
+    ("kids shows", "teatru pentru copii", "spectacol copii"),
+    ("christmas markets", "targ de craciun", "christmas fair"),
+    ("wine", "afternoon tea wine tasting", "culinary experience"),
+    ("rock", "rock concert", "live band"),
+    ("dancing", "dance workshop", "tango"),
+]
+
+
+def long_conversation():
+    turns = []
+    for topic, query, more_query in TOPICS:
+        turns += [
+            (f"what about {topic}?",
+             f"Ooh, {topic}! Tell me a bit more about the mood: a low-key evening with a couple of friends, "
+             f"or something with big energy where you lose track of time?"),
+            (f"low-key, good {topic} and a drink",
+             "Perfect, that paints a picture: relaxed, social, not too loud, somewhere you can actually talk. "
+             "Any budget or area I should keep in mind before I pull up the list?"),
+            (f"no limits for the {topic}, just go", f"Here we go!\n**SEARCH_ACTION:** {query}"),
+            (f"more {topic} please", f"Digging deeper!\n**SEARCH_ACTION:** {more_query}"),
+            (f"ok, noted the {topic} ones, let's think about something else",
+             "Sure thing, I'll keep those in the back pocket. What else is on your mind for the week, "
+             "anything you've been meaning to try?"),
+        ]
+    return {"name": "long", "logged_in": False, "turns": turns}
+
+
+LONG = long_conversation()
+
+
+class SizedLLM(bench_replay.ScriptedLLM):
+    """The scripted LLM, plus a delay that grows with the prompt."""
+
+    async def ainvoke(self, messages):
+        if MS_PER_1K:
+            await asyncio.sleep(rag_logic.count_tokens(messages) / 1000 * MS_PER_1K / 1000)
+        return await super().ainvoke(messages)
+
+
+async def no_compaction(self, budget=None, keep_turns=None):
+    return False
+
+
+async def replay(client, session_id):
+    """Per-turn (prompt tokens, LLM calls, latency)."""
+    rows = []
+    for message, _ in LONG["turns"]:
+        counters = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        token = current_turn.set(counters)
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat", json={"message": message, "session_id": session_id})
+            response.raise_for_status()
+        finally:
+            current_turn.reset(token)
+        rows.append((counters["prompt_tokens"], counters["llm_calls"], time.perf_counter() - start))
+    return rows
+
+
+async def bench():
+    import main as api
+    compact = rag_logic.SocialSyncAgent.compact_history
+    await api.start_background_workers()
+    await api.warm_up_task
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            for mode in ("on", "off"):
+                rag_logic.SocialSyncAgent.compact_history = compact if mode == "on" else no_compaction
+                runs = []
+                # The app prints a debug line for every search
+                with contextlib.redirect_stdout(io.StringIO()):
+                    for i in range(REPLAYS):
+                        runs.append(await replay(client, f"{mode}-{i}"))
+                results[mode] = [
+                    (turn[0][0], turn[0][1], statistics.median(latency for _, _, latency in turn))
+                    for turn in zip(*runs)
+                ]
+    finally:
+        rag_logic.SocialSyncAgent.compact_history = compact
+        await api.stop_background_workers()
+    return results
+
+
+def print_report(results):
+    on, off = results["on"], results["off"]
+    print(f"   {'turn':>4} | compaction on: tokens calls  latency ms | off: tokens calls  latency ms")
+    for i, ((t_on, c_on, l_on), (t_off, c_off, l_off)) in enumerate(zip(on, off), 1):
+        print(f"   {i:>4} | {t_on:>20} {c_on:>5} {l_on * 1000:11.0f} | {t_off:>11} {c_off:>5} {l_off * 1000:11.0f}")
+    for mode, rows in results.items():
+        latencies = sorted(latency for _, _, latency in rows)
+        last = rows[-10:]
+        print(f"   compaction {mode:<3}: {sum(t for t, _, _ in rows):>7} prompt tokens in {len(rows)} turns, "
+              f"{sum(c for _, c, _ in rows)} LLM calls | last 10 turns {statistics.mean(t for t, _, _ in last):.0f} "
+              f"tokens/turn | latency p50 {statistics.median(latencies) * 1000:.0f} ms, "
+              f"max {latencies[-1] * 1000:.0f} ms, last 10 turns {statistics.mean(l for _, _, l in last) * 1000:.0f} ms")
+
+
+def main():
+    bench_replay.SCRIPT.update(dict(LONG["turns"]))
+    store, keyword_index = bench_replay.build_index()
+    rag_logic.set_resources(llm=SizedLLM(), embeddings=bench_replay.FakeEmbeddings(), vector_db=store,
+                            keyword_index=keyword_index)
+    print(f"   {len(LONG['turns'])}-turn conversation x {REPLAYS} replays, LLM {bench_replay.LLM_DELAY * 1000:.0f} ms "
+          f"+ {MS_PER_1K:.0f} ms per 1k prompt tokens, budget {rag_logic.HISTORY_TOKEN_BUDGET} tokens, "
+          f"keep {rag_logic.HISTORY_KEEP_TURNS} turns\n")
+    print_report(asyncio.run(bench()))
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(bench_replay.WORKDIR, ignore_errors=True)
+    sys.exit(0)
@@ -0,0 +1,109 @@
+"""
+Import-time budget for the API: `import main` must stay fast and must not
+need credentials (LLM / embeddings / Chroma are built lazily, see
+rag_logic.Resources).
+
+    python bench_import.py [budget_ms]    # default IMPORT_BUDGET_MS or 1500
+
+Runs `python -X importtime -c "import main"` in fresh interpreters without
+OPENAI_API_KEY, reports the median and the heaviest imports, and exits 1 if
+the budget is blown, a heavy client library is imported eagerly or the
+import creates files (caches and stores are opened at startup).
+"""
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+RUNS = 5
+# Only allowed once a request actually needs them
+LAZY_MODULES = ("openai", "langchain_openai", "chromadb", "langchain_chroma", "tiktoken")
+
+# Must not appear in the working directory just because main was imported
+SIDE_EFFECT_FILES = ("query_cache.db", "users.db", "sessions.db")
+# Copied into the directory first: the users.json -> users.db migration must wait for startup too
+SEED_FILES = ("users.json",)
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure_once(module="main"):
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(cumulative_us), len(indent)))
+    total = next(cumulative for name, cumulative, _ in entries if name == module)
+    return total / 1000, entries
+
+
+def files_created(module="main"):
+    """Files from SIDE_EFFECT_FILES that `import module` creates, run from an empty directory."""
+    source = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix="bench_import_")
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    env["PYTHONPATH"] = source
+    for name in ("QUERY_CACHE_FILE", "USERS_DB_FILE", "SESSIONS_DB_FILE"):
+        env.pop(name, None)
+    for name in SEED_FILES:
+        if os.path.exists(os.path.join(source, name)):
+            shutil.copy(os.path.join(source, name), workdir)
+    try:
+        result = subprocess.run([sys.executable, "-c", f"import {module}"], capture_output=True, text=True,
+                                env=env, cwd=workdir)
+        if result.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+        return sorted(set(os.listdir(workdir)) & set(SIDE_EFFECT_FILES))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def check(budget_ms=IMPORT_BUDGET_MS):
+    totals = []
+    for _ in range(RUNS):
+        total_ms, entries = measure_once()
+        totals.append(total_ms)
+    median = statistics.median(totals)
+
+    # Heaviest direct imports of main: importtime lists children (indented
+    # one step deeper) right before their parent
+    main_at = next(i for i, e in enumerate(entries) if e[0] == "main")
+    children = []
+    for name, cumulative_us, indent in reversed(entries[:main_at]):
+        if indent <= entries[main_at][2]:
+            break
+        if indent == entries[main_at][2] + 2:
+            children.append((name, cumulative_us, indent))
+    heaviest = sorted(children, key=lambda e: -e[1])[:8]
+    print(f"   import main: median {median:.0f} ms over {RUNS} runs (budget {budget_ms:.0f} ms)")
+    for name, cumulative_us, _ in heaviest:
+        print(f"      {cumulative_us / 1000:8.1f} ms  {name}")
+
+    eager = sorted({name.split(".")[0] for name, _, _ in entries} & set(LAZY_MODULES))
+    if eager:
+        print(f"   ❌ Imported eagerly: {', '.join(eager)}")
+    created = files_created()
+    if created:
+        print(f"   ❌ Created at import: {', '.join(created)}")
+    if median > budget_ms:
+        print("   ❌ Over budget.")
+    ok = not eager and not created and median <= budget_ms
+    if ok:
+        print("   ✅ Within budget.")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check(*(float(a) for a in sys.argv[1:2])) else 1)
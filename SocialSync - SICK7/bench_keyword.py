@@ -0,0 +1,303 @@
+"""
+Keyword fast path: ranking quality and latency of BM25, vector and fused
+(RRF) retrieval over the real events in data_raw/scraped_events.txt.
+
+    python bench_keyword.py                     # stand-in embeddings, no network
+    BENCH_OPENAI=1 python bench_keyword.py      # real text-embedding-3-small
+
+Quality: nDCG@5, recall@5 and MRR on two labeled query sets.
+- HAND_LABELED: queries phrased the way people ask ("something for the
+  kids", "a night of dancing"), relevant events picked by hand by event_id,
+  mostly from what the event is rather than the words it uses. This is the
+  set to judge fused vs vector on.
+- LABELED_QUERIES: rules over the event fields (category + words in
+  title/description), the kind of query the assistant writes into
+  SEARCH_ACTION. BM25 is graded against its own criterion here, so it only
+  checks that keyword hits are not lost in the fusion.
+Without BENCH_OPENAI the "vector" ranking uses hashed character trigrams, a
+lexical stand-in: it shows the plumbing and a fuzzy-match baseline, not what
+OpenAI would score. Run with BENCH_OPENAI=1 before reading anything into
+fused vs vector.
+
+Latency: retrieve_events end to end with an embedding API that takes
+BENCH_EMBED_DELAY_MS per call (default 400), for a warm query (cached
+embedding), a cold one before the API is known to be slow (waits the
+EMBED_BUDGET_MS budget) and cold ones once it is (keyword results at once).
+"""
+import contextlib
+import io
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_keyword_")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["QUERY_CACHE_FILE"] = os.path.join(WORKDIR, "query_cache.db")
+
+import numpy as np
+
+import rag_logic
+from event_records import event_from_metadata, event_metadata
+from keyword_index import KeywordIndex, build_keyword_index, fold
+from local_index import LocalIndex, build_local_index
+
+EVENTS_FILE = os.path.join("data_raw", "scraped_events.txt")
+USE_OPENAI = os.getenv("BENCH_OPENAI", "0") == "1"
+EMBED_DELAY = float(os.getenv("BENCH_EMBED_DELAY_MS", "400")) / 1000
+K = 5
+DIM = 512
+
+
+def words(meta):
+    return fold(f"{meta['title']} {meta['description']}")
+
+
+def has(*terms):
+    return lambda meta: any(term in words(meta) for term in terms)
+
+
+def category(*keys):
+    return lambda meta: meta["category_key"] in keys
+
+
+def both(a, b):
+    return lambda meta: a(meta) and b(meta)
+
+
+# query -> relevant event_ids, picked by hand from data_raw/scraped_events.txt
+HAND_LABELED = {
+    "something for the kids": {
+        7412761472421671, 361185242506549, 5869378676288724, 1780320701523939, 4200861859203372,
+        303577332543084, 2140604091388656, 913099689544508, 2901237087086844, 3911480232651027,
+        3617217461036602, 5963243490189569, 3714119947145599, 4882669615574298, 3592748961503145,
+        3824439283774024, 6394679492542247, 1824257581788670, 816545657859031, 6936120006364654,
+    },
+    "a night of dancing at a club": {
+        1984134494599474, 8132869744337957, 1016687554871970, 7420851768216002, 6445327961689513,
+        3993663460587, 3210169808674505, 8917654340124667,
+    },
+    "classical music evening": {
+        7973447762240968, 5013683977394032, 3336128101390516, 4704008001405142,
+    },
+    "live Romanian folk music": {
+        1848134279585131, 8139093861015532, 6622939778479553, 4703109700850602, 4989285323231356,
+        5571130234183862, 1506740443002266,
+    },
+    "I want to laugh": {4475301895643804, 2395327613626195, 2239433831639585},
+    "christmas shopping outdoors": {
+        5966752407625686, 4914613648113656, 3891360493231259, 6853304309732360, 4310025113011708,
+        5797313313687787, 4203076814632115,
+    },
+    "Shakespeare": {7967478049606624, 5928307023369176, 8622246821948321},
+    "tea and cake in the afternoon": {8218235900673098, 8400397913845183},
+    "see some art": {2731152033397337, 6619693457065219},
+    "operetta": {5759429180356754, 5514134763986805},
+    "visit a landmark with a guide": {7123396484752334, 6416306034296677},
+    "watch a game": {5893638472771402},
+    "the nutcracker": {3729343559392550},
+    "jazz brunch or jazz evening": {1725095085552374, 3695530446485228, 2131855558505698},
+    "rock and roll": {480983498399918, 5315968912585187},
+    "throwback to the 2000s": {486451055489674, 1016687554871970},
+}
+
+# query -> rule for which events are relevant
+LABELED_QUERIES = {
+    "stand-up comedy": has("stand-up"),
+    "targ de craciun": both(category("fair"), has("craciun", "christmas")),
+    "christmas market": both(category("fair"), has("craciun", "christmas")),
+    "teatru pentru copii": both(category("theater", "junior"), has("copii", "children")),
+    "children's show": both(category("theater", "junior"), has("copii", "children")),
+    "jazz": has("jazz"),
+    "recital de pian": has("pian"),
+    "balet spargatorul de nuci": both(category("ballet"), has("spargatorul")),
+    "DJ set club night": both(category("party"), has("dj")),
+    "afternoon tea": category("culinary"),
+    "expozitie de arta": category("exhibition"),
+    "muzica lautareasca cu taraf": has("taraf", "lautaresc"),
+    "comedie romantica la teatru": both(category("theater"), has("comed")),
+    "tur ghidat palatul parlamentului": category("tour"),
+    "concert de craciun": both(category("concert"), has("craciun", "christmas")),
+    "meci de baschet": category("sports"),
+    "seara la berarie": both(category("party"), has("berarie")),
+    "greek music night": has("greceasca"),
+    "tango": has("tango"),
+    "anniversary party": both(category("party"), has("anniversary")),
+    "dance workshop": both(category("workshop"), has("dance")),
+    "rock concert": both(category("concert"), has("rock")),
+}
+
+
+def load_events():
+    with open(EVENTS_FILE, "r", encoding="utf-8") as f:
+        chunks = [c.strip() for c in f.read().split("\n\n") if "Event:" in c]
+    texts, metadatas, seen = [], [], set()
+    for chunk in chunks:
+        meta = event_metadata(chunk)
+        if meta["event_id"] not in seen:
+            seen.add(meta["event_id"])
+            texts.append(chunk)
+            metadatas.append(meta)
+    return texts, metadatas
+
+
+class TrigramEmbeddings:
+    """Hashed character trigrams of the folded text."""
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def _embed(self, text):
+        vector = np.zeros(DIM, dtype=np.float32)
+        for word in fold(text).split():
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                vector[zlib.crc32(padded[i:i + 3].encode("utf-8")) % DIM] += 1
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+
+class SlowEmbeddings:
+    """The embedding API at EMBED_DELAY per call."""
+
+    def __init__(self, inner, delay):
+        self.inner = inner
+        self.delay = delay
+
+    def embed_query(self, text):
+        time.sleep(self.delay)
+        return self.inner.embed_query(text)
+
+
+# --- QUALITY ---
+def ndcg(ranked, relevant):
+    dcg = sum(1 / math.log2(i + 2) for i, doc in enumerate(ranked[:K]) if doc in relevant)
+    ideal = sum(1 / math.log2(i + 2) for i in range(min(K, len(relevant))))
+    return dcg / ideal
+
+
+def recall(ranked, relevant):
+    return len(set(ranked[:K]) & relevant) / min(K, len(relevant))
+
+
+def mrr(ranked, relevant):
+    return next((1 / (i + 1) for i, doc in enumerate(ranked) if doc in relevant), 0.0)
+
+
+def quality(embeddings, vectors, metadatas, index, labels, title):
+    events = [event_from_metadata(meta) for meta in metadatas]
+    scores = {"bm25": [], "vector": [], "fused": []}
+    misses = []
+    for query, relevant in labels.items():
+        if not relevant:
+            continue
+        keyword_events = [event_from_metadata(meta) for _, _, meta in index.search(query, limit=20)]
+        similarity = vectors @ np.asarray(embeddings.embed_query(f"Event in Bucharest: {query}"))
+        vector_events = [events[i] for i in np.argsort(-similarity, kind="stable")[:20]]
+        rankings = {
+            "bm25": keyword_events,
+            "vector": vector_events,
+            "fused": rag_logic.fuse_rankings(vector_events, keyword_events, 20) if keyword_events else vector_events,
+        }
+        for name, ranking in rankings.items():
+            ids = [event.id for event in ranking]
+            scores[name].append((ndcg(ids, relevant), recall(ids, relevant), mrr(ids, relevant)))
+        if not keyword_events:
+            misses.append(query)
+
+    print(f"\n🎯 Ranking quality, {len(scores['bm25'])} {title} "
+          f"({'OpenAI' if USE_OPENAI else 'trigram stand-in'} vectors)")
+    for name, rows in scores.items():
+        ndcg_5, recall_5, rr = (statistics.mean(column) for column in zip(*rows))
+        print(f"   {name:<7} nDCG@{K} {ndcg_5:.3f} | recall@{K} {recall_5:.3f} | MRR {rr:.3f}")
+    print(f"   no keyword hit (vector only): {', '.join(misses) or 'none'}")
+
+
+# --- LATENCY ---
+def timed(agent, query, repeat=1):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        agent.retrieve_events(query, k=K)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def latency(embeddings, path, index):
+    rag_logic.set_resources(embeddings=SlowEmbeddings(embeddings, EMBED_DELAY), vector_db=LocalIndex(path),
+                            keyword_index=index)
+    agent = rag_logic.SocialSyncAgent()
+    queries = list(LABELED_QUERIES)
+    # retrieve_events prints a debug line per search
+    with contextlib.redirect_stdout(io.StringIO()):
+        # Nothing known about the API yet: waits out the budget
+        first_slow = timed(agent, queries[0])
+        degraded = [timed(agent, query) for query in queries[1:] if index.search(query)]
+        rag_logic.KEYWORD_SEARCH = False
+        vector_cold = timed(agent, "something fun tonight")
+        vector_warm = timed(agent, "something fun tonight", repeat=20)
+        rag_logic.KEYWORD_SEARCH = True
+        # Let the late embedding calls land in the cache
+        while rag_logic.pending_embeddings:
+            time.sleep(0.05)
+        fused_warm = timed(agent, queries[0], repeat=20)
+
+    print(f"\n⏱️  retrieve_events, embedding API at {EMBED_DELAY * 1000:.0f} ms, "
+          f"budget {rag_logic.EMBED_BUDGET_MS:.0f} ms, {len(index)} events")
+    print(f"   vector only, cold embedding     {vector_cold * 1000:9.2f} ms")
+    print(f"   vector only, cached embedding   {vector_warm * 1000:9.2f} ms")
+    print(f"   fused, cached embedding         {fused_warm * 1000:9.2f} ms")
+    print(f"   keyword, first slow call        {first_slow * 1000:9.2f} ms")
+    print(f"   keyword, API known slow (p50)   {statistics.median(degraded) * 1000:9.2f} ms "
+          f"(max {max(degraded) * 1000:.2f} ms)")
+    print(f"   paths: {rag_logic.cache_stats()['retrieval_paths']}")
+
+
+def main():
+    texts, metadatas = load_events()
+    ids = [str(meta["event_id"]) for meta in metadatas]
+    if USE_OPENAI:
+        from langchain_openai import OpenAIEmbeddings
+        embeddings = OpenAIEmbeddings(model=rag_logic.EMBEDDING_MODEL)
+    else:
+        embeddings = TrigramEmbeddings()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    build_local_index(WORKDIR, ids, vectors, texts, metadatas)
+    start = time.perf_counter()
+    build_keyword_index(WORKDIR, ids, metadatas)
+    print(f"   🔤 Keyword index: {len(ids)} events in {(time.perf_counter() - start) * 1000:.1f} ms")
+    index = KeywordIndex(WORKDIR)
+
+    start = time.perf_counter()
+    for _ in range(50):
+        for query in LABELED_QUERIES:
+            index.search(query, limit=20)
+    per_query = (time.perf_counter() - start) / (50 * len(LABELED_QUERIES))
+    print(f"   BM25 search: {per_query * 1e6:.0f} µs per query")
+
+    known = {meta["event_id"] for meta in metadatas}
+    hand = {query: relevant & known for query, relevant in HAND_LABELED.items()}
+    quality(embeddings, vectors, metadatas, index, hand, "hand-labeled queries")
+    if not USE_OPENAI:
+        print("   ⚠️  Trigram vectors are lexical too: run with BENCH_OPENAI=1 to compare fused vs real embeddings.")
+    rules = {query: {meta["event_id"] for meta in metadatas if rule(meta)} for query, rule in LABELED_QUERIES.items()}
+    quality(embeddings, vectors, metadatas, index, rules, "rule-labeled queries")
+    print("   ⚠️  Rule labels are words in title/description: BM25 is graded on its own criterion here.")
+    latency(embeddings, WORKDIR, index)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+    sys.exit(0)
@@ -0,0 +1,137 @@
+"""
+Load test for the bounded LLM calls (LLM_CONCURRENCY slots in rag_logic):
+p50/p99 /chat turn latency for a grid of slot counts x concurrent users,
+offline. The scripted LLM and the index come from bench_replay; the LLM
+answers after BENCH_LLM_DELAY_MS (default 100), so the time a turn spends
+waiting for a free slot shows up next to the time spent "in" the model.
+
+    python bench_llm_concurrency.py                          # slots 4 16 64 x users 8 32 128
+    python bench_llm_concurrency.py --slots 2 8 --users 16 64
+    BENCH_LLM_DELAY_MS=300 python bench_llm_concurrency.py
+
+Every user replays one recorded conversation, turn after turn, all users
+at once; background vibe checks share the slots, as they do in the API.
+"wait" is a turn's latency minus its LLM calls x the delay: queueing for a
+slot plus our own overhead. Turns cut off by LLM_TIMEOUT (504) are counted.
+"""
+import os
+import sys
+
+os.environ.setdefault("BENCH_LLM_DELAY_MS", "100")
+
+import asyncio
+import contextlib
+import io
+import shutil
+import time
+
+import httpx
+
+import bench_replay
+import rag_logic
+from bench_replay import CONVERSATIONS, LLM_DELAY, current_turn, percentiles
+
+SLOTS = (4, 16, 64)
+USERS = (8, 32, 128)
+
+
+async def user(client, conversation, session_id, turns):
+    for message, _ in conversation["turns"]:
+        counters = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        token = current_turn.set(counters)
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat", json={"message": message, "session_id": session_id})
+        finally:
+            current_turn.reset(token)
+        counters["latency"] = time.perf_counter() - start
+        counters["status"] = response.status_code
+        turns.append(counters)
+        if response.status_code != 200:
+            return
+
+
+async def run(client, api, slots, users):
+    # ainvoke/astream look the semaphore up on every call
+    rag_logic.llm_slots = asyncio.Semaphore(slots)
+    turns = []
+    start = time.perf_counter()
+    await asyncio.gather(*(user(client, CONVERSATIONS[i % len(CONVERSATIONS)], f"s{slots}-u{users}-{i}", turns)
+                           for i in range(users)))
+    elapsed = time.perf_counter() - start
+    # Let this run's background checks finish before the next one starts
+    stats = api.vibe_worker.stats
+    while stats["processed"] + stats["failed"] < stats["submitted"] - stats["superseded"]:
+        await asyncio.sleep(0.01)
+    done = [t for t in turns if t["status"] == 200]
+    return {
+        "turns": len(turns),
+        "turns_per_s": len(turns) / elapsed,
+        "latency": percentiles([t["latency"] for t in done]),
+        "wait": percentiles([t["latency"] - t["llm_calls"] * LLM_DELAY for t in done]),
+        "timeouts": sum(t["status"] == 504 for t in turns),
+        "errors": sum(t["status"] not in (200, 504) for t in turns),
+    }
+
+
+async def bench(slot_levels, user_levels):
+    import main as api
+    await api.start_background_workers()
+    await api.warm_up_task
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            print(f"   {'slots':>5} {'users':>5} | {'turns/s':>7} | latency ms   p50      p99 |"
+                  f" wait ms   p50      p99 | timeouts")
+            for slots in slot_levels:
+                for users in user_levels:
+                    # The app prints debug lines for every search and profile update
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        row = results[(slots, users)] = await run(client, api, slots, users)
+                    latency, wait = row["latency"], row["wait"]
+                    print(f"   {slots:>5} {users:>5} | {row['turns_per_s']:7.1f} | "
+                          f"{latency['p50'] * 1000:8.0f} {latency['p99'] * 1000:8.0f} | "
+                          f"{wait['p50'] * 1000:8.0f} {wait['p99'] * 1000:8.0f} | "
+                          f"{row['timeouts']:>4}/{row['turns']}" + (f" ({row['errors']} errors)" if row["errors"] else ""))
+    finally:
+        await api.stop_background_workers()
+    return results
+
+
+def print_grid(results, slot_levels, user_levels):
+    print("\n📈 p99 turn latency (ms), slots down, users across")
+    print("   " + " " * 7 + "".join(f"{users:>9}" for users in user_levels))
+    for slots in slot_levels:
+        print(f"   {slots:>5}  " + "".join(f"{results[(slots, users)]['latency']['p99'] * 1000:9.0f}"
+                                     for users in user_levels))
+
+
+def parse_levels(args):
+    levels = {"--slots": list(SLOTS), "--users": list(USERS)}
+    current = None
+    for arg in args:
+        if arg in levels:
+            current = arg
+            levels[current] = []
+        elif current:
+            levels[current].append(int(arg))
+    return levels["--slots"], levels["--users"]
+
+
+def main(args):
+    slot_levels, user_levels = parse_levels(args)
+    store, keyword_index = bench_replay.build_index()
+    rag_logic.set_resources(llm=bench_replay.ScriptedLLM(), embeddings=bench_replay.FakeEmbeddings(),
+                            vector_db=store, keyword_index=keyword_index)
+    print(f"   LLM delay {LLM_DELAY * 1000:.0f} ms, LLM_TIMEOUT {rag_logic.LLM_TIMEOUT:.0f} s, "
+          f"{len(keyword_index)} events\n")
+    results = asyncio.run(bench(slot_levels, user_levels))
+    print_grid(results, slot_levels, user_levels)
+
+
+if __name__ == "__main__":
+    try:
+        main(sys.argv[1:])
+    finally:
+        shutil.rmtree(bench_replay.WORKDIR, ignore_errors=True)
@@ -0,0 +1,306 @@
+"""
+End-to-end replay of recorded /chat conversations against main.app, offline:
+a scripted LLM and hashed bag-of-words embeddings are injected through
+rag_logic.set_resources, over a Chroma + keyword index of the real events in
+data_raw/scraped_events.txt. Requests go through httpx's ASGI transport, so
+no server, port or network is involved and the numbers can be compared run
+to run (e.g. in CI).
+
+    python bench_replay.py [concurrency ...]       # default: 1 8 32
+    BENCH_REPLAYS=20 BENCH_LLM_DELAY_MS=300 python bench_replay.py 8
+    SESSION_STORE=sqlite python bench_replay.py    # time SQLite session saves
+    BENCH_JSON=replay.json python bench_replay.py  # also write the report as JSON
+
+Each concurrency level replays every conversation BENCH_REPLAYS times
+(default 10), with up to `concurrency` conversations in flight; turns within
+one conversation stay sequential. Reported per turn: latency percentiles,
+LLM calls and prompt/completion tokens, retrieval time, and session save
+time (sessions.put; what save_db used to be). Background vibe assessments
+are counted separately, with their profile saves. The scripted LLM answers
+after BENCH_LLM_DELAY_MS (default 0, i.e. only our own overhead is timed).
+Caches are warmed with one untimed pass first, so every level measures the
+same steady state.
+"""
+import asyncio
+import contextlib
+import contextvars
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_replay_")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["USERS_DB_FILE"] = os.path.join(WORKDIR, "users.db")
+# An existing (empty) DB file: keeps user_store from importing ./users.json
+open(os.environ["USERS_DB_FILE"], "a").close()
+os.environ["SESSIONS_DB_FILE"] = os.path.join(WORKDIR, "sessions.db")
+os.environ["QUERY_CACHE_FILE"] = os.path.join(WORKDIR, "query_cache.db")
+
+import httpx
+from langchain_chroma import Chroma
+from langchain_core.messages import AIMessage, HumanMessage
+
+import rag_logic
+from bench_retrieval import fake_embed
+from event_records import event_metadata
+from keyword_index import KeywordIndex, build_keyword_index
+from vibe_worker import ASSESSMENT_PROMPT
+
+EVENTS_FILE = os.path.join("data_raw", "scraped_events.txt")
+REPLAYS = int(os.getenv("BENCH_REPLAYS", "10"))
+LLM_DELAY = float(os.getenv("BENCH_LLM_DELAY_MS", "0")) / 1000
+
+# --- RECORDED CONVERSATIONS ---
+# (user message, scripted assistant reply). Replies drive the same branches
+# as the real model: SEARCH_ACTION -> retrieval + follow-up call, a
+# celebration without a question -> mission_complete, anything else -> chat.
+CONVERSATIONS = [
+    {"name": "jazz night", "logged_in": True, "turns": [
+        ("hey! I want to go out this weekend", "Love that! What kind of vibe are you after, chill or wild?"),
+        ("something chill, I really like jazz", "Say less, finding some smooth spots!\n"
+                                                "**SEARCH_ACTION:** jazz concert | max_price=150"),
+        ("hmm show me more", "On it!\n**SEARCH_ACTION:** jazz live music"),
+        ("the second one looks perfect", "Awesome choice, have a great night!"),
+    ]},
+    {"name": "christmas with kids", "logged_in": True, "turns": [
+        ("any ideas for the kids this december?", "Aww yes! Are they more into shows or into running around outside?"),
+        ("they love theatre and stories", "Cute! Let me look.\n"
+                                          "**SEARCH_ACTION:** teatru pentru copii craciun | category=Theater"),
+        ("something outdoors maybe?", "Got it, switching it up!\n**SEARCH_ACTION:** targ de craciun"),
+        ("we'll do the christmas market", "Great pick, enjoy the lights!"),
+    ]},
+    {"name": "party hopper", "logged_in": False, "turns": [
+        ("I want to dance all night", "A night owl, I see! Techno, latin or throwback hits?"),
+        ("techno or a dj set", "Bet.\n**SEARCH_ACTION:** dj set techno party | max_price=100"),
+        ("more please", "Here come more!\n**SEARCH_ACTION:** party club night"),
+        ("more", "Digging deeper!\n**SEARCH_ACTION:** party dj"),
+        ("ok not feeling any of these", "No stress! Do you want something calmer, or a totally different scene?"),
+        ("something funny instead", "Comedy it is!\n**SEARCH_ACTION:** stand-up comedy"),
+    ]},
+    {"name": "just chatting", "logged_in": True, "turns": [
+        ("hi", "Hey hey! Planning something fun?"),
+        ("not sure yet, what's good in bucharest?", "Tons! Are you more of a concerts person or a theatre person?"),
+        ("I'm not a fan of crowds", "Fair! Small venues then. Should I look for something intimate?"),
+        ("sure, maybe a piano recital", "Classy!\n**SEARCH_ACTION:** recital de pian"),
+        ("thanks, that's it", "Awesome, have fun!"),
+    ]},
+]
+SCRIPT = {user: reply for conversation in CONVERSATIONS for user, reply in conversation["turns"]}
+FOLLOW_UP = "Here are two picks that fit. Are these closer to what you had in mind?"
+TASTE_WORDS = ("like", "love", "chill", "dance", "funny", "crowds", "jazz", "theatre")
+
+# Counters of the turn being served (None in background tasks)
+current_turn = contextvars.ContextVar("current_turn", default=None)
+background = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "profile_saves": []}
+
+
+class ScriptedLLM:
+    """Answers from the recorded script by looking at the prompt; deterministic."""
+
+    def reply_for(self, messages):
+        last = [m for m in messages if "[USER CONTEXT]" not in str(m.content)][-1]
+        if str(messages[0].content) == rag_logic.SUMMARIZER_PROMPT:
+            return "User wants a night out in Bucharest; tastes noted, events shown so far listed."
+        if "[SYSTEM ANALYSIS]" in str(last.content):
+            message = str(last.content).split('"')[1].lower()
+            return "YES" if any(word in message for word in TASTE_WORDS) else "NO"
+        if last is ASSESSMENT_PROMPT:
+            return "Enjoys relaxed live music and small cozy venues."
+        if isinstance(last, HumanMessage):
+            return SCRIPT.get(last.content, "Tell me more!")
+        return FOLLOW_UP
+
+    async def ainvoke(self, messages):
+        if LLM_DELAY:
+            await asyncio.sleep(LLM_DELAY)
+        content = self.reply_for(messages)
+        prompt_tokens = rag_logic.count_tokens(messages)
+        completion_tokens = rag_logic.count_tokens([AIMessage(content=content)])
+        counters = current_turn.get() or background
+        counters["llm_calls"] += 1
+        counters["prompt_tokens"] += prompt_tokens
+        counters["completion_tokens"] += completion_tokens
+        return AIMessage(content=content, usage_metadata={
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        })
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return fake_embed(text).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def timed(method, key):
+    """Wraps a callable so its duration lands in the current turn (or the background) counters."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            counters = current_turn.get() or background
+            counters.setdefault(key, []).append(time.perf_counter() - start)
+    return wrapper
+
+
+def build_index():
+    with open(EVENTS_FILE, "r", encoding="utf-8") as f:
+        chunks = [c.strip() for c in f.read().split("\n\n") if "Event:" in c]
+    texts, metadatas, ids = [], [], []
+    for chunk in chunks:
+        meta = event_metadata(chunk)
+        if str(meta["event_id"]) not in ids:
+            texts.append(chunk)
+            metadatas.append(meta)
+            ids.append(str(meta["event_id"]))
+    store = Chroma(collection_name="bench_replay", persist_directory=os.path.join(WORKDIR, "chroma"),
+                   collection_metadata={"hnsw:space": "cosine"})
+    store._collection.add(ids=ids, embeddings=[fake_embed(t).tolist() for t in texts],
+                          documents=texts, metadatas=metadatas)
+    build_keyword_index(WORKDIR, ids, metadatas)
+    return store, KeywordIndex(WORKDIR)
+
+
+# --- REPLAY ---
+async def replay(client, conversation, session_id, turns):
+    email = f"{session_id}@example.com" if conversation["logged_in"] else None
+    if email:
+        response = await client.post("/register", json={"email": email, "password": "bench"})
+        response.raise_for_status()
+    for user, _ in conversation["turns"]:
+        counters = {"llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        token = current_turn.set(counters)
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat", json={"message": user, "session_id": session_id, "email": email})
+            response.raise_for_status()
+        finally:
+            counters["latency"] = time.perf_counter() - start
+            current_turn.reset(token)
+        body = response.json()
+        counters["kind"] = "search" if "SEARCH_ACTION" in SCRIPT[user] else \
+            "done" if body["mission_complete"] else "chat"
+        turns.append(counters)
+
+
+async def run_level(client, api, concurrency, label):
+    turns = []
+    slots = asyncio.Semaphore(concurrency)
+    jobs = [(conversation, f"{label}-{i}-{n}") for n in range(REPLAYS) for i, conversation in enumerate(CONVERSATIONS)]
+
+    async def one(conversation, session_id):
+        async with slots:
+            await replay(client, conversation, session_id, turns)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(conversation, session_id) for conversation, session_id in jobs))
+    # Vibe assessments run after the replies; wait for them to drain
+    stats = api.vibe_worker.stats
+    while stats["processed"] + stats["failed"] < stats["submitted"] - stats["superseded"]:
+        await asyncio.sleep(0.01)
+    return turns, time.perf_counter() - start
+
+
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p90": None, "p99": None, "max": None}
+    values = sorted(values)
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": values[-1]}
+
+
+def ms(value):
+    return f"{value * 1000:7.2f}" if value is not None else "      -"
+
+
+def summarize(turns, elapsed, background_before):
+    report = {"turns": len(turns), "turns_per_s": len(turns) / elapsed, "by_kind": {}}
+    for kind in ("all", "chat", "search", "done"):
+        rows = [t for t in turns if kind == "all" or t["kind"] == kind]
+        if not rows:
+            continue
+        report["by_kind"][kind] = {
+            "turns": len(rows),
+            "latency": percentiles([t["latency"] for t in rows]),
+            "llm_calls": statistics.mean(t["llm_calls"] for t in rows),
+            "prompt_tokens": statistics.mean(t["prompt_tokens"] for t in rows),
+            "completion_tokens": statistics.mean(t["completion_tokens"] for t in rows),
+            "retrieval": percentiles([s for t in rows for s in t.get("retrieval", [])]),
+            "session_save": percentiles([s for t in rows for s in t.get("session_save", [])]),
+        }
+    report["background"] = {
+        "llm_calls": background["llm_calls"] - background_before["llm_calls"],
+        "prompt_tokens": background["prompt_tokens"] - background_before["prompt_tokens"],
+        "profile_save": percentiles(background["profile_saves"][len(background_before["profile_saves"]):]),
+    }
+    return report
+
+
+def print_report(concurrency, report):
+    print(f"\n🔁 Concurrency {concurrency}: {report['turns']} turns, {report['turns_per_s']:.1f} turns/s")
+    print(f"   {'turn':<7}{'n':>5} | latency ms  p50     p90     p99     max | LLM calls  prompt  completion"
+          f" | retrieval p50/p99 ms | session save p50/p99 ms")
+    for kind, row in report["by_kind"].items():
+        latency, retrieval, save = row["latency"], row["retrieval"], row["session_save"]
+        print(f"   {kind:<7}{row['turns']:>5} | {ms(latency['p50'])} {ms(latency['p90'])} {ms(latency['p99'])} "
+              f"{ms(latency['max'])} | {row['llm_calls']:9.2f} {row['prompt_tokens']:7.0f} "
+              f"{row['completion_tokens']:11.0f} | {ms(retrieval['p50'])} / {ms(retrieval['p99'])}  "
+              f"| {ms(save['p50'])} / {ms(save['p99'])}")
+    bg = report["background"]
+    print(f"   background vibe checks: {bg['llm_calls']} LLM calls, {bg['prompt_tokens']} prompt tokens, "
+          f"profile save p50 {ms(bg['profile_save']['p50']).strip()} ms")
+
+
+async def bench(levels):
+    import main as api
+    rag_logic.SocialSyncAgent.retrieve_events = timed(rag_logic.SocialSyncAgent.retrieve_events, "retrieval")
+    await api.start_background_workers()
+    # The stores exist once startup has opened them
+    api.sessions.put = timed(api.sessions.put, "session_save")
+    api.user_store.update_profile = timed(api.user_store.update_profile, "profile_saves")
+    await api.warm_up_task
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            # The app prints debug lines for every search and profile update
+            with contextlib.redirect_stdout(io.StringIO()):
+                await run_level(client, api, 1, "warm")
+            for concurrency in levels:
+                before = {**background, "profile_saves": list(background["profile_saves"])}
+                with contextlib.redirect_stdout(io.StringIO()):
+                    turns, elapsed = await run_level(client, api, concurrency, f"c{concurrency}")
+                results[concurrency] = summarize(turns, elapsed, before)
+                print_report(concurrency, results[concurrency])
+    finally:
+        await api.stop_background_workers()
+    return results
+
+
+def main(levels):
+    store, keyword_index = build_index()
+    rag_logic.set_resources(llm=ScriptedLLM(), embeddings=FakeEmbeddings(), vector_db=store,
+                            keyword_index=keyword_index)
+    print(f"   {len(CONVERSATIONS)} conversations x {REPLAYS} replays, LLM delay {LLM_DELAY * 1000:.0f} ms, "
+          f"session store {os.getenv('SESSION_STORE', 'memory')}, {len(keyword_index)} events")
+    results = asyncio.run(bench(levels))
+    if os.getenv("BENCH_JSON"):
+        with open(os.getenv("BENCH_JSON"), "w") as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    try:
+        main([int(a) for a in sys.argv[1:]] or [1, 8, 32])
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
@@ -0,0 +1,290 @@
+"""
+Filtered vs unfiltered event retrieval on a synthetic Chroma index.
+Deterministic hashed bag-of-words embeddings: no network, no OpenAI key.
+
+    python bench_retrieval.py [events ...]    # default: 2000 20000
+    python bench_retrieval.py live            # check the live index, see check_live_index()
+
+The index holds the tribe profiles next to the events, as ingest.py builds
+it. For each query with constraints (upcoming, max price, categories) it
+reports latency and precision@k (share of results that satisfy the
+constraints) for the old unfiltered call and the metadata pre-filtered one,
+plus recall@k of the filtered call against an exact brute-force top-k over
+qualifying events. The "agent" row runs the same queries through
+retrieve_events, which must see the filter metadata and push exclude_ids
+into the index as a $nin clause; the script exits 1 if it doesn't.
+"""
+import contextlib
+import datetime
+import hashlib
+import io
+import os
+import random
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+import numpy as np
+from langchain_chroma import Chroma
+
+from event_records import date_key, event_filter, event_metadata
+
+DIM = 256
+K = 5
+PROFILES_FILE = os.path.join("data_raw", "socialsync_profiles.txt")
+CACHE_DIR = tempfile.mkdtemp(prefix="bench_retrieval_cache_")
+CATEGORIES = {
+    "Concert": "live band rock concert guitar stage",
+    "Party": "techno house dj club rave dance",
+    "Theater": "play stage drama actors theatre",
+    "Exhibition": "art gallery museum painting exhibition",
+    "Workshop": "workshop hands-on class learn craft",
+    "Comedy": "stand-up comedy jokes laugh open mic",
+}
+# (query, constraints, exact top-k rows), filled by bench() for check_agent()
+QUERIES_WITH_EXACT = []
+QUERIES = [
+    ("techno rave old town", {"max_price": 60, "categories": ["Party"]}),
+    ("live rock band tonight", {"max_price": 100, "categories": ["Concert"]}),
+    ("art museum chill", {"categories": ["Exhibition", "Workshop"]}),
+    ("something funny cheap", {"max_price": 30}),
+    ("drama stage actors", {"categories": ["Theater"]}),
+]
+
+
+def fake_embed(text):
+    vector = np.zeros(DIM, dtype=np.float32)
+    for word in text.lower().split():
+        rng = np.random.default_rng(zlib.crc32(word.encode("utf-8")))
+        vector += rng.standard_normal(DIM).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def synthetic_events(n, seed=0):
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    events = []
+    for i in range(n):
+        category = rng.choice(list(CATEGORIES))
+        words = rng.sample(CATEGORIES[category].split(), 3)
+        day = today + datetime.timedelta(days=rng.randint(-180, 90))
+        price = rng.choice([0, 25, 40, 60, 80, 120, 200])
+        events.append(
+            f"Event: Synthetic {category} {i}\nCategory: {category}\n"
+            f"Description: {' '.join(words)} in Bucharest\nTarget Audience: General.\n"
+            f"Date: {day.isoformat()} 20:00\nLocation: Bucharest\n"
+            f"Cost: {f'{price} RON' if price else 'Free / Check Link'}\nSource: https://example.com/e/{i}"
+        )
+    return events
+
+
+def profile_chunks():
+    """The tribe profiles, split the way ingest.py does."""
+    with open(PROFILES_FILE, "r", encoding="utf-8") as f:
+        chunks = re.split(r'(?=Tribe:)', f.read())
+    return [c.strip() for c in chunks if "Tribe:" in c and "Next Question:" in c]
+
+
+class HashedEmbeddings:
+    """fake_embed for the agent, minus its query prefix so its top-k compares with the exact one."""
+
+    def embed_query(self, text):
+        return fake_embed(text.removeprefix("Event in Bucharest: ")).tolist()
+
+
+def qualifies(meta, today, constraints):
+    if meta["date_ts"] and meta["date_ts"] < date_key(today):
+        return False
+    if "max_price" in constraints and meta["price"] > constraints["max_price"]:
+        return False
+    if "categories" in constraints and meta["category_key"] not in {c.lower() for c in constraints["categories"]}:
+        return False
+    return True
+
+
+def check_agent(store, metas, today):
+    """
+    retrieve_events on the bench index: precision/recall rows for the
+    constrained queries, and whether the filters and the exclude_ids
+    pushdown are on. Returns (results, ok).
+    """
+    # Query cache for every index size: removed in __main__
+    os.environ.setdefault("QUERY_CACHE_FILE", os.path.join(CACHE_DIR, "query_cache.db"))
+    import rag_logic
+    # Fresh caches per index size; no keyword index for the synthetic events
+    rag_logic.resources = rag_logic.Resources()
+    rag_logic.KEYWORD_SEARCH = False
+    rag_logic.set_resources(embeddings=HashedEmbeddings(), vector_db=store)
+    agent = rag_logic.SocialSyncAgent()
+    by_id = {meta["event_id"]: meta for meta in metas}
+    filters_on = rag_logic.FILTER_FIELDS | {"event_id"} <= rag_logic.resources.index_info["fields"]
+
+    precisions, recalls = [], []
+    for query, constraints, exact in QUERIES_WITH_EXACT:
+        with contextlib.redirect_stdout(io.StringIO()):
+            events = agent.retrieve_events(query, k=K, **constraints)
+        good = [e for e in events if qualifies(by_id[e.id], today, constraints)]
+        precisions.append(len(good) / K)
+        recalls.append(len({str(by_id[e.id]["_row"]) for e in good} & exact) / max(1, len(exact)))
+
+    calls = []
+    search = store.similarity_search_by_vector
+
+    def recording(vector, k, filter=None):
+        calls.append((k, filter))
+        return search(vector, k=k, filter=filter)
+
+    store.similarity_search_by_vector = recording
+    seen = {meta["event_id"] for meta in metas[:20]}
+    with contextlib.redirect_stdout(io.StringIO()):
+        events = agent.retrieve_events("jokes laugh open mic", k=K, exclude_ids=seen)
+    del store.similarity_search_by_vector
+    k, where = calls[-1]
+    pushed = k == K and {"event_id": {"$nin": sorted(seen)}} in where.get("$and", [])
+    fresh = not {e.id for e in events} & seen
+    print(f"   agent: filter metadata {'✅ seen' if filters_on else '❌ missed'} | exclude_ids "
+          f"{'✅ pushed down as $nin' if pushed else f'❌ not pushed down (k={k}, where={where})'}"
+          f"{'' if fresh else ' | ❌ excluded events came back'}")
+    return (precisions, recalls), filters_on and pushed and fresh
+
+
+def bench(n):
+    workdir = tempfile.mkdtemp(prefix="bench_retrieval_")
+    try:
+        texts = synthetic_events(n)
+        metas = [event_metadata(t) for t in texts]
+        matrix = np.stack([fake_embed(t) for t in texts])
+        store = Chroma(collection_name="bench", persist_directory=workdir,
+                       collection_metadata={"hnsw:space": "cosine"})
+        for i in range(0, n, 1000):
+            store._collection.add(
+                ids=[str(j) for j in range(i, min(i + 1000, n))],
+                embeddings=matrix[i:i + 1000].tolist(),
+                documents=texts[i:i + 1000],
+                metadatas=metas[i:i + 1000],
+            )
+        # Profiles carry only source + content_hash, as ingest.py writes them
+        profiles = profile_chunks()
+        store._collection.add(
+            ids=[f"profile:{i}" for i in range(len(profiles))],
+            embeddings=[fake_embed(p).tolist() for p in profiles],
+            documents=profiles,
+            metadatas=[{"source": "profile", "content_hash": hashlib.sha256(p.encode("utf-8")).hexdigest()}
+                       for p in profiles],
+        )
+        for row, meta in enumerate(metas):
+            meta["_row"] = row
+
+        today = datetime.date.today()
+        results = {"unfiltered": ([], [], []), "filtered": ([], [], [])}
+        QUERIES_WITH_EXACT.clear()
+        for query, constraints in QUERIES:
+            vector = fake_embed(query)
+            ok = np.array([qualifies(m, today, constraints) for m in metas])
+            scores = np.where(ok, matrix @ vector, -np.inf)
+            exact = {str(i) for i in np.argsort(-scores)[:K] if ok[i]}
+            QUERIES_WITH_EXACT.append((query, constraints, exact))
+
+            for label, where in (("unfiltered", {"source": "event"}),
+                                 ("filtered", event_filter(date_from=today, **constraints))):
+                latencies, precisions, recalls = results[label]
+                for _ in range(5):
+                    start = time.perf_counter()
+                    docs = store.similarity_search_by_vector(vector.tolist(), k=K, filter=where)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                good = [d for d in docs if qualifies(d.metadata, today, constraints)]
+                precisions.append(len(good) / K)
+                recalls.append(len({d.id for d in good} & exact) / max(1, len(exact)))
+
+        for label, (latencies, precisions, recalls) in results.items():
+            latencies.sort()
+            print(f"   {n:>7,} events | {label:>10}: p50 {statistics.median(latencies):6.2f} ms "
+                  f"p95 {latencies[int(len(latencies) * 0.95) - 1]:6.2f} ms | "
+                  f"precision@{K} {statistics.mean(precisions):.2f} | recall@{K} {statistics.mean(recalls):.2f}")
+        (precisions, recalls), ok = check_agent(store, metas, today)
+        print(f"   {n:>7,} events | {'agent':>10}: {'':>26} | "
+              f"precision@{K} {statistics.mean(precisions):.2f} | recall@{K} {statistics.mean(recalls):.2f}")
+        return ok
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# --- LIVE INDEX CHECK ---
+LIVE_QUERIES = ["jazz concert", "something chill", "party tonight", "teatru pentru copii", "christmas market"]
+
+
+class RandomEmbeddings:
+    """Unit vectors of the index's dimension, seeded by the query text (no API key needed)."""
+
+    def __init__(self):
+        self.dim = None
+
+    def embed_query(self, text):
+        vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+
+def index_dimension(vector_db):
+    vectors = getattr(vector_db, "vectors", None)
+    if vectors is not None:
+        return vectors.shape[1]
+    return len(vector_db.get(limit=1, include=["embeddings"])["embeddings"][0])
+
+
+def check_live_index(k=2, rounds=3):
+    """
+    retrieve_events on a copy of the live index (what the API serves:
+    chroma_db, or the current build; Chroma writes to the files it opens)
+    with the default settings. Every query must come back with k events,
+    and k new ones on each of `rounds` follow-up searches that exclude the
+    events already shown (as /chat does). Returns True if they do.
+    """
+    workdir = tempfile.mkdtemp(prefix="check_live_")
+    # Keep the random vectors out of the real query cache
+    os.environ["QUERY_CACHE_FILE"] = os.path.join(workdir, "query_cache.db")
+    try:
+        import rag_logic
+        from vector_index import current_index_path
+        path = os.path.join(workdir, "index")
+        shutil.copytree(current_index_path(), path, ignore=shutil.ignore_patterns("builds", "CURRENT*"))
+        embeddings = RandomEmbeddings()
+        vector_db = rag_logic.open_vector_db(path, embeddings)
+        rag_logic.set_resources(embeddings=embeddings, vector_db=vector_db)
+        embeddings.dim = index_dimension(vector_db)
+        info = rag_logic.resources.index_info
+        agent = rag_logic.SocialSyncAgent()
+        print(f"   live index {rag_logic.index_version()}: {rag_logic.index_size(vector_db)} events, "
+              f"fields {sorted(info['fields'])}, latest date {info['latest_date']}")
+        ok = True
+        for query in LIVE_QUERIES:
+            seen, counts = set(), []
+            for _ in range(rounds):
+                # retrieve_events prints a debug line per search
+                with contextlib.redirect_stdout(io.StringIO()):
+                    events = agent.retrieve_events(query, k=k, exclude_ids=frozenset(seen))
+                fresh = {event.id for event in events} - seen
+                counts.append(len(fresh))
+                seen |= fresh
+            print(f"   {query!r:<24} new events per round: {counts}")
+            ok &= counts == [k] * rounds
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print("   ✅ Live index serves results." if ok else "   ❌ Searches on the live index come back short.")
+    return ok
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["live"]:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+        sys.exit(0 if check_live_index() else 1)
+    ok = True
+    try:
+        for size in [int(a) for a in sys.argv[1:]] or (2000, 20000):
+            ok &= bench(size)
+    finally:
+        shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,266 @@
+"""
+Offline scraper benchmarks: local HTTP fixture servers + a stub extractor,
+no network and no OpenAI key needed.
+
+    python bench_scrape.py pipeline     # sequential vs async pipeline
+    python bench_scrape.py chunking [dir]  # truncated vs chunked extraction
+    python bench_scrape.py preprocess [dir]  # BeautifulSoup vs streaming preprocess
+    python bench_scrape.py fixtures [dir]    # save the live source pages as fixtures (network)
+
+Fixtures are the *.html files in data_raw/html_fixtures: edge_cases.html
+(hand-written markup bs4 treats specially) plus whatever `fixtures` saved.
+Saved pages are listed in its sources.txt with the URL they came from, and
+the golden check preprocesses them against that URL. Run `fixtures` where the
+sources are reachable and commit the pages; with
+BENCH_REQUIRE_LIVE_FIXTURES=1 `preprocess` fails until some are there.
+"""
+import asyncio
+import glob
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import httpx
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import scrape
+from fast_preprocess import AVAILABLE as FAST_PREPROCESS_AVAILABLE, preprocess_html_fast
+
+FIXTURE_DIR = os.path.join("data_raw", "html_fixtures")
+FIXTURE_MANIFEST = "sources.txt"  # "<file> <url> <saved at>" per saved page
+REQUIRE_LIVE_FIXTURES = os.getenv("BENCH_REQUIRE_LIVE_FIXTURES") == "1"
+FETCH_LATENCY = 0.05    # simulated server think time per page
+EXTRACT_LATENCY = 0.3   # simulated LLM extraction time per page
+SERVERS = 4
+
+
+def synthetic_listing(n_events, seed=0):
+    items = "\n".join(
+        f'<div class="event"><a href="/event/{seed}-{i}">Synthetic Concert {seed}-{i}</a>'
+        f'<span>2026-0{1 + i % 9}-1{i % 9} 20:00</span><span>{50 + i} RON</span></div>'
+        for i in range(n_events)
+    )
+    return f"<html><head><title>Events</title></head><body><nav>Menu</nav>{items}<footer>x</footer></body></html>"
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(FETCH_LATENCY)
+        body = synthetic_listing(40, seed=abs(hash(self.path)) % 1000).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fixture_servers(count=SERVERS):
+    servers = []
+    for _ in range(count):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    return servers
+
+
+async def stub_extractor(text):
+    await asyncio.sleep(EXTRACT_LATENCY)
+    return {"events": [{"name": m} for m in re.findall(r"(Synthetic Concert [\d-]+)", text)]}
+
+
+def run_sequential(urls):
+    """The old shape: one fresh connection per page, fetch then extract, one site at a time."""
+    found = 0
+    for url in urls:
+        response = httpx.get(url, headers=scrape.HEADERS, timeout=scrape.FETCH_TIMEOUT)
+        text = scrape.preprocess_html(response.content, url)
+        found += len(asyncio.run(stub_extractor(text))["events"])
+    return found
+
+
+def run_pipeline(urls):
+    found = {"n": 0}
+
+    def on_events(url, events):
+        found["n"] += len(events)
+
+    asyncio.run(scrape.scrape_sources(urls, on_events, extractor=stub_extractor))
+    return found["n"]
+
+
+def stub_chunk_extractor(chunk_text):
+    """Finds every fixture event whose title and [URL: ...] made it into the chunk."""
+    async def run():
+        events = [
+            {"name": name, "event_url": url}
+            for name, url in re.findall(r"^(.+?) \[URL: (\S+?)\]", chunk_text, flags=re.M)
+        ]
+        usage = {"prompt_tokens": len(chunk_text) // 4 + 300, "completion_tokens": 40 * len(events)}
+        return {"events": events}, usage
+    return run()
+
+
+def load_html_fixtures(fixture_dir):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(fixture_dir, "*.html"))):
+        with open(path, "rb") as f:
+            pages.append((os.path.basename(path), f.read()))
+    if not pages:
+        # No saved pages: a long listing like iabilet's front page
+        print(f"   ⚠️  No *.html in {fixture_dir}, using synthetic listings.")
+        pages = [(f"synthetic-{n}.html", synthetic_listing(n).encode("utf-8")) for n in (50, 200, 600)]
+    return pages
+
+
+def fixture_urls(fixture_dir):
+    """file name -> URL for the pages `fixtures` saved (empty if none were)."""
+    path = os.path.join(fixture_dir, FIXTURE_MANIFEST)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return dict(line.split()[:2] for line in f if line.strip() and not line.startswith("#"))
+
+
+def save_fixtures(fixture_dir=FIXTURE_DIR):
+    """Saves every source page as <host>[-n].html, raw bytes as served, and lists it in the manifest."""
+    os.makedirs(fixture_dir, exist_ok=True)
+    saved = {}
+    manifest = fixture_urls(fixture_dir)
+    with httpx.Client(headers=scrape.HEADERS, timeout=scrape.FETCH_TIMEOUT, follow_redirects=True) as http:
+        for url in scrape.default_url_source():
+            try:
+                response = http.get(url)
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                print(f"   ❌ {url}: {e}")
+                continue
+            host = re.sub(r"[^\w.-]", "_", httpx.URL(url).host.removeprefix("www."))
+            saved[host] = saved.get(host, 0) + 1
+            name = f"{host}.html" if saved[host] == 1 else f"{host}-{saved[host]}.html"
+            with open(os.path.join(fixture_dir, name), "wb") as f:
+                f.write(response.content)
+            manifest[name] = f"{url} {time.strftime('%Y-%m-%d')}"
+            print(f"   💾 {name}: {len(response.content):,} bytes from {url}")
+    if saved:
+        with open(os.path.join(fixture_dir, FIXTURE_MANIFEST), "w", encoding="utf-8") as f:
+            f.write("# <file> <url> <saved at>, written by `python bench_scrape.py fixtures`\n")
+            f.writelines(f"{name} {source}\n" for name, source in sorted(manifest.items()))
+    return sum(saved.values())
+
+
+def long_line_listing(n_events, max_chars=scrape.EXTRACT_CHUNK_CHARS):
+    """Preprocessed text whose event descriptions are single lines near the chunk budget."""
+    return "\n".join(
+        f"Long Event {i} [URL: https://example.com/e/{i}]\n" + "lorem ipsum " * int(max_chars * (0.3 + i % 3 * 0.3) / 12)
+        for i in range(n_events)
+    )
+
+
+def check_chunk_budget(max_chars=scrape.EXTRACT_CHUNK_CHARS):
+    """No chunk over max_chars, and the overlap stays a small share of what is sent."""
+    text = long_line_listing(40, max_chars)
+    chunks = scrape.split_for_extraction(text, max_chars=max_chars)
+    largest = max(len(c) for c in chunks)
+    sent = sum(len(c) for c in chunks)
+    ok = largest <= max_chars
+    print(f"   long lines: {len(text):,} chars -> {len(chunks)} chunks, largest {largest:,} "
+          f"({largest / max_chars:.2f}x budget), {sent / len(text):.2f}x chars sent "
+          f"{'✅' if ok else '❌ over budget'}")
+    return ok
+
+
+def bench_chunking(fixture_dir=FIXTURE_DIR):
+    for name, html in load_html_fixtures(fixture_dir):
+        text = scrape.preprocess_html(html, "https://example.com/")
+        truncated, truncated_usage = asyncio.run(stub_chunk_extractor(text[:scrape.EXTRACT_CHUNK_CHARS]))
+        chunked = asyncio.run(scrape.extract_structured_data(text, chunk_extractor=stub_chunk_extractor))
+        print(f"   {name:<24} {len(text):>8,} chars | truncated: {len(truncated['events']):>4} events "
+              f"${scrape.extraction_cost(truncated_usage):.4f} | chunked ({chunked['chunks']}): "
+              f"{len(chunked['events']):>4} events ${scrape.extraction_cost(chunked['usage']):.4f}")
+
+
+def bench_preprocess(fixture_dir=FIXTURE_DIR, rounds=5):
+    """
+    Golden check first: the streaming preprocessor must return exactly what
+    the BeautifulSoup one does for every fixture, or the timings are moot.
+    """
+    if not FAST_PREPROCESS_AVAILABLE:
+        print("   ⚠️  This bs4 version lacks the internals fast_preprocess drives; scrape.py uses BeautifulSoup.")
+        return 0
+    pages = load_html_fixtures(fixture_dir)
+    urls = fixture_urls(fixture_dir)
+    live = sum(name in urls for name, _ in pages)
+    if not live:
+        print(f"   ⚠️  No saved source pages in {fixture_dir}: only hand-written markup is compared. "
+              f"Run `python bench_scrape.py fixtures` with network access and commit the pages.")
+    mismatches = 0
+    for name, html in pages:
+        base_url = urls.get(name, "https://example.com/events/")
+        expected = scrape.preprocess_html_soup(html, base_url)
+        actual = preprocess_html_fast(html, base_url)
+        if actual != expected:
+            mismatches += 1
+            print(f"   ❌ {name}: output differs ({len(expected[0]):,} vs {len(actual[0]):,} chars)")
+    print(f"   Golden output: {len(pages) - mismatches}/{len(pages)} pages identical ({live} saved source pages)")
+
+    base_url = "https://example.com/events/"
+    for label, fn in (("soup", scrape.preprocess_html_soup), ("streaming", preprocess_html_fast)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for _, html in pages:
+                fn(html, base_url)
+        seconds = time.perf_counter() - start
+
+        tracemalloc.start()
+        for _, html in pages:
+            fn(html, base_url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"   {label:>10}: {rounds * len(pages) / seconds:8.1f} pages/s | "
+              f"peak {peak / 1_048_576:6.1f} MB")
+    if REQUIRE_LIVE_FIXTURES and not live:
+        print("   ❌ BENCH_REQUIRE_LIVE_FIXTURES=1 but no saved source pages.")
+        return mismatches + 1
+    return mismatches
+
+
+def bench_pipeline(source_counts=(4, 16, 64)):
+    servers = start_fixture_servers()
+    try:
+        for count in source_counts:
+            urls = [
+                f"http://127.0.0.1:{servers[i % len(servers)].server_address[1]}/listing/{i}"
+                for i in range(count)
+            ]
+            results = []
+            for label, runner in (("sequential", run_sequential), ("pipeline", run_pipeline)):
+                start = time.perf_counter()
+                events = runner(urls)
+                results.append((label, time.perf_counter() - start, events))
+            base = results[0][1]
+            for label, seconds, events in results:
+                print(f"   {count:>3} sources | {label:>10}: {seconds:6.2f}s "
+                      f"({events} events, {base / seconds:4.1f}x)")
+    finally:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "pipeline"
+    if command == "pipeline":
+        bench_pipeline()
+    elif command == "chunking":
+        bench_chunking(*sys.argv[2:3])
+        sys.exit(0 if check_chunk_budget() else 1)
+    elif command == "preprocess":
+        sys.exit(1 if bench_preprocess(*sys.argv[2:3]) else 0)
+    elif command == "fixtures":
+        sys.exit(0 if save_fixtures(*sys.argv[2:3]) else 1)
+    else:
+        print(__doc__)
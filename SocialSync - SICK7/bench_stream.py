@@ -0,0 +1,197 @@
+"""
+Time-to-first-token: /chat vs /chat/stream against a stub streaming LLM.
+No network and no OpenAI key: the LLM, embeddings and Chroma are fakes
+injected through rag_logic.set_resources.
+
+    python bench_stream.py [turns]    # default 10 per scenario
+
+The stub produces a token every TOKEN_DELAY seconds after FIRST_TOKEN_DELAY,
+so /chat can only answer once the whole reply exists, while /chat/stream
+should show the first token after roughly FIRST_TOKEN_DELAY. Also checks
+that no SEARCH_ACTION text leaks into token frames, that the text streamed
+since the last `reset` frame is the final reply, and that the streamed `done`
+frame matches what /chat returns.
+"""
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_stream_")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["USERS_DB_FILE"] = os.path.join(WORKDIR, "users.db")
+os.environ["SESSION_STORE"] = "memory"
+
+import httpx
+import uvicorn
+from langchain_chroma import Chroma
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+import rag_logic
+from bench_retrieval import fake_embed, synthetic_events
+from event_records import event_metadata
+
+FIRST_TOKEN_DELAY = 0.3
+TOKEN_DELAY = 0.02
+CHAT_REPLY = ("Oh nice, a chill night out sounds perfect! Are you more into live music, "
+              "a cozy exhibition, or something with a bit of dancing? Tell me your budget too!")
+SEARCH_REPLY = "Say less, digging up the good stuff!\n**SEARCH_ACTION:** techno rave old town | max_price=60"
+FOLLOW_UP = "Here are two picks that match your vibe. Are these closer to what you had in mind?"
+
+
+class StubStreamingLLM:
+    """Replies word by word with fixed delays; a message containing 'find' triggers a search."""
+
+    def reply_for(self, messages):
+        last = [m for m in messages if "[USER CONTEXT]" not in m.content][-1]
+        if not isinstance(last, HumanMessage):
+            return FOLLOW_UP
+        return SEARCH_REPLY if "find" in last.content.lower() else CHAT_REPLY
+
+    def tokens(self, messages):
+        words = self.reply_for(messages).split(" ")
+        return [w if i == 0 else " " + w for i, w in enumerate(words)]
+
+    async def ainvoke(self, messages):
+        tokens = self.tokens(messages)
+        await asyncio.sleep(FIRST_TOKEN_DELAY + TOKEN_DELAY * (len(tokens) - 1))
+        return AIMessage(content="".join(tokens))
+
+    async def astream(self, messages):
+        await asyncio.sleep(FIRST_TOKEN_DELAY)
+        for i, token in enumerate(self.tokens(messages)):
+            if i:
+                await asyncio.sleep(TOKEN_DELAY)
+            yield AIMessageChunk(content=token)
+
+
+class FakeEmbeddings:
+    def embed_query(self, text):
+        return fake_embed(text).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def start_server(app):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def parse_frames(buffer):
+    """Splits complete SSE frames off the buffer: returns ([(event, data)], rest)."""
+    frames = []
+    while "\n\n" in buffer:
+        raw, buffer = buffer.split("\n\n", 1)
+        fields = dict(line.split(": ", 1) for line in raw.splitlines() if ": " in line)
+        frames.append((fields.get("event"), json.loads(fields.get("data", "null"))))
+    return frames, buffer
+
+
+async def plain_turn(client, base, session_id, message):
+    start = time.perf_counter()
+    response = await client.post(f"{base}/chat", json={"message": message, "session_id": session_id})
+    response.raise_for_status()
+    return time.perf_counter() - start, response.json()
+
+
+async def streamed_turn(client, base, session_id, message):
+    start = time.perf_counter()
+    marks, segments, done = {}, [[]], None
+    async with client.stream("POST", f"{base}/chat/stream",
+                             json={"message": message, "session_id": session_id}) as response:
+        response.raise_for_status()
+        buffer = ""
+        async for text in response.aiter_text():
+            frames, buffer = parse_frames(buffer + text)
+            for event, data in frames:
+                marks.setdefault(event, time.perf_counter() - start)
+                if event == "token":
+                    segments[-1].append(data["text"])
+                elif event == "reset":
+                    segments.append([])
+                elif event == "done":
+                    done = data
+    return marks, ["".join(tokens) for tokens in segments], done
+
+
+def report(label, values):
+    values = sorted(values)
+    print(f"   {label:<28} p50 {statistics.median(values) * 1000:7.1f} ms | "
+          f"max {values[-1] * 1000:7.1f} ms")
+
+
+async def bench(base, turns):
+    ok = True
+    async with httpx.AsyncClient(timeout=60) as client:
+        for scenario, message in (("chat", "I want to go out tonight"),
+                                  ("search", "find me a techno party")):
+            plain, first_token, events_at, done_at = [], [], [], []
+            for i in range(turns):
+                elapsed, expected = await plain_turn(client, base, f"plain-{scenario}-{i}", message)
+                plain.append(elapsed)
+                marks, segments, done = await streamed_turn(client, base, f"stream-{scenario}-{i}", message)
+                first_token.append(marks["token"])
+                done_at.append(marks["done"])
+                if "events" in marks:
+                    events_at.append(marks["events"])
+                if any("SEARCH_ACTION" in segment.upper() for segment in segments):
+                    print("   ❌ SEARCH_ACTION leaked into the token frames.")
+                    ok = False
+                if done and segments[-1].strip() != done["text"]:
+                    print(f"   ❌ Text on screen differs from the done text:\n      {segments[-1]!r}\n      {done['text']!r}")
+                    ok = False
+                if done != expected:
+                    print(f"   ❌ Streamed result differs from /chat:\n      {done}\n      {expected}")
+                    ok = False
+
+            print(f"\n📡 Scenario '{scenario}' ({turns} turns)")
+            report("/chat (full reply)", plain)
+            report("/chat/stream first token", first_token)
+            if events_at:
+                report("/chat/stream event cards", events_at)
+            report("/chat/stream done", done_at)
+    return ok
+
+
+def main(turns):
+    store = Chroma(collection_name="bench_stream", persist_directory=os.path.join(WORKDIR, "chroma"),
+                   collection_metadata={"hnsw:space": "cosine"})
+    texts = synthetic_events(500)
+    store._collection.add(
+        ids=[str(i) for i in range(len(texts))],
+        embeddings=[fake_embed(t).tolist() for t in texts],
+        documents=texts,
+        metadatas=[event_metadata(t) for t in texts],
+    )
+    rag_logic.set_resources(llm=StubStreamingLLM(), embeddings=FakeEmbeddings(), vector_db=store)
+
+    import main as api
+    server, base = start_server(api.app)
+    try:
+        ok = asyncio.run(bench(base, turns))
+    finally:
+        server.should_exit = True
+    print(f"\n   stub: first token after {FIRST_TOKEN_DELAY * 1000:.0f} ms, then {TOKEN_DELAY * 1000:.0f} ms/token")
+    print("   ✅ Streaming matches /chat." if ok else "   ❌ Streaming check failed.")
+    return ok
+
+
+if __name__ == "__main__":
+    try:
+        passed = main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+    sys.exit(0 if passed else 1)
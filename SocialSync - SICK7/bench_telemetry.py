@@ -0,0 +1,140 @@
+"""
+Overhead of the telemetry (spans, request histogram) on the offline /chat
+replay from bench_replay.py. Exits non-zero above 1%.
+
+    python bench_telemetry.py [rounds]    # default 30
+
+Two measurements:
+  A/B     every round replays all recorded conversations once with tracing
+          on and once off (alternating order, same process, flipping
+          telemetry.TRACING); medians per turn are compared. Noisy: run to
+          run differences of a couple of percent are normal here.
+  budget  the per-turn cost of what tracing adds (the turn's trace, spans
+          per turn x cost of a span, the middleware), measured in isolation, against the
+          per-turn latency with tracing off. This is the number gated on.
+
+The scripted LLM answers instantly, so turns are a few milliseconds and any
+overhead shows up; with a real model the share is far smaller.
+"""
+import asyncio
+import contextlib
+import io
+import shutil
+import statistics
+import sys
+import time
+
+import httpx
+
+import bench_replay
+import rag_logic
+import telemetry
+
+MAX_OVERHEAD = 0.01
+TURNS = sum(len(conversation["turns"]) for conversation in bench_replay.CONVERSATIONS)
+
+
+async def replay_once(client, label):
+    start = time.perf_counter()
+    for conversation in bench_replay.CONVERSATIONS:
+        for user, _ in conversation["turns"]:
+            response = await client.post("/chat", json={"message": user, "session_id": f"{label}-{conversation['name']}"})
+            response.raise_for_status()
+    return (time.perf_counter() - start) / TURNS
+
+
+def trace_costs(n=20000, spans=8):
+    """Seconds per (empty) trace, and per span inside a turn-sized trace."""
+    start = time.perf_counter()
+    for _ in range(n):
+        with telemetry.trace("bench"):
+            pass
+    trace_s = (time.perf_counter() - start) / n
+    start = time.perf_counter()
+    for _ in range(n):
+        with telemetry.trace("bench"):
+            for _ in range(spans):
+                with telemetry.span("bench"):
+                    pass
+    span_s = ((time.perf_counter() - start) / n - trace_s) / spans
+    return trace_s, span_s
+
+
+async def middleware_cost(n=50000):
+    """Seconds the middleware adds to one request, against a no-op ASGI app."""
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/bench"}
+    timings = []
+    for handler in (app, telemetry.MetricsMiddleware(app)):
+        start = time.perf_counter()
+        for _ in range(n):
+            await handler(scope, None, send)
+        timings.append((time.perf_counter() - start) / n)
+    return timings[1] - timings[0]
+
+
+def stage_count():
+    return sum(sum(series[:-1]) for series in telemetry.stage_seconds.series.values())
+
+
+async def bench(rounds):
+    import main as api
+    await api.start_background_workers()
+    await api.warm_up_task
+    per_turn = {True: [], False: []}
+    traced_spans = 0
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            # retrieve_events prints a debug line per search
+            with contextlib.redirect_stdout(io.StringIO()):
+                await replay_once(client, "warm")
+                for i in range(rounds):
+                    for tracing in ((True, False) if i % 2 else (False, True)):
+                        telemetry.TRACING = tracing
+                        before = stage_count()
+                        per_turn[tracing].append(await replay_once(client, f"{i}-{tracing}"))
+                        if tracing:
+                            traced_spans += stage_count() - before
+    finally:
+        telemetry.TRACING = True
+        await api.stop_background_workers()
+
+    off, on = statistics.median(per_turn[False]), statistics.median(per_turn[True])
+    spans_per_turn = traced_spans / (rounds * TURNS)
+    trace_s, span_s = trace_costs()
+    middleware_s = await middleware_cost()
+    added = trace_s + spans_per_turn * span_s + middleware_s
+    start = time.perf_counter()
+    scrape = telemetry.render()
+    render_s = time.perf_counter() - start
+
+    print(f"   {rounds} rounds x {TURNS} turns, scripted LLM without delay")
+    print(f"   A/B     per turn: off {off * 1000:.3f} ms | on {on * 1000:.3f} ms | {100 * (on - off) / off:+.2f}%")
+    print(f"   budget  trace {trace_s * 1e6:.2f} µs + {spans_per_turn:.1f} spans x {span_s * 1e6:.2f} µs "
+          f"+ middleware {middleware_s * 1e6:.2f} µs = {added * 1e6:.1f} µs per turn = {100 * added / off:.2f}% of {off * 1000:.3f} ms")
+    print(f"   /metrics render: {render_s * 1000:.2f} ms, {len(scrape.splitlines())} lines")
+    ok = added / off <= MAX_OVERHEAD
+    print("   ✅ Within budget." if ok else f"   ❌ Over the {MAX_OVERHEAD:.0%} budget.")
+    return ok
+
+
+def main(rounds):
+    store, keyword_index = bench_replay.build_index()
+    rag_logic.set_resources(llm=bench_replay.ScriptedLLM(), embeddings=bench_replay.FakeEmbeddings(),
+                            vector_db=store, keyword_index=keyword_index)
+    return asyncio.run(bench(rounds))
+
+
+if __name__ == "__main__":
+    try:
+        passed = main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
+    finally:
+        shutil.rmtree(bench_replay.WORKDIR, ignore_errors=True)
+    sys.exit(0 if passed else 1)
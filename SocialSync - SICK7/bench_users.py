@@ -0,0 +1,84 @@
+"""
+Register / profile-update throughput with N existing users, JsonUserStore
+vs SqliteUserStore. Runs in a temporary directory; no network.
+
+    python bench_users.py [sizes ...]    # default: 1000 100000 1000000
+    BENCH_JSON_MAX=1000000 BENCH_OPS=500 python bench_users.py
+
+JsonUserStore rewrites the whole file on every write, so it is skipped above
+BENCH_JSON_MAX users (default 100000, where one rewrite already takes
+seconds). Exits 1 if a store loses a registration or a profile update.
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from user_store import JsonUserStore, SqliteUserStore
+
+SIZES = (1_000, 100_000, 1_000_000)
+JSON_MAX = int(os.getenv("BENCH_JSON_MAX", "100000"))
+OPS = int(os.getenv("BENCH_OPS", "200"))
+
+
+def seed_users(size):
+    return {
+        f"user{i}@example.com": {"password": "x", "name": f"user{i}", "profile": "Enjoys jazz."}
+        for i in range(size)
+    }
+
+
+def run(label, store, size):
+    start = time.perf_counter()
+    for i in range(OPS):
+        store.create(f"new{i}@example.com", "x", f"new{i}")
+    register_rate = OPS / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(OPS):
+        store.update_profile(f"user{i}@example.com", f"Profile update {i}.")
+    update_rate = OPS / (time.perf_counter() - start)
+
+    correct = (
+        store.count() == size + OPS
+        and all(f"new{i}@example.com" in store for i in range(OPS))
+        and all(store.get(f"user{i}@example.com")["profile"] == f"Profile update {i}." for i in range(OPS))
+    )
+    print(f"   {label:>6} @ {size:>9,} users: "
+          f"{register_rate:10.1f} registers/s  {update_rate:10.1f} updates/s"
+          f"{'' if correct else '  ❌ writes lost'}")
+    return correct
+
+
+def bench(sizes, workdir):
+    print(f"\n👤 {OPS} registrations + {OPS} profile updates per store")
+    ok = True
+    for size in sizes:
+        seed = seed_users(size)
+        json_path = os.path.join(workdir, f"users_{size}.json")
+        sqlite_path = os.path.join(workdir, f"users_{size}.db")
+
+        stores = []
+        if size <= JSON_MAX:
+            with open(json_path, "w") as f:
+                json.dump(seed, f)
+            stores.append(("json", JsonUserStore(json_path)))
+        sqlite_store = SqliteUserStore(sqlite_path)
+        sqlite_store.upsert_many(seed)
+        stores.append(("sqlite", sqlite_store))
+
+        for label, store in stores:
+            ok = run(label, store, size) and ok
+    return ok
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    workdir = tempfile.mkdtemp(prefix="bench_users_")
+    try:
+        ok = bench(sizes, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,123 @@
+"""
+Local memory-mapped index (brute force and IVF) vs Chroma: build time,
+queries per second and recall@k. Synthetic clustered unit vectors with
+event-like metadata; no network, no OpenAI key.
+
+    python bench_vector.py [sizes ...]    # default: 1000 50000 500000
+    BENCH_DIM=1536 BENCH_CHROMA_MAX=50000 python bench_vector.py
+
+Recall is measured against exact brute-force top-k, unfiltered and with a
+price + category filter (about 1 in 5 events qualify). Chroma is skipped
+above BENCH_CHROMA_MAX vectors (default: no limit).
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+
+from event_records import event_filter
+from local_index import LocalIndex, build_local_index
+
+DIM = int(os.getenv("BENCH_DIM", "384"))
+CHROMA_MAX = int(os.getenv("BENCH_CHROMA_MAX", "0")) or None
+K = 10
+QUERIES = 100
+CLUSTERS = 200
+CATEGORIES = ["concert", "party", "theater", "exhibition", "workshop", "comedy"]
+FILTER = event_filter(max_price=60, categories=["Party", "Concert"])
+
+
+def synthetic_corpus(n, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((CLUSTERS, DIM)).astype(np.float32)
+    vectors = np.empty((n, DIM), dtype=np.float32)
+    for start in range(0, n, 50000):
+        stop = min(start + 50000, n)
+        vectors[start:stop] = centers[rng.integers(CLUSTERS, size=stop - start)]
+        vectors[start:stop] += 0.6 * rng.standard_normal((stop - start, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    metadatas = [{
+        "source": "event",
+        "event_id": i,
+        "category_key": CATEGORIES[i % len(CATEGORIES)],
+        "price": float((i * 7919) % 200),
+        "date_ts": 20260101 + i % 28,
+    } for i in range(n)]
+    queries = vectors[rng.choice(n, QUERIES, replace=False)] + 0.3 * rng.standard_normal((QUERIES, DIM)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, metadatas, queries
+
+
+def exact_top_k(vectors, queries, mask=None):
+    results = []
+    for query in queries:
+        scores = vectors @ query
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        top = np.argpartition(-scores, K)[:K]
+        results.append({str(i) for i in top if np.isfinite(scores[i])})
+    return results
+
+
+def run_queries(search, queries, where):
+    found = []
+    start = time.perf_counter()
+    for query in queries:
+        found.append({doc.id for doc in search(query.tolist(), k=K, filter=where)})
+    return len(queries) / (time.perf_counter() - start), found
+
+
+def recall(found, exact):
+    return np.mean([len(f & e) / max(1, len(e)) for f, e in zip(found, exact)])
+
+
+def report(label, n, build_s, qps, found, exact, qps_f, found_f, exact_f):
+    print(f"   {n:>7,} | {label:<15} build {build_s:7.1f} s | {qps:8.1f} QPS recall@{K} {recall(found, exact):.3f} | "
+          f"filtered {qps_f:8.1f} QPS recall@{K} {recall(found_f, exact_f):.3f}")
+
+
+def bench(n):
+    vectors, metadatas, queries = synthetic_corpus(n)
+    ids = [str(i) for i in range(n)]
+    documents = [f"Event {i}" for i in range(n)]
+    mask = np.array([m["price"] <= 60 and m["category_key"] in ("party", "concert") for m in metadatas])
+    exact = exact_top_k(vectors, queries)
+    exact_f = exact_top_k(vectors, queries, mask)
+
+    workdir = tempfile.mkdtemp(prefix="bench_vector_")
+    try:
+        for label, nlist in (("local brute", 0), ("local IVF", int(np.sqrt(n)))):
+            path = os.path.join(workdir, label.replace(" ", "_"))
+            os.makedirs(path)
+            start = time.perf_counter()
+            build_local_index(path, ids, vectors, documents, metadatas, nlist=nlist)
+            build_s = time.perf_counter() - start
+            index = LocalIndex(path)
+            qps, found = run_queries(index.similarity_search_by_vector, queries, {"source": "event"})
+            qps_f, found_f = run_queries(index.similarity_search_by_vector, queries, FILTER)
+            report(label, n, build_s, qps, found, exact, qps_f, found_f, exact_f)
+
+        if CHROMA_MAX and n > CHROMA_MAX:
+            print(f"   {n:>7,} | chroma          skipped (BENCH_CHROMA_MAX={CHROMA_MAX})")
+            return
+        from langchain_chroma import Chroma
+        start = time.perf_counter()
+        store = Chroma(collection_name="bench", persist_directory=os.path.join(workdir, "chroma"),
+                       collection_metadata={"hnsw:space": "cosine"})
+        for i in range(0, n, 5000):
+            store._collection.add(ids=ids[i:i + 5000], embeddings=vectors[i:i + 5000],
+                                  documents=documents[i:i + 5000], metadatas=metadatas[i:i + 5000])
+        build_s = time.perf_counter() - start
+        qps, found = run_queries(store.similarity_search_by_vector, queries, {"source": "event"})
+        qps_f, found_f = run_queries(store.similarity_search_by_vector, queries, FILTER)
+        report("chroma", n, build_s, qps, found, exact, qps_f, found_f, exact_f)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    print(f"   dim {DIM}, {QUERIES} queries, top-{K}")
+    for size in [int(a) for a in sys.argv[1:]] or (1000, 50000, 500000):
+        bench(size)
@@ -0,0 +1,166 @@
+"""
+Local vibe gate vs the LLM YES/NO relevance check in vibe_worker.
+
+    python bench_vibe_gate.py
+
+Labels: a hand-labeled set of chat messages (English and Romanian) stands
+in for the LLM's answers, labeled by the rules of build_vibe_check_prompt
+(any hint of taste, personality or mood -> YES; logistics and small talk ->
+NO). They are written out as a vibe_gate log and go through the same
+`vibe_gate.train` a real log would: fit on 80%, report on the held-out 20%.
+Also 5-fold numbers over the whole set, since the held-out slice is small;
+train only saves the model if those favor it over the prior.
+The numbers are illustrative only: the labels were written by the same
+person who wrote the lexicon, so they flatter the prior. Precision/recall
+against the real LLM needs a VIBE_GATE_LOG of its answers
+(`python vibe_gate.py eval <log>`).
+
+Cost: the gate's own latency is measured; the LLM side is BENCH_LLM_MS
+(default 700, an assumption, replace with llm_ms from a real log) and
+the check's prompt tokens with the real system prompt and no history (a
+lower bound: the check also carries the conversation). Savings assume
+VIBE_GATE_LOG is on, so the shadow sample still goes to the LLM.
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+WORKDIR = tempfile.mkdtemp(prefix="bench_vibe_gate_")
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["QUERY_CACHE_FILE"] = os.path.join(WORKDIR, "query_cache.db")
+
+import rag_logic
+import vibe_gate
+from vibe_gate import VibeGate
+from vibe_worker import build_vibe_check_prompt
+
+LLM_MS = float(os.getenv("BENCH_LLM_MS", "700"))
+
+YES = [
+    # English
+    "I like jazz", "Something chill", "Not a fan of crowds", "I want to dance",
+    "I'm into techno and late nights", "something romantic for a date night",
+    "I love theater, especially comedies", "we're looking for something quiet and cozy",
+    "my girlfriend loves ballet", "I hate loud places", "anything with live music",
+    "I'm more of a museum person", "I prefer outdoor stuff", "my kids love puppets",
+    "something fun for the whole family", "I'm a huge rock fan", "art exhibitions please",
+    "I'd rather avoid clubs", "feeling adventurous tonight", "I'm pretty introverted",
+    "looking for a wild party", "I enjoy wine tastings", "stand-up comedy sounds great",
+    "I'm bored, surprise me with something weird", "classical music is my thing",
+    "nothing too fancy, I like laid back places", "I want to meet new people",
+    "we're foodies", "I need something relaxing after a long week", "dark humor is my favourite",
+    "I'm a big reader, any book events?", "love the christmas markets", "electronic music only",
+    "I don't like standing for hours", "a calm evening with good conversation",
+    "something artsy and a bit alternative", "I'm not into sports", "opera would be amazing",
+    "I'm in the mood to laugh", "we love board games", "I miss going to concerts",
+    "I'm a student, I like cheap and cheerful stuff", "my partner is into photography",
+    "loud music gives me a headache", "I'm a night owl",
+    # Romanian
+    "imi place jazz-ul", "ceva linistit", "nu-mi plac aglomeratiile", "vreau sa dansez",
+    "iubesc teatrul", "ceva romantic pentru o intalnire", "sunt fan rock",
+    "prefer muzica clasica", "as vrea ceva relaxant", "imi plac expozitiile de arta",
+    "copiii mei adora spectacolele de papusi", "nu suport zgomotul", "ceva distractiv cu prietenii",
+    "sunt pasionat de film", "vreau o petrecere nebuna", "ne place vinul bun",
+    "ceva cultural, poate un muzeu", "sunt introvertit", "caut ceva amuzant, o comedie",
+    "mi-e dor de concerte", "ador craciunul si targurile", "prefer locurile mici si intime",
+]
+
+NO = [
+    # English
+    "NYC", "Tomorrow", "hi", "hello!", "thanks", "ok", "yes", "no", "sure", "cool",
+    "what time does it start?", "how much are the tickets?", "is it far from the old town?",
+    "this weekend", "friday evening", "under 100 lei", "near Piata Unirii",
+    "what's the address?", "can I buy tickets online?", "is there parking?", "in Bucharest",
+    "tonight around 8pm", "for 4 people", "sector 3", "show me more", "next one",
+    "what else is there?", "any other options?", "is it free?", "how long is it?",
+    "saturday", "december 20th", "send it to my email", "thank you so much",
+    "can you repeat that?", "which one is closer?", "what's the date of the second one?",
+    "is it sold out?", "how do I get there by metro?", "what language is it in?",
+    "ok book it", "never mind", "start over", "give me the link",
+    "at 7", "budget is 50 euro", "near me", "in 2 hours",
+    "I would like 2 tickets for tomorrow", "can I book a ticket for friday", "where do you live",
+    "I'd like to go on saturday at 8", "is it a live show?",
+    # Romanian
+    "salut", "buna", "mersi", "multumesc", "da", "nu", "maine", "diseara", "sambata seara",
+    "cat costa biletele?", "la ce ora incepe?", "unde este?", "in centru", "aproape de metrou",
+    "sub 100 de lei", "pentru doua persoane", "mai arata-mi", "altceva?", "e gratuit?",
+    "cum ajung acolo?", "care e adresa?", "vineri", "in weekend", "trimite-mi pe email",
+    "ok, multumesc", "mai sunt bilete?", "cat dureaza?",
+]
+
+MESSAGES = [(m, "YES") for m in YES] + [(m, "NO") for m in NO]
+# Logistics with a word that usually signals taste: must not be a confident YES
+AMBIGUOUS = ["I would like 2 tickets for tomorrow", "can I book a ticket for friday", "where do you live",
+             "I'd like to go on saturday at 8", "is it a live show?", "ok book it"]
+
+
+def write_log(path, prompt_tokens):
+    with open(path, "w", encoding="utf-8") as f:
+        for i, (message, label) in enumerate(MESSAGES):
+            f.write(json.dumps({"ts": i, "message": message, "p": None, "gate": "UNSURE", "llm": label,
+                                "llm_ms": LLM_MS, "prompt_tokens": prompt_tokens[message]}, ensure_ascii=False) + "\n")
+
+
+def cross_validate(rows, folds=5):
+    """vibe_gate.cross_validate, printed."""
+    totals = vibe_gate.cross_validate(rows, folds)
+    print(f"\n🔁 {folds}-fold over all {len(rows)} messages")
+    for name, (tp, fp, fn, tn, unsure) in totals.items():
+        decided = tp + fp + fn + tn
+        print(f"   {name:<8} decided locally {decided / len(rows):.1%} | YES precision {tp / max(1, tp + fp):.3f} "
+              f"recall {tp / max(1, tp + fn):.3f} | NO precision {tn / max(1, tn + fn):.3f} "
+              f"| agreement with LLM-only {(len(rows) - fp - fn) / len(rows):.3f}")
+    return totals
+
+
+def gate_latency(gate, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message, _ in MESSAGES:
+            gate.decide(message)
+    return (time.perf_counter() - start) / (repeat * len(MESSAGES))
+
+
+def main():
+    system = rag_logic.current_system_message()
+    prompt_tokens = {m: rag_logic.count_tokens([system, build_vibe_check_prompt(m)]) for m, _ in MESSAGES}
+    log_path = os.path.join(WORKDIR, "vibe_gate_log.jsonl")
+    model_path = os.path.join(WORKDIR, "vibe_gate_model.json")
+    write_log(log_path, prompt_tokens)
+    print(f"🏷️  {len(YES)} YES / {len(NO)} NO hand-labeled messages, LLM check assumed at {LLM_MS:.0f} ms, "
+          f"{statistics.mean(prompt_tokens.values()):.0f} prompt tokens (system prompt, no history)")
+    print("   ⚠️  Illustrative: labeled by the lexicon's author, not by the LLM.")
+
+    print("\n🔀 Logistics with taste-like words (prior)")
+    for message in AMBIGUOUS:
+        decision, p = VibeGate().decide(message)
+        print(f"   {p:.2f} {'LLM' if decision is None else 'YES' if decision else 'NO':<4} {message}")
+
+    print("\n🧪 vibe_gate.train (80/20 split)")
+    model = vibe_gate.train(log_path, model_path)
+    totals = cross_validate(vibe_gate.load_labeled(log_path))
+
+    print(f"\n⏱️  gate decision: prior {gate_latency(VibeGate()) * 1e6:.1f} µs | "
+          f"trained {gate_latency(VibeGate(model)) * 1e6:.1f} µs per message")
+    # Confident decisions skip the LLM, except the shadow sample kept for labels
+    skipped_share = 1 - vibe_gate.VIBE_GATE_SHADOW_RATE
+    for name, counts in totals.items():
+        coverage = 1 - counts[4] / len(MESSAGES)
+        print(f"   {name:<8} LLM relevance checks per turn 1.00 -> {1 - coverage * skipped_share:.2f} | saved per turn "
+              f"~{coverage * skipped_share * LLM_MS:.0f} ms of LLM time, "
+              f"~{coverage * skipped_share * statistics.mean(prompt_tokens.values()):.0f} prompt tokens")
+
+if __name__ == "__main__":
+    try:
+        # rag_logic may print while loading; keep the report readable
+        with contextlib.redirect_stderr(io.StringIO()):
+            main()
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
+    sys.exit(0)
@@ -0,0 +1,73 @@
+import json
+import os
+
+# --- CONFIGURATION ---
+# How long /chat/stream keeps the connection open after the reply, waiting
+# for the background vibe assessment to publish the updated profile
+PROFILE_STREAM_WAIT = float(os.getenv("CHAT_STREAM_PROFILE_WAIT", "20"))
+
+SEARCH_MARKER = "SEARCH_ACTION"
+
+
+def sse_frame(event, data):
+    """One Server-Sent Events frame with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class CommandStreamFilter:
+    """
+    Passes reply tokens through while holding back SEARCH_ACTION commands:
+    the marker and the rest of its line are dropped, text before it on the
+    same line stays (it may already be on the client's screen). A tail that
+    could still grow into the marker waits for the next chunk. /chat applies
+    the same rule through strip_command().
+    """
+
+    def __init__(self):
+        self.pending = ""
+        self.in_command = False
+
+    def feed(self, text):
+        self.pending += text
+        out = []
+        while self.pending:
+            if self.in_command:
+                newline = self.pending.find("\n")
+                if newline == -1:
+                    self.pending = ""
+                    break
+                self.pending = self.pending[newline + 1:]
+                self.in_command = False
+                continue
+
+            upper = self.pending.upper()
+            at = upper.find(SEARCH_MARKER)
+            if at != -1:
+                # "**SEARCH_ACTION:**" - drop the markdown in front of it too
+                out.append(self.pending[:at].rstrip("*`"))
+                self.pending = self.pending[at + len(SEARCH_MARKER):]
+                self.in_command = True
+                continue
+
+            keep = 0
+            for n in range(min(len(SEARCH_MARKER) - 1, len(upper)), 0, -1):
+                if SEARCH_MARKER.startswith(upper[-n:]):
+                    keep = n
+                    break
+            while keep < len(upper) and upper[-keep - 1] in "*`":
+                keep += 1
+            out.append(self.pending[:len(self.pending) - keep])
+            self.pending = self.pending[len(self.pending) - keep:]
+            break
+        return "".join(out)
+
+    def flush(self):
+        text = "" if self.in_command else self.pending
+        self.pending = ""
+        return text
+
+
+def strip_command(text):
+    """A whole reply with its SEARCH_ACTION commands removed, exactly as streamed."""
+    command_filter = CommandStreamFilter()
+    return (command_filter.feed(text) + command_filter.flush()).strip()
@@ -1,73 +1,365 @@
+import asyncio
+import os
+import random
 import smtplib
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import os
+from dotenv import load_dotenv
+from telemetry import span
 
 # CONFIGURATION
-# In production, use os.getenv("EMAIL_USER")
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
-SENDER_EMAIL = "sick7bestemv14@gmail.com" # <--- REPLACE THIS
-SENDER_PASSWORD = "olnrvvvobgqcqfqz"   # <--- REPLACE THIS
+load_dotenv(dotenv_path="./.env")
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "20"))
+# No defaults: set both in .env (for Gmail, an app password)
+SENDER_EMAIL = os.getenv("EMAIL_USER")
+SENDER_PASSWORD = os.getenv("EMAIL_PASSWORD")
+
+# Open SMTP connections kept for reuse (also the number of parallel senders)
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", "3"))
+# Servers drop idle connections; older ones are replaced instead of reused
+EMAIL_CONN_MAX_IDLE = float(os.getenv("EMAIL_CONN_MAX_IDLE", "120"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "4"))
+EMAIL_RETRY_BASE = float(os.getenv("EMAIL_RETRY_BASE", "2"))   # seconds, doubled per attempt
+EMAIL_JOB_HISTORY = int(os.getenv("EMAIL_JOB_HISTORY", "10000"))
 
-def send_event_email(user_email, event_data):
+
+def build_event_email(user_email, event_data):
     """
-    Sends an HTML email to the user with the event details.
+    The HTML email with the event details, ready for sendmail().
     """
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["Subject"] = f"Event Found: {event_data.get('title', 'Cool Event')}"
-        msg["From"] = SENDER_EMAIL
-        msg["To"] = user_email
-
-        # HTML Content
-        html_content = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; border: 1px solid #ddd; border-radius: 8px; overflow: hidden;">
-                <div style="background-color: #2563EB; padding: 20px; text-align: center; color: white;">
-                    <h1 style="margin: 0;">SocialSync Event</h1>
-                    <p>We found something matching your vibe!</p>
-                </div>
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = f"Event Found: {event_data.get('title', 'Cool Event')}"
+    msg["From"] = SENDER_EMAIL
+    msg["To"] = user_email
+
+    # HTML Content
+    html_content = f"""
+    <html>
+    <body style="font-family: Arial, sans-serif; color: #333;">
+        <div style="max-width: 600px; margin: 0 auto; border: 1px solid #ddd; border-radius: 8px; overflow: hidden;">
+            <div style="background-color: #2563EB; padding: 20px; text-align: center; color: white;">
+                <h1 style="margin: 0;">SocialSync Event</h1>
+                <p>We found something matching your vibe!</p>
+            </div>
+            
+            <div style="padding: 20px;">
+                <h2 style="color: #1F2937;">{event_data.get('title')}</h2>
+                <p><strong>📅 Date:</strong> {event_data.get('date')}</p>
+                <p><strong>📍 Location:</strong> {event_data.get('location')}</p>
+                <p><strong>💰 Cost:</strong> {event_data.get('cost')}</p>
                 
-                <div style="padding: 20px;">
-                    <h2 style="color: #1F2937;">{event_data.get('title')}</h2>
-                    <p><strong>📅 Date:</strong> {event_data.get('date')}</p>
-                    <p><strong>📍 Location:</strong> {event_data.get('location')}</p>
-                    <p><strong>💰 Cost:</strong> {event_data.get('cost')}</p>
-                    
-                    <hr style="border: 0; border-top: 1px solid #eee; margin: 20px 0;">
-                    
-                    <p style="font-style: italic;">"{event_data.get('description')}"</p>
-                    
-                    <div style="text-align: center; margin-top: 30px;">
-                        <a href="{event_data.get('url')}" 
-                           style="background-color: #10B981; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; font-weight: bold;">
-                           Check Full Details
-                        </a>
-                    </div>
-                </div>
+                <hr style="border: 0; border-top: 1px solid #eee; margin: 20px 0;">
+                
+                <p style="font-style: italic;">"{event_data.get('description')}"</p>
                 
-                <div style="background-color: #f9fafb; padding: 15px; text-align: center; font-size: 12px; color: #6b7280;">
-                    <p>Sent by SocialSync AI Agent.</p>
+                <div style="text-align: center; margin-top: 30px;">
+                    <a href="{event_data.get('url')}" 
+                       style="background-color: #10B981; color: white; padding: 12px 24px; text-decoration: none; border-radius: 5px; font-weight: bold;">
+                       Check Full Details
+                    </a>
                 </div>
             </div>
-        </body>
-        </html>
-        """
-
-        part = MIMEText(html_content, "html")
-        msg.attach(part)
-
-        # Sending the email
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(SENDER_EMAIL, SENDER_PASSWORD)
-        server.sendmail(SENDER_EMAIL, user_email, msg.as_string())
-        server.quit()
-        
+            
+            <div style="background-color: #f9fafb; padding: 15px; text-align: center; font-size: 12px; color: #6b7280;">
+                <p>Sent by SocialSync AI Agent.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+    part = MIMEText(html_content, "html")
+    msg.attach(part)
+
+    return msg.as_string()
+
+
+# --- CONNECTION POOL ---
+# Messages the server rejected for good: retrying the same mail won't help
+PERMANENT_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPAuthenticationError)
+
+
+def is_permanent(error):
+    # ValueError: no credentials configured
+    if isinstance(error, PERMANENT_ERRORS + (ValueError,)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class SMTPPool:
+    """
+    Persistent SMTP connections (STARTTLS + login done once per connection).
+    Blocking smtplib calls, so use it from threads. A connection that went
+    stale is dropped and the send retried once on a fresh one.
+    """
+
+    def __init__(self, host=SMTP_SERVER, port=SMTP_PORT, user=SENDER_EMAIL, password=SENDER_PASSWORD,
+                 starttls=SMTP_STARTTLS, size=EMAIL_POOL_SIZE, max_idle=EMAIL_CONN_MAX_IDLE):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.max_idle = max_idle
+        self.slots = threading.BoundedSemaphore(size)
+        self.lock = threading.Lock()
+        self.idle = []   # (connection, last used) - most recent last
+        self.stats = {"connects": 0, "reused": 0, "reconnects": 0, "sent": 0, "errors": 0}
+
+    @property
+    def configured(self):
+        """A sender address and a password (empty for servers without auth)."""
+        return bool(self.user) and self.password is not None
+
+    def _connect(self):
+        if not self.configured:
+            raise ValueError("ERROR: EMAIL_USER / EMAIL_PASSWORD not found in .env file")
+        conn = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            if self.starttls:
+                conn.starttls()
+            if self.password:
+                conn.login(self.user, self.password)
+        except Exception:
+            self._close(conn)
+            raise
+        self.stats["connects"] += 1
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+    def _acquire(self):
+        """Returns (connection, reused). Blocks while all connections are busy."""
+        self.slots.acquire()
+        stale = []
+        conn = None
+        with self.lock:
+            while self.idle:
+                candidate, last_used = self.idle.pop()
+                if time.monotonic() - last_used < self.max_idle:
+                    conn = candidate
+                    break
+                stale.append(candidate)
+        for old in stale:
+            self._close(old)
+        if conn is not None:
+            self.stats["reused"] += 1
+            return conn, True
+        try:
+            return self._connect(), False
+        except Exception:
+            self.slots.release()
+            raise
+
+    def _release(self, conn):
+        with self.lock:
+            self.idle.append((conn, time.monotonic()))
+        self.slots.release()
+
+    def _discard(self, conn):
+        self._close(conn)
+        self.slots.release()
+
+    def send(self, to, message):
+        for attempt in (1, 2):
+            conn, reused = self._acquire()
+            try:
+                conn.sendmail(self.user, [to], message)
+            except smtplib.SMTPServerDisconnected:
+                self._discard(conn)
+                if reused and attempt == 1:
+                    # The server dropped us; the other idle connections likely went too
+                    self.stats["reconnects"] += 1
+                    self.close()
+                    continue
+                self.stats["errors"] += 1
+                raise
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                # smtplib already sent RSET, the connection is still good
+                self._release(conn)
+                self.stats["errors"] += 1
+                raise
+            except Exception:
+                self._discard(conn)
+                self.stats["errors"] += 1
+                raise
+            self._release(conn)
+            self.stats["sent"] += 1
+            return
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def metrics(self):
+        with self.lock:
+            idle = len(self.idle)
+        return {"size": self.size, "idle": idle, **self.stats}
+
+
+def send_event_email(user_email, event_data, pool=None):
+    """
+    Sends an HTML email to the user with the event details, right away
+    (blocking). The API queues mails through EmailQueue instead.
+    """
+    try:
+        with span("email_send"):
+            (pool or SMTPPool(size=1)).send(user_email, build_event_email(user_email, event_data))
         return True, "Email sent successfully"
 
     except Exception as e:
         print(f"Email Error: {e}")
-        return False, str(e)
\ No newline at end of file
+        return False, str(e)
+
+
+# --- SEND QUEUE ---
+class EmailQueue:
+    """
+    Background delivery, so /send-event-email answers with a job ID right
+    away. Workers send through the pool; transient failures are retried
+    with exponential backoff (plus jitter), permanent ones fail the job.
+    Job states: queued -> sending -> (retrying ->) sent | failed.
+    """
+
+    def __init__(self, pool, workers=None, max_attempts=EMAIL_MAX_ATTEMPTS, retry_base=EMAIL_RETRY_BASE,
+                 history=EMAIL_JOB_HISTORY):
+        self.pool = pool
+        self.workers = workers or pool.size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.history = history
+        self.queue = asyncio.Queue()
+        self.jobs = OrderedDict()   # job_id -> job, oldest first
+        self.retry_timers = {}
+        self.unfinished = 0
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.tasks = []
+        self.stats = {"submitted": 0, "sent": 0, "failed": 0, "retries": 0}
+
+    # --- LIFECYCLE ---
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for timer in self.retry_timers.values():
+            timer.cancel()
+        self.retry_timers = {}
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        await asyncio.to_thread(self.pool.close)
+
+    # --- PRODUCER SIDE ---
+    def submit(self, to, event_data):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self.jobs[job_id] = {
+            "id": job_id,
+            "to": to,
+            "subject": event_data.get("title"),
+            "status": "queued",
+            "attempts": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "message": build_event_email(to, event_data),
+        }
+        self.stats["submitted"] += 1
+        self.unfinished += 1
+        self.idle.clear()
+        self.queue.put_nowait(job_id)
+        self._prune()
+        return job_id
+
+    def status(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key != "message"}
+
+    async def join(self):
+        """Waits until every submitted job is sent or failed."""
+        await self.idle.wait()
+
+    def metrics(self):
+        return {
+            "queue_depth": self.queue.qsize(),
+            "retrying": len(self.retry_timers),
+            "unfinished": self.unfinished,
+            "workers": len(self.tasks),
+            **self.stats,
+            "pool": self.pool.metrics(),
+        }
+
+    def _prune(self):
+        # Forget the oldest finished jobs once the history is full
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.history:
+                break
+            if self.jobs[job_id]["status"] in ("sent", "failed"):
+                del self.jobs[job_id]
+
+    def _finish(self, job, status, error=None):
+        job["status"] = status
+        job["error"] = error
+        job["updated_at"] = time.time()
+        job.pop("message", None)
+        self.stats[status] += 1
+        self.unfinished -= 1
+        if not self.unfinished:
+            self.idle.set()
+
+    def _requeue(self, job_id):
+        self.retry_timers.pop(job_id, None)
+        self.queue.put_nowait(job_id)
+
+    # --- CONSUMER SIDE ---
+    async def _run(self):
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._deliver(self.jobs[job_id])
+            except Exception as e:
+                print(f"Email worker error: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, job):
+        job["status"] = "sending"
+        job["attempts"] += 1
+        job["updated_at"] = time.time()
+        try:
+            with span("email_send"):
+                await asyncio.to_thread(self.pool.send, job["to"], job["message"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if is_permanent(e) or job["attempts"] >= self.max_attempts:
+                print(f"Email Error ({job['to']}): {error}")
+                self._finish(job, "failed", error)
+                return
+            delay = self.retry_base * 2 ** (job["attempts"] - 1) * random.uniform(0.8, 1.2)
+            job["status"] = "retrying"
+            job["error"] = error
+            self.stats["retries"] += 1
+            self.retry_timers[job["id"]] = asyncio.get_running_loop().call_later(delay, self._requeue, job["id"])
+            return
+        self._finish(job, "sent")
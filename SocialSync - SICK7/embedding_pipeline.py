@@ -0,0 +1,146 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# --- CONFIGURATION ---
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+EMBED_CHECKPOINT_FILE = os.getenv("EMBED_CHECKPOINT_FILE", "embed_checkpoint.db")
+
+
+def is_rate_limited(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError"
+
+
+class EmbeddingCheckpoint:
+    """
+    content_hash -> vector, on disk. Every finished batch lands here, so an
+    interrupted run resumes without paying for the same batches again.
+    """
+
+    def __init__(self, model, path=EMBED_CHECKPOINT_FILE):
+        self.model = model
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, content_hash)
+            )
+        """)
+
+    def get_many(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        with self.lock:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings WHERE model = ? "
+                    f"AND content_hash IN ({','.join('?' * len(chunk))})",
+                    [self.model, *chunk],
+                ).fetchall()
+                for content_hash, blob in rows:
+                    found[content_hash] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, hashes, vectors):
+        rows = [(self.model, h, array("f", v).tobytes()) for h, v in zip(hashes, vectors)]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, content_hash, vector) VALUES (?, ?, ?)", rows
+            )
+
+    def retain_only(self, hashes):
+        """Drops vectors for chunks that are no longer in the corpus."""
+        with self.lock:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (content_hash TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep")
+            self.conn.executemany("INSERT OR IGNORE INTO keep VALUES (?)", [(h,) for h in hashes])
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE model = ? AND content_hash NOT IN (SELECT content_hash FROM keep)",
+                (self.model,),
+            )
+
+
+def embed_with_backoff(embed_fn, texts, max_retries=EMBED_MAX_RETRIES):
+    """Calls embed_fn(texts), backing off exponentially (with jitter) on 429s."""
+    for attempt in range(max_retries + 1):
+        try:
+            return embed_fn(texts)
+        except Exception as e:
+            if not is_rate_limited(e) or attempt == max_retries:
+                raise
+            delay = min(60.0, 0.5 * 2 ** attempt) * (0.5 + random.random())
+            print(f"      [429] Rate limited, retrying batch in {delay:.1f}s...")
+            time.sleep(delay)
+
+
+def embed_in_batches(texts, hashes, embed_fn, checkpoint=None,
+                     batch_size=EMBED_BATCH_SIZE, concurrency=EMBED_CONCURRENCY):
+    """
+    Embeds `texts` in batches with at most `concurrency` requests in flight.
+    Batches are submitted as earlier ones finish, so memory stays bounded.
+    Returns (vectors aligned with texts, stats dict).
+    """
+    start = time.perf_counter()
+    vectors = [None] * len(texts)
+
+    # 1. Resume: anything already checkpointed is free
+    done = checkpoint.get_many(set(hashes)) if checkpoint else {}
+    todo = []
+    for i, h in enumerate(hashes):
+        if h in done:
+            vectors[i] = done[h]
+        else:
+            todo.append(i)
+    resumed = len(texts) - len(todo)
+
+    batches = (todo[i:i + batch_size] for i in range(0, len(todo), batch_size))
+    embedded = 0
+
+    # 2. Keep a bounded window of batches in flight
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        in_flight = {}
+
+        def submit_next():
+            batch = next(batches, None)
+            if batch is not None:
+                future = pool.submit(embed_with_backoff, embed_fn, [texts[i] for i in batch])
+                in_flight[future] = batch
+
+        for _ in range(concurrency):
+            submit_next()
+
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                batch = in_flight.pop(future)
+                batch_vectors = future.result()
+                for i, vector in zip(batch, batch_vectors):
+                    vectors[i] = vector
+                if checkpoint:
+                    checkpoint.put_many([hashes[i] for i in batch], batch_vectors)
+                embedded += len(batch)
+                elapsed = time.perf_counter() - start
+                print(f"      [Embed] {embedded}/{len(todo)} docs ({embedded / elapsed:.1f} docs/s)")
+                submit_next()
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "embedded": embedded,
+        "resumed": resumed,
+        "seconds": round(elapsed, 3),
+        "docs_per_second": round(embedded / elapsed, 1) if elapsed else 0.0,
+    }
+    return vectors, stats
+
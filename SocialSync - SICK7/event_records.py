@@ -0,0 +1,213 @@
+import datetime
+import hashlib
+import re
+from typing import Optional
+from pydantic import BaseModel
+
+# Separator between entries in data_raw/scraped_events.txt
+EVENT_SEPARATOR = "------------------------------------------------"
+
+
+class EventData(BaseModel):
+    title: str
+    date: str
+    location: str
+    cost: str
+    description: str
+    url: str
+    id: Optional[int] = None
+    category: str = ""
+
+
+def parse_event_fields(raw_text):
+    """
+    Splits an event text block ("Event: ...\\nDate: ...") into a dict.
+    Only ingest.py should need this; retrieval reads the stored metadata.
+    """
+    info = {}
+    for line in raw_text.split('\n'):
+        if ": " in line:
+            key, val = line.split(": ", 1)
+            info[key.strip()] = val.strip()
+    return info
+
+
+def resolve_event_url(event_data, main_source_url):
+    """Use the event's own URL if the extractor found one, else the listing page."""
+    specific_url = event_data.get("event_url")
+    if not specific_url or "http" not in specific_url:
+        specific_url = main_source_url
+    return specific_url
+
+
+def format_event_entry(event_data, main_source_url):
+    """One scraped_events.txt entry (text block + separator) for an extracted event."""
+    name = event_data.get("name", "Unknown")
+    cat = event_data.get("category", "General")
+    desc = event_data.get("description", "No description available.")
+    date = event_data.get("date", "Upcoming")
+    loc = event_data.get("location", "Bucharest")
+
+    # Handle Price Display (events.db stores prices as REAL: 50.0 -> "50 RON")
+    price_val = event_data.get("price", 0)
+    if isinstance(price_val, float) and price_val.is_integer():
+        price_val = int(price_val)
+    if price_val == 0:
+        price_str = "Free / Check Link"
+    else:
+        price_str = f"{price_val} RON"
+
+    return f"""Event: {name}
+Category: {cat}
+Description: {desc}
+Target Audience: General.
+Date: {date}
+Location: {loc}
+Cost: {price_str}
+Source: {resolve_event_url(event_data, main_source_url)}
+
+{EVENT_SEPARATOR}
+
+"""
+
+
+def event_id_for(url, title, date):
+    """
+    Stable 53-bit integer ID: fits Chroma's int metadata and survives a trip
+    through JavaScript numbers. Listing-page URLs are shared by several
+    events, so title and date are part of the key.
+    """
+    key = f"{url.strip()}|{title.strip().lower()}|{date.strip()}"
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big") >> 11
+
+
+def parse_event_date(date):
+    """
+    "2025-12-06 19:00" -> 20251206, as an int Chroma can range-filter on.
+    0 when the scraper only gave us "Upcoming"/"TBD" or free text.
+    """
+    match = re.search(r"(\d{4})-(\d{1,2})-(\d{1,2})", date or "")
+    if not match:
+        return 0
+    try:
+        day = datetime.date(*(int(part) for part in match.groups()))
+    except ValueError:
+        return 0
+    return date_key(day)
+
+
+def date_key(day):
+    return day.year * 10000 + day.month * 100 + day.day
+
+
+def parse_event_price(cost):
+    """ "53 RON" -> 53.0; "Free / Check Link" (the scraper's no-price marker) -> 0.0 """
+    match = re.search(r"\d+(?:[.,]\d+)?", cost or "")
+    return float(match.group().replace(",", ".")) if match else 0.0
+
+
+def event_filter(date_from=None, date_to=None, max_price=None, categories=None, exclude_ids=None):
+    """
+    Chroma `where` clause for the structured constraints, applied before the
+    vector search. Events with an unknown date (date_ts 0) pass the date window;
+    exclude_ids drops events the session has already been shown.
+    """
+    clauses = [{"source": "event"}]
+    if date_from or date_to:
+        window = []
+        if date_from:
+            window.append({"date_ts": {"$gte": date_key(date_from)}})
+        if date_to:
+            window.append({"date_ts": {"$lte": date_key(date_to)}})
+        dated = window[0] if len(window) == 1 else {"$and": window}
+        clauses.append({"$or": [dated, {"date_ts": 0}]})
+    if max_price is not None:
+        clauses.append({"price": {"$lte": float(max_price)}})
+    if categories:
+        clauses.append({"category_key": {"$in": sorted({c.strip().lower() for c in categories})}})
+    if exclude_ids:
+        clauses.append({"event_id": {"$nin": sorted(exclude_ids)}})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def where_matches(where, metadata):
+    """
+    Evaluates an event_filter() clause against one metadata dict, the way
+    Chroma does: a missing key fails every condition except $ne / $nin.
+    """
+    if "$and" in where:
+        return all(where_matches(clause, metadata) for clause in where["$and"])
+    if "$or" in where:
+        return any(where_matches(clause, metadata) for clause in where["$or"])
+    (key, condition), = where.items()
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    (op, value), = condition.items()
+    if key not in metadata:
+        return op in ("$ne", "$nin")
+    actual = metadata[key]
+    if op == "$eq":
+        return actual == value
+    if op == "$ne":
+        return actual != value
+    if op == "$in":
+        return actual in value
+    if op == "$nin":
+        return actual not in value
+    if op == "$gt":
+        return actual > value
+    if op == "$gte":
+        return actual >= value
+    if op == "$lt":
+        return actual < value
+    if op == "$lte":
+        return actual <= value
+    raise ValueError(f"Unsupported filter operator: {op}")
+
+
+def event_metadata(raw_text):
+    """Typed fields stored next to each event's embedding."""
+    info = parse_event_fields(raw_text)
+    title = info.get("Event", "Unknown")
+    date = info.get("Date", "TBD")
+    url = info.get("Source", "#")
+    cost = info.get("Cost", "Free")
+    category = info.get("Category", "")
+    return {
+        "source": "event",
+        "event_id": event_id_for(url, title, date),
+        "title": title,
+        "date": date,
+        "location": info.get("Location", "Check Link"),
+        "cost": cost,
+        "description": info.get("Description", ""),
+        "url": url,
+        "category": category,
+        # Filterable copies of the display fields
+        "date_ts": parse_event_date(date),
+        "price": parse_event_price(cost),
+        "category_key": category.strip().lower(),
+    }
+
+
+def event_from_metadata(meta):
+    return EventData(
+        id=meta["event_id"],
+        title=meta["title"],
+        date=meta["date"],
+        location=meta["location"],
+        cost=meta["cost"],
+        description=meta["description"],
+        url=meta["url"],
+        category=meta.get("category", ""),
+    )
+
+
+def event_from_document(page_content, metadata):
+    """
+    Indexes built before structured metadata only carry the text blob;
+    fall back to parsing it so an old chroma_db keeps working.
+    """
+    if metadata and "event_id" in metadata:
+        return event_from_metadata(metadata)
+    return event_from_metadata(event_metadata(page_content))
@@ -0,0 +1,219 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from urllib.parse import urlsplit, urlunsplit
+from event_records import EVENT_SEPARATOR, format_event_entry, parse_event_fields, resolve_event_url
+
+# --- CONFIGURATION ---
+EVENTS_DB_FILE = os.getenv("EVENTS_DB_FILE", "events.db")
+# Events not seen by a scrape for this long drop out of scraped_events.txt / the index
+EVENT_RETENTION_DAYS = float(os.getenv("EVENT_RETENTION_DAYS", "14"))
+
+
+def normalize_event_url(url):
+    parts = urlsplit(url.strip())
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ""))
+
+
+def event_key(event_data, main_source_url):
+    """
+    Identity of an event across scrapes: its own page URL when the extractor
+    found one, else a hash of the normalized name + date (listing pages are
+    shared by many events).
+    """
+    url = resolve_event_url(event_data, main_source_url)
+    if url != main_source_url:
+        return "url:" + normalize_event_url(url)
+    name = " ".join(str(event_data.get("name", "")).lower().split())
+    date = " ".join(str(event_data.get("date", "")).lower().split())
+    return "name:" + hashlib.sha1(f"{name}|{date}".encode("utf-8")).hexdigest()
+
+
+class EventStore:
+    """
+    events.db (WAL mode). Every scrape upserts into the same table, so
+    readers never see it empty and first_seen/last_seen track history.
+    """
+
+    def __init__(self, path=EVENTS_DB_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(events)")]
+        if columns and "event_key" not in columns:
+            self._migrate_legacy()
+        else:
+            self._create_schema()
+
+    def _create_schema(self):
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_key TEXT NOT NULL UNIQUE,
+                event_name TEXT,
+                price REAL,
+                date_time TEXT,
+                available_seats INTEGER,
+                category TEXT,
+                source_url TEXT,
+                list_url TEXT,
+                location TEXT,
+                description TEXT,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_events_date_time ON events (date_time)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_events_category ON events (category)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_events_last_seen ON events (last_seen)")
+
+    def _migrate_legacy(self, txt_path=os.path.join("data_raw", "scraped_events.txt")):
+        """
+        The old scraper recreated `events` without location/description on
+        every run. Keep its rows, filling those fields from the matching
+        scraped_events.txt entries when the file is still around.
+        """
+        details = {}
+        if os.path.exists(txt_path):
+            with open(txt_path, "r", encoding="utf-8") as f:
+                for chunk in f.read().split(EVENT_SEPARATOR):
+                    info = parse_event_fields(chunk)
+                    if "Source" in info:
+                        details[info["Source"]] = info
+
+        rows = self.conn.execute(
+            "SELECT event_name, price, date_time, available_seats, category, source_url FROM events ORDER BY id"
+        ).fetchall()
+        url_counts = {}
+        for row in rows:
+            url_counts[row[5]] = url_counts.get(row[5], 0) + 1
+
+        events = []
+        for name, price, date, seats, category, url in rows:
+            info = details.get(url, {})
+            # A URL shared by several rows is a listing page, not the event's own
+            main_source_url = url if url_counts[url] > 1 else ""
+            events.append(({
+                "name": name,
+                "price": price,
+                "date": date,
+                "category": category,
+                "event_url": url,
+                "location": info.get("Location"),
+                "description": info.get("Description"),
+            }, main_source_url))
+
+        self.conn.execute("BEGIN")
+        try:
+            self.conn.execute("ALTER TABLE events RENAME TO events_legacy")
+            self._create_schema()
+            self._upsert(events)
+            self.conn.execute("DROP TABLE events_legacy")
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        print(f"   🗄️  Migrated {len(rows)} events in {self.path} to the upsert schema.")
+
+    def _upsert(self, events, now=None):
+        now = now or time.time()
+        rows = []
+        for ev, main_source_url in events:
+            rows.append((
+                event_key(ev, main_source_url),
+                ev.get("name"),
+                ev.get("price", 0),
+                ev.get("date"),
+                50,
+                ev.get("category"),
+                resolve_event_url(ev, main_source_url),
+                main_source_url,
+                ev.get("location"),
+                ev.get("description"),
+                now,
+                now,
+            ))
+        self.conn.executemany("""
+            INSERT INTO events (event_key, event_name, price, date_time, available_seats, category,
+                                source_url, list_url, location, description, first_seen, last_seen)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(event_key) DO UPDATE SET
+                event_name = excluded.event_name,
+                price = excluded.price,
+                date_time = excluded.date_time,
+                category = excluded.category,
+                source_url = excluded.source_url,
+                list_url = excluded.list_url,
+                location = excluded.location,
+                description = excluded.description,
+                last_seen = excluded.last_seen
+        """, rows)
+        return len(rows)
+
+    def upsert_many(self, events, main_source_url):
+        """Bulk UPSERT of one page's extracted events in a single transaction. Returns (new, updated)."""
+        events = [(ev, main_source_url) for ev in events if ev.get("name")]
+        if not events:
+            return 0, 0
+        keys = list({event_key(ev, url) for ev, url in events})
+        self.conn.execute("BEGIN")
+        try:
+            known = 0
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                known += self.conn.execute(
+                    f"SELECT COUNT(*) FROM events WHERE event_key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchone()[0]
+            self._upsert(events)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return len(keys) - known, known
+
+    def current_events(self, max_age_days=EVENT_RETENTION_DAYS):
+        """
+        Events seen by a recent scrape, oldest first, as (event dict, listing
+        URL) pairs ready for format_event_entry. NULL columns are left out so
+        the formatter's defaults apply. max_age_days=None returns every event.
+        """
+        cutoff = 0 if max_age_days is None else time.time() - max_age_days * 86400
+        rows = self.conn.execute("""
+            SELECT event_name, category, description, date_time, location, price, source_url, list_url
+            FROM events WHERE last_seen >= ? ORDER BY first_seen, id
+        """, (cutoff,)).fetchall()
+        fields = ("name", "category", "description", "date", "location", "price", "event_url")
+        events = []
+        for row in rows:
+            event = {key: value for key, value in zip(fields, row) if value is not None}
+            events.append((event, row[7] or row[6]))
+        return events
+
+    def export_txt(self, path, max_age_days=EVENT_RETENTION_DAYS):
+        """Rewrites scraped_events.txt from the DB (temp file + rename, never half-written)."""
+        events = self.current_events(max_age_days)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for event, main_source_url in events:
+                f.write(format_event_entry(event, main_source_url))
+        os.replace(tmp_path, path)
+        return len(events)
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "export":
+        store = EventStore()
+        path = sys.argv[2] if len(sys.argv) > 2 else os.path.join("data_raw", "scraped_events.txt")
+        print(f"✅ Exported {store.export_txt(path)} events to {path}.")
+    else:
+        print("Usage: python event_store.py export [path]")
@@ -0,0 +1,135 @@
+from urllib.parse import urljoin
+from bs4.builder import HTMLParserTreeBuilder
+from bs4.dammit import UnicodeDammit
+from bs4.element import CData
+
+# BeautifulSoupHTMLParser and builder.parser_args are bs4 internals (checked
+# against beautifulsoup4 4.15). When a release moves them, AVAILABLE is False
+# and scrape.preprocess_html stays on the BeautifulSoup path.
+try:
+    from bs4.builder._htmlparser import BeautifulSoupHTMLParser
+    AVAILABLE = hasattr(HTMLParserTreeBuilder(), "parser_args")
+except ImportError:
+    BeautifulSoupHTMLParser = None
+    AVAILABLE = False
+
+# Streaming version of scrape.preprocess_html: same output, no parse tree.
+#
+# It drives bs4's own html.parser subclass, so entities, CDATA, void
+# elements and stray end tags are handled exactly as BeautifulSoup would,
+# but strings go straight into a flat list instead of Tag/NavigableString
+# objects. Only the strings get_text() would return are kept.
+
+NOISE_TAGS = {"script", "style", "nav", "footer", "header"}
+
+
+class _Frame:
+    __slots__ = ("name", "is_empty_element", "href", "start")
+
+    def __init__(self, name, is_empty_element, href, start):
+        self.name = name
+        self.is_empty_element = is_empty_element
+        self.href = href
+        self.start = start
+
+
+class _TextSink:
+    """
+    Stands in for the BeautifulSoup object the parser normally feeds.
+    Keeps a stack of open tags (for bs4's end-tag rules) and a list of
+    pieces: (original strings, output text). A rewritten <a> collapses its
+    pieces into one, keeping the originals for any enclosing <a>.
+    """
+
+    def __init__(self, base_url):
+        self.builder = HTMLParserTreeBuilder()
+        self.builder.store_line_numbers = False
+        self.base_url = base_url
+        self.contains_replacement_characters = False
+        self.stack = []
+        self.open_counts = {}
+        self.containers = 0   # open rt/rp/style/script/template tags
+        self.noise = 0        # open tags whose subtree is dropped
+        self.current_data = []
+        self.pieces = []
+        self.injected = 0
+
+    def handle_starttag(self, name, namespace, nsprefix, attrs, sourceline=None, sourcepos=None,
+                        namespaces=None):
+        self.endData()
+        href = attrs.get("href") if name == "a" and not self.noise else None
+        frame = _Frame(name, self.builder.can_be_empty_element(name), href, len(self.pieces))
+        self.stack.append(frame)
+        self.open_counts[name] = self.open_counts.get(name, 0) + 1
+        if name in self.builder.string_containers:
+            self.containers += 1
+        if name in NOISE_TAGS:
+            self.noise += 1
+        return frame
+
+    def handle_endtag(self, name, nsprefix=None):
+        self.endData()
+        # Same as BeautifulSoup._popToTag: unknown end tags pop nothing
+        while self.stack and self.open_counts.get(name):
+            if self.pop().name == name:
+                break
+
+    def handle_data(self, data):
+        self.current_data.append(data)
+
+    def endData(self, containerClass=None):
+        if not self.current_data:
+            return
+        data = "".join(self.current_data)
+        self.current_data = []
+        if self.noise:
+            return
+        # get_text() only returns plain strings and CDATA; text inside
+        # rt/rp/template (and comments, doctypes, PIs) is skipped.
+        if containerClass is CData or (containerClass is None and not self.containers):
+            self.pieces.append(((data,), data))
+
+    def pop(self):
+        frame = self.stack.pop()
+        self.open_counts[frame.name] -= 1
+        if frame.name in self.builder.string_containers:
+            self.containers -= 1
+        if frame.name in NOISE_TAGS:
+            self.noise -= 1
+        if frame.href is not None:
+            self.inject_link(frame)
+        return frame
+
+    def inject_link(self, frame):
+        raws = [raw for piece_raws, _ in self.pieces[frame.start:] for raw in piece_raws]
+        text = "".join(s for s in (raw.strip() for raw in raws) if s)
+        if len(text) > 3:
+            full_url = urljoin(self.base_url, frame.href)
+            self.pieces[frame.start:] = [(tuple(raws), f"{text} [URL: {full_url}] ")]
+            self.injected += 1
+
+    def finish(self):
+        self.endData()
+        while self.stack:
+            self.pop()
+
+
+def preprocess_html_fast(html_content, base_url):
+    """Returns (text, injected link count), identical to the BeautifulSoup path."""
+    if not AVAILABLE:
+        raise RuntimeError("fast_preprocess: this bs4 version lacks the parser internals it drives")
+    if isinstance(html_content, bytes):
+        html_content = UnicodeDammit(html_content, is_html=True).unicode_markup
+    sink = _TextSink(base_url)
+    parser = BeautifulSoupHTMLParser(sink, *sink.builder.parser_args[0], **sink.builder.parser_args[1])
+    parser.feed(html_content)
+    parser.close()
+    sink.finish()
+
+    lines = []
+    for _, text in sink.pieces:
+        for line in text.splitlines():
+            line = line.strip()
+            if line:
+                lines.append(line)
+    return "\n".join(lines), sink.injected
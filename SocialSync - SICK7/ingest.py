@@ -1,12 +1,19 @@
 import os
-import shutil
+import sys
 import re
+import hashlib
 from dotenv import load_dotenv
 from langchain_community.document_loaders import TextLoader
 # CHANGED: Import OpenAI Embeddings
 from langchain_openai import OpenAIEmbeddings
 from langchain_chroma import Chroma
 from langchain_core.documents import Document
+from vector_index import create_staging_build, current_index_path, publish_build
+from embedding_pipeline import EmbeddingCheckpoint, embed_in_batches
+from event_records import EVENT_SEPARATOR, event_metadata, format_event_entry
+from event_store import EVENT_RETENTION_DAYS, EVENTS_DB_FILE, EventStore
+from local_index import build_local_index
+from keyword_index import build_keyword_index
 
 load_dotenv(dotenv_path="./.env")
 
@@ -15,27 +22,67 @@ if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("ERROR: OPENAI_API_KEY not found in .env file")
 
 DATA_PATH = "./data_raw"
-DB_PATH = "./chroma_db"
+# Written by scrape.py; when events.db exists it is the source of truth instead
+EVENTS_TXT_FILE = "scraped_events.txt"
+EMBEDDING_MODEL = "text-embedding-3-small"
+# Max records per Chroma write
+CHROMA_WRITE_BATCH = 1000
+# A build with fewer events than this share of the live index is not published (--force to override)
+INGEST_MIN_KEEP_RATIO = float(os.getenv("INGEST_MIN_KEEP_RATIO", "0.5"))
 
-def ingest_data():
-    print("🔄 SOCIALSYNC: Re-indexing Memory (Dual Mode - OpenAI Powered)...")
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
 
-    # 1. Clear old database
-    if os.path.exists(DB_PATH):
-        shutil.rmtree(DB_PATH)
+def load_event_chunks_from_db():
+    """Current events from events.db as text chunks, or None if there is no DB."""
+    if not os.path.exists(EVENTS_DB_FILE):
+        return None
+    store = EventStore(EVENTS_DB_FILE)
+    events = store.current_events()
+    if not events and store.count():
+        # No scrape in the retention window: better stale events than none
+        print(f"   ⚠️  No event in {EVENTS_DB_FILE} seen in the last {EVENT_RETENTION_DAYS:g} days "
+              f"(run scrape.py); indexing all {store.count()} stored events.")
+        events = store.current_events(max_age_days=None)
+    store.close()
+    return [format_event_entry(event, url) for event, url in events]
 
+def load_documents():
+    """
+    Reads every chunk in data_raw (events from events.db when present).
+    Returns (documents, ids); each document carries a content_hash so
+    unchanged chunks can skip re-embedding.
+    """
     documents = []
+    ids = []
     
-    # 2. Iterate through all files in data_raw
+    # Iterate through all files in data_raw
     if not os.path.exists(DATA_PATH):
         print(f"❌ Error: Directory '{DATA_PATH}' not found.")
-        return
+        return documents, ids
+
+    def add_event_chunks(raw_chunks):
+        for chunk in raw_chunks:
+            if "Event:" in chunk:
+                # Parse once here; retrieval reads these typed fields back
+                metadata = event_metadata(chunk.strip())
+                doc_id = str(metadata["event_id"])
+                if doc_id in seen_ids:
+                    continue
+                seen_ids.add(doc_id)
+                documents.append(Document(page_content=chunk.strip(), metadata=metadata))
+                ids.append(doc_id)
+
+    seen_ids = set()
+    db_chunks = load_event_chunks_from_db()
 
     for filename in os.listdir(DATA_PATH):
         file_path = os.path.join(DATA_PATH, filename)
         
         # Skip system files
         if not filename.endswith(".txt"): continue
+        # The txt export is just a copy of the DB
+        if filename == EVENTS_TXT_FILE and db_chunks is not None: continue
 
         print(f"   📂 Processing: {filename}...")
         
@@ -47,35 +94,131 @@ def ingest_data():
             raw_chunks = re.split(r'(?=Tribe:)', raw_text)
             for chunk in raw_chunks:
                 if "Tribe:" in chunk and "Next Question:" in chunk:
+                    tribe = chunk.split("Tribe:", 1)[1].split("\n", 1)[0].strip()
                     documents.append(Document(page_content=chunk.strip(), metadata={"source": "profile"}))
+                    ids.append(f"profile:{tribe}")
             print(f"     -> Extracted {len(raw_chunks)} profiles.")
 
         # MODE B: EVENTS (Standard Split)
         else:
             # Split by dashed line
-            raw_chunks = raw_text.split("------------------------------------------------")
-            for chunk in raw_chunks:
-                if "Event:" in chunk:
-                    documents.append(Document(page_content=chunk.strip(), metadata={"source": "event"}))
+            raw_chunks = raw_text.split(EVENT_SEPARATOR)
+            add_event_chunks(raw_chunks)
             print(f"     -> Extracted {len(raw_chunks)} events.")
 
-    # 3. Save to Vector DB
+    if db_chunks is not None:
+        print(f"   🗄️  Processing: {EVENTS_DB_FILE}...")
+        add_event_chunks(db_chunks)
+        print(f"     -> Extracted {len(db_chunks)} events.")
+
+    for doc in documents:
+        doc.metadata["content_hash"] = content_hash(doc.page_content)
+    return documents, ids
+
+def live_event_count():
+    """Events in the index the API is serving now (0 if there is none)."""
+    path = current_index_path()
+    if not os.path.exists(os.path.join(path, "chroma.sqlite3")):
+        return 0
+    return len(Chroma(persist_directory=path).get(where={"source": "event"}, include=[])["ids"])
+
+def ingest_data(full=False, force=False):
+    """
+    Builds the next index in a staging directory and swaps it in atomically,
+    so the API never sees a missing or half-written index.
+    Incremental by default: only new/changed chunks are embedded and
+    vanished ones deleted. full=True rebuilds from scratch.
+    Refuses to replace the live index with one that lost most of its events
+    (stale or empty events.db, a broken scrape) unless force=True.
+    """
+    mode = "Full" if full else "Incremental"
+    print(f"🔄 SOCIALSYNC: Re-indexing Memory ({mode} - OpenAI Powered)...")
+
+    documents, ids = load_documents()
     if not documents:
         print("❌ Error: No valid data found.")
         return
 
-    print(f"💾 Saving {len(documents)} total memories to Database...")
-    
-    # CHANGED: Using OpenAI Model
-    embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-    
-    Chroma.from_documents(
-        documents=documents, 
-        embedding=embeddings, 
-        persist_directory=DB_PATH
-    )
-    
+    events = sum(doc.metadata.get("source") == "event" for doc in documents)
+    live_events = live_event_count()
+    if not force and live_events and events < live_events * INGEST_MIN_KEEP_RATIO:
+        print(f"❌ Error: New build has {events} events, the live index {live_events} "
+              f"(below INGEST_MIN_KEEP_RATIO {INGEST_MIN_KEEP_RATIO:g}). Check the scrape, "
+              f"or re-run with --force to publish it anyway.")
+        return
+
+    # 1. Stage a copy of the live index (or an empty one)
+    version, staging_path = create_staging_build(copy_current=not full)
+
+    # CHANGED: Using OpenAI Model. Retries are handled by our pipeline (429 backoff).
+    embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL, max_retries=0)
+    store = Chroma(persist_directory=staging_path, embedding_function=embeddings)
+
+    # 2. Diff against what the staged index already holds
+    existing = store.get(include=["metadatas"])
+    existing_meta = {doc_id: meta or {} for doc_id, meta in zip(existing["ids"], existing["metadatas"])}
+    existing_hashes = {doc_id: meta.get("content_hash") for doc_id, meta in existing_meta.items()}
+
+    wanted = set(ids)
+    to_delete = [doc_id for doc_id in existing_hashes if doc_id not in wanted]
+    changed = [
+        (doc_id, doc) for doc_id, doc in zip(ids, documents)
+        if existing_hashes.get(doc_id) != doc.metadata["content_hash"]
+    ]
+    # Same text but new metadata fields (e.g. filters added later): no re-embedding needed
+    retagged = [
+        (doc_id, doc) for doc_id, doc in zip(ids, documents)
+        if existing_hashes.get(doc_id) == doc.metadata["content_hash"] and existing_meta[doc_id] != doc.metadata
+    ]
+    skipped = len(documents) - len(changed)
+
+    # 3. Apply the diff to the staging copy
+    if to_delete:
+        store.delete(ids=to_delete)
+    for i in range(0, len(retagged), CHROMA_WRITE_BATCH):
+        batch = retagged[i:i + CHROMA_WRITE_BATCH]
+        store._collection.update(
+            ids=[doc_id for doc_id, _ in batch],
+            metadatas=[doc.metadata for _, doc in batch],
+        )
+    if changed:
+        print(f"💾 Embedding {len(changed)} new/changed memories...")
+        checkpoint = EmbeddingCheckpoint(EMBEDDING_MODEL)
+        vectors, stats = embed_in_batches(
+            [doc.page_content for _, doc in changed],
+            [doc.metadata["content_hash"] for _, doc in changed],
+            embeddings.embed_documents,
+            checkpoint=checkpoint,
+        )
+        print(f"   ⚡ {stats['embedded']} embedded at {stats['docs_per_second']} docs/s, "
+              f"{stats['resumed']} resumed from checkpoint.")
+
+        for i in range(0, len(changed), CHROMA_WRITE_BATCH):
+            batch = changed[i:i + CHROMA_WRITE_BATCH]
+            store._collection.upsert(
+                ids=[doc_id for doc_id, _ in batch],
+                embeddings=vectors[i:i + CHROMA_WRITE_BATCH],
+                documents=[doc.page_content for _, doc in batch],
+                metadatas=[doc.metadata for _, doc in batch],
+            )
+        checkpoint.retain_only(doc.metadata["content_hash"] for doc in documents)
+
+    # 4. Export the build for the in-process backend (VECTOR_BACKEND=local)
+    #    and the BM25 keyword index
+    snapshot = store._collection.get(include=["embeddings", "documents", "metadatas"])
+    local = build_local_index(staging_path, snapshot["ids"], snapshot["embeddings"],
+                              snapshot["documents"], snapshot["metadatas"])
+    print(f"   🧮 Local index: {local['vectors']} vectors, {local['partitions'] or 'no'} IVF partitions.")
+    keyword_docs = build_keyword_index(staging_path, snapshot["ids"], snapshot["metadatas"])
+    print(f"   🔤 Keyword index: {keyword_docs} events.")
+
+    # 5. Swap it in. Also tells the API to drop results cached against the old index
+    publish_build(version)
+
+    print(f"   📊 Embedded: {len(changed)} | Skipped (unchanged): {skipped} "
+          f"(metadata refreshed: {len(retagged)}) | Deleted: {len(to_delete)}")
     print("✅ SOCIALSYNC: Indexing Complete.")
+    return {"embedded": len(changed), "skipped": skipped, "refreshed": len(retagged), "deleted": len(to_delete)}
 
 if __name__ == "__main__":
-    ingest_data()
\ No newline at end of file
+    ingest_data(full="--full" in sys.argv, force="--force" in sys.argv)
@@ -0,0 +1,105 @@
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+from event_records import where_matches
+
+# In-process BM25 index over the events, written by ingest.py into every
+# index build (keyword_index.json). SEARCH_ACTION queries are short keyword
+# strings, so this ranks them without waiting for an embedding call; see
+# rag_logic.retrieve_events for how it is fused with the vector results.
+
+KEYWORD_INDEX_FILE = "keyword_index.json"
+
+# Title matches count most, then the category
+FIELD_WEIGHTS = {"title": 3, "category": 2, "description": 1, "location": 1}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Tokens are cut to this many letters: a cheap stand-in for a Romanian
+# stemmer ("teatrul"/"teatrului" -> "teatr", "comedie"/"comedy" -> "comed")
+PREFIX_LENGTH = 5
+STOPWORDS = {
+    "a", "al", "ale", "cu", "de", "din", "in", "la", "o", "pe", "pentru", "si", "sau", "un", "una",
+    "and", "at", "for", "me", "of", "on", "or", "some", "something", "the", "to", "with",
+}
+
+
+def fold(text):
+    """Lowercase, no diacritics: "Târgul de Crăciun" -> "targul de craciun" (ș/ş, ț/ţ included)."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def analyze(text):
+    return [token[:PREFIX_LENGTH] for token in re.findall(r"\w+", fold(text)) if token not in STOPWORDS]
+
+
+def build_keyword_index(path, ids, metadatas):
+    """Writes keyword_index.json for the event entries among (ids, metadatas)."""
+    doc_ids, doc_metas, lengths = [], [], []
+    postings = {}
+    for doc_id, meta in zip(ids, metadatas):
+        if not meta or meta.get("source") != "event":
+            continue
+        tf = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in analyze(str(meta.get(field, ""))):
+                tf[term] += weight
+        doc = len(doc_ids)
+        for term, count in tf.items():
+            postings.setdefault(term, []).append([doc, count])
+        doc_ids.append(doc_id)
+        doc_metas.append(meta)
+        lengths.append(sum(tf.values()))
+
+    tmp_path = os.path.join(path, f"{KEYWORD_INDEX_FILE}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"ids": doc_ids, "metadatas": doc_metas, "lengths": lengths, "postings": postings},
+                  f, ensure_ascii=False)
+    os.replace(tmp_path, os.path.join(path, KEYWORD_INDEX_FILE))
+    return len(doc_ids)
+
+
+class KeywordIndex:
+    def __init__(self, path):
+        with open(os.path.join(path, KEYWORD_INDEX_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.ids = data["ids"]
+        self.metadatas = data["metadatas"]
+        self.lengths = data["lengths"]
+        self.postings = data["postings"]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, KEYWORD_INDEX_FILE))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, where=None, limit=20):
+        """
+        BM25 over the query terms. Returns [(doc_id, score, metadata)], best
+        first, only for events matching the Chroma-style `where` clause.
+        Empty when no query term is in the index.
+        """
+        n = len(self.ids)
+        scores = {}
+        for term in set(analyze(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / self.avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        hits = []
+        for doc in sorted(scores, key=lambda d: (-scores[d], d)):
+            if where is None or where_matches(where, self.metadatas[doc]):
+                hits.append((self.ids[doc], scores[doc], self.metadatas[doc]))
+                if len(hits) == limit:
+                    break
+        return hits
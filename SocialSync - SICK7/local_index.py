@@ -0,0 +1,272 @@
+import json
+import os
+import numpy as np
+from langchain_core.documents import Document
+
+# In-process vector index, an alternative to Chroma for retrieval
+# (VECTOR_BACKEND=local). ingest.py writes it into every index build next
+# to the Chroma store, so switching backends needs no re-ingest.
+#
+# Files in a build directory:
+#   local_vectors.npy   float32 (n, dim), L2-normalized rows -> dot = cosine
+#   local_field_*.npy   one column per filterable metadata field
+#   local_ids.json      doc IDs + string vocabularies (source, category_key)
+#   local_records.jsonl one {"document", "metadata"} per row, local_offsets.npy
+#                       holds the byte offset of each line
+#   local_ivf.npz       optional: centroids + row ranges of each partition
+#
+# Vectors and field columns are opened with mmap_mode="r": nothing is copied into
+# the process, and every API worker maps the same page-cache pages.
+
+# --- CONFIGURATION ---
+# Corpora at least this large get IVF partitions (0 disables IVF)
+LOCAL_IVF_MIN_VECTORS = int(os.getenv("LOCAL_IVF_MIN_VECTORS", "20000"))
+# Partitions scanned per query; more means better recall, slower search
+LOCAL_IVF_NPROBE = int(os.getenv("LOCAL_IVF_NPROBE", "16"))
+
+VECTORS_FILE = "local_vectors.npy"
+FIELD_FILE = "local_field_{}.npy"
+IDS_FILE = "local_ids.json"
+RECORDS_FILE = "local_records.jsonl"
+OFFSETS_FILE = "local_offsets.npy"
+IVF_FILE = "local_ivf.npz"
+
+FIELDS_DTYPE = np.dtype([
+    ("source", np.int16),
+    ("category_key", np.int32),
+    ("date_ts", np.int32),
+    ("price", np.float32),
+    ("event_id", np.int64),
+])
+# Metadata keys stored as codes into a vocabulary
+CODED_FIELDS = ("source", "category_key")
+# Rows per chunk when scoring the full matrix (bounds temporary memory)
+SCAN_CHUNK = 65536
+
+
+def has_local_index(path):
+    return os.path.exists(os.path.join(path, VECTORS_FILE)) and os.path.exists(os.path.join(path, IDS_FILE))
+
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _kmeans(vectors, nlist, iterations=10, sample=50000, seed=0):
+    """Spherical k-means on a sample. Returns normalized centroids (nlist, dim)."""
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(len(vectors), size=min(len(vectors), sample), replace=False)
+    data = np.asarray(vectors[np.sort(rows)], dtype=np.float32)
+    centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = data[assign == c]
+            # Empty partition: restart it on a random point
+            centroids[c] = members.sum(axis=0) if len(members) else data[rng.integers(len(data))]
+        centroids = _normalize(centroids)
+    return centroids
+
+
+def _assign(vectors, centroids):
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SCAN_CHUNK):
+        out[start:start + SCAN_CHUNK] = np.argmax(vectors[start:start + SCAN_CHUNK] @ centroids.T, axis=1)
+    return out
+
+
+def build_local_index(path, ids, vectors, documents, metadatas, nlist=None):
+    """
+    Writes the index files into `path` (an index build directory). `nlist`
+    partitions for IVF; None picks sqrt(n) from LOCAL_IVF_MIN_VECTORS up,
+    0 keeps it brute force.
+    """
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    n = len(ids)
+    if nlist is None:
+        nlist = int(np.sqrt(n)) if LOCAL_IVF_MIN_VECTORS and n >= LOCAL_IVF_MIN_VECTORS else 0
+
+    # IVF: store rows grouped by partition, so probing one is a contiguous slice
+    order = np.arange(n)
+    if nlist:
+        centroids = _kmeans(vectors, nlist)
+        assign = _assign(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(nlist + 1))
+        np.savez(os.path.join(path, IVF_FILE), centroids=centroids, bounds=bounds)
+    elif os.path.exists(os.path.join(path, IVF_FILE)):
+        os.remove(os.path.join(path, IVF_FILE))
+
+    vocab = {field: [] for field in CODED_FIELDS}
+    codes = {field: {} for field in CODED_FIELDS}
+    fields = np.zeros(n, dtype=FIELDS_DTYPE)
+    offsets = np.zeros(n, dtype=np.int64)
+    with open(os.path.join(path, RECORDS_FILE), "wb") as f:
+        for row, i in enumerate(order):
+            meta = metadatas[i] or {}
+            for field in CODED_FIELDS:
+                value = meta.get(field)
+                if value not in codes[field]:
+                    codes[field][value] = len(vocab[field])
+                    vocab[field].append(value)
+                fields[field][row] = codes[field][value]
+            fields["date_ts"][row] = meta.get("date_ts", 0)
+            fields["price"][row] = meta.get("price", 0.0)
+            fields["event_id"][row] = meta.get("event_id", -1)
+            offsets[row] = f.tell()
+            f.write(json.dumps({"document": documents[i], "metadata": meta}, ensure_ascii=False).encode("utf-8"))
+            f.write(b"\n")
+
+    np.save(os.path.join(path, VECTORS_FILE), vectors[order])
+    for field in FIELDS_DTYPE.names:
+        np.save(os.path.join(path, FIELD_FILE.format(field)), fields[field])
+    np.save(os.path.join(path, OFFSETS_FILE), offsets)
+    # Written last: has_local_index() only sees complete indexes
+    with open(os.path.join(path, IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump({"ids": [ids[i] for i in order], "vocab": vocab}, f, ensure_ascii=False)
+    return {"vectors": n, "partitions": nlist}
+
+
+class LocalIndex:
+    """
+    Read side. Implements the parts of the langchain VectorStore API that
+    retrieve_events uses (similarity / MMR search by vector with a Chroma
+    `where` filter, get by IDs), so it drops in for Chroma.
+    """
+
+    def __init__(self, path, nprobe=LOCAL_IVF_NPROBE):
+        self.path = path
+        self.nprobe = nprobe
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.fields = {field: np.load(os.path.join(path, FIELD_FILE.format(field)), mmap_mode="r")
+                       for field in FIELDS_DTYPE.names}
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(path, IDS_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.ids = header["ids"]
+        self.row_of = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.codes = {field: {value: code for code, value in enumerate(values)}
+                      for field, values in header["vocab"].items()}
+        self.centroids = self.bounds = None
+        ivf_path = os.path.join(path, IVF_FILE)
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as ivf:
+                self.centroids = ivf["centroids"]
+                self.bounds = ivf["bounds"]
+
+    def count(self):
+        return len(self.ids)
+
+    # --- FILTERS ---
+    def _mask(self, where, rows=slice(None)):
+        """Boolean mask over `rows` for a Chroma where clause ($and/$or, $eq/$ne/$in/$nin/$gt(e)/$lt(e))."""
+        if not where:
+            return None
+        if "$and" in where or "$or" in where:
+            op = "$and" if "$and" in where else "$or"
+            masks = [self._mask(clause, rows) for clause in where[op]]
+            combine = np.logical_and if op == "$and" else np.logical_or
+            return combine.reduce(masks)
+        (field, condition), = where.items()
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        (op, value), = condition.items()
+        column = self.fields[field][rows]
+        if field in self.codes:
+            lookup = self.codes[field]
+            value = [lookup.get(v, -1) for v in value] if isinstance(value, list) else lookup.get(value, -1)
+        if op == "$eq":
+            return column == value
+        if op == "$ne":
+            return column != value
+        if op == "$in":
+            return np.isin(column, value)
+        if op == "$nin":
+            return ~np.isin(column, value)
+        return {"$gt": np.greater, "$gte": np.greater_equal,
+                "$lt": np.less, "$lte": np.less_equal}[op](column, value)
+
+    # --- SEARCH ---
+    def _top_rows(self, query, k, where):
+        """Row numbers of the best k rows passing the filter, best first."""
+        mask = self._mask(where)
+        if self.centroids is None:
+            spans = [(0, len(self.ids))]
+            wanted = None
+        else:
+            # Closest partitions first. Scan about nprobe partitions' worth of
+            # rows that pass the filter, so selective filters probe deeper
+            ranked = np.argsort(-(self.centroids @ query))
+            spans = [(int(self.bounds[c]), int(self.bounds[c + 1])) for c in ranked]
+            selectivity = mask.mean() if mask is not None else 1.0
+            wanted = self.nprobe * len(self.ids) / len(self.centroids) * selectivity
+
+        all_rows, all_scores = [], []
+        scanned = 0
+        for start, end in spans:
+            for chunk in range(start, end, SCAN_CHUNK):
+                stop = min(chunk + SCAN_CHUNK, end)
+                scores = self.vectors[chunk:stop] @ query
+                rows = np.arange(chunk, stop)
+                if mask is not None:
+                    rows, scores = rows[mask[chunk:stop]], scores[mask[chunk:stop]]
+                if len(rows) > k:
+                    keep = np.argpartition(-scores, k)[:k]
+                    rows, scores = rows[keep], scores[keep]
+                all_rows.append(rows)
+                all_scores.append(scores)
+                scanned += stop - chunk if mask is None else int(mask[chunk:stop].sum())
+            if wanted is not None and scanned >= wanted and sum(map(len, all_rows)) >= k:
+                break
+        rows = np.concatenate(all_rows) if all_rows else np.empty(0, dtype=np.int64)
+        scores = np.concatenate(all_scores) if all_scores else np.empty(0, dtype=np.float32)
+        order = np.argsort(-scores, kind="stable")[:k]
+        return rows[order], scores[order]
+
+    def _documents(self, rows):
+        docs = []
+        with open(os.path.join(self.path, RECORDS_FILE), "rb") as f:
+            for row in rows:
+                f.seek(int(self.offsets[row]))
+                record = json.loads(f.readline())
+                docs.append(Document(id=self.ids[row], page_content=record["document"], metadata=record["metadata"]))
+        return docs
+
+    def _query(self, embedding):
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return query / norm if norm else query
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        rows, _ = self._top_rows(self._query(embedding), k, filter)
+        return self._documents(rows)
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=20, lambda_mult=0.5,
+                                                filter=None, **kwargs):
+        query = self._query(embedding)
+        rows, scores = self._top_rows(query, max(k, fetch_k), filter)
+        if len(rows) == 0:
+            return []
+        candidates = np.asarray(self.vectors[np.sort(rows)], dtype=np.float32)
+        # Realign with the score order after the sorted (mmap-friendly) gather
+        candidates = candidates[np.argsort(np.argsort(rows))]
+        picked = [0]
+        while len(picked) < min(k, len(rows)):
+            redundancy = (candidates @ candidates[picked].T).max(axis=1)
+            mmr = lambda_mult * scores - (1 - lambda_mult) * redundancy
+            mmr[picked] = -np.inf
+            picked.append(int(np.argmax(mmr)))
+        # Like langchain_chroma: the picks come back in similarity order
+        return self._documents(rows[sorted(picked)])
+
+    def get(self, ids=None, **kwargs):
+        """Same shape as Chroma's get(): {"ids", "documents", "metadatas"}."""
+        rows = [self.row_of[doc_id] for doc_id in (ids or []) if doc_id in self.row_of]
+        docs = self._documents(rows)
+        return {
+            "ids": [doc.id for doc in docs],
+            "documents": [doc.page_content for doc in docs],
+            "metadatas": [doc.metadata for doc in docs],
+        }
@@ -1,12 +1,20 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional
 from fastapi.middleware.cors import CORSMiddleware
-from rag_logic import SocialSyncAgent
+from rag_logic import SocialSyncAgent, cache_stats, parse_search_command, resources, warm_up
+import telemetry
+from telemetry import span
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
-import json
-import os
-from email_service import send_event_email
+import asyncio
+from email_service import EmailQueue, SMTPPool
+from vibe_worker import VibeWorker
+from user_store import open_user_store
+from event_records import EventData
+from session_store import open_session_store
+from chat_stream import PROFILE_STREAM_WAIT, CommandStreamFilter, sse_frame, strip_command
 
 app = FastAPI()
 
@@ -17,18 +25,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost: request latency by route, including CORS handling
+app.add_middleware(telemetry.MetricsMiddleware)
 
 # --- DATABASE ---
-DB_FILE = "users.json"
-users_db = {}
-
-if os.path.exists(DB_FILE):
-    with open(DB_FILE, "r") as f:
-        users_db = json.load(f)
-
-def save_db():
-    with open(DB_FILE, "w") as f:
-        json.dump(users_db, f, indent=2)
+# SQLite by default (USER_STORE=json keeps the old users.json file).
+# Opened at startup, so importing main creates no files and migrates nothing.
+user_store = None
 
 # --- MODELS ---
 
@@ -42,18 +45,11 @@ class ChatRequest(BaseModel):
     session_id: str
     email: Optional[str] = None 
 
-class EventData(BaseModel):
-    title: str
-    date: str
-    location: str
-    cost: str
-    description: str
-    url: str
-
 class ChatResponse(BaseModel):
     text: str
     events: List[EventData] = []
     mission_complete: bool = False
+    # Kept for older clients; profile updates now arrive through GET /vibe
     new_vibe: Optional[str] = None 
 
 class EmailRequest(BaseModel):
@@ -61,31 +57,73 @@ class EmailRequest(BaseModel):
     event: EventData
 
 # --- SESSION STORE ---
-sessions = {}
+# Bounded LRU/TTL in memory by default, SESSION_STORE=sqlite to share across workers.
+# Opened at startup, like the user store.
+sessions = None
+
+# Event cards per search round. retrieve_events leaves out the events the
+# session has seen (over-fetching on indexes that can't filter them).
+EVENTS_PER_ROUND = 2
+
+# Process-wide totals of the per-session retrieval counters
+retrieval_totals = {"searches": 0, "fetched": 0, "shown": 0}
+
+def new_retrieval_stats():
+    return {"searches": 0, "fetched": 0, "shown": 0}
+
+def with_fetch_ratio(stats):
+    return {**stats, "fetched_per_shown": round(stats["fetched"] / stats["shown"], 2) if stats["shown"] else None}
+
+# --- BACKGROUND VIBE WORKER ---
+def save_profile(email, vibe):
+    user_store.update_profile(email, vibe)
+
+vibe_worker = VibeWorker(save_profile)
+
+# --- OUTBOUND EMAIL ---
+# Pooled SMTP connections + background send queue with retries
+email_queue = EmailQueue(SMTPPool())
+
+# Clients (LLM, embeddings, Chroma) are built lazily; startup warms them up
+# in the background so the server accepts connections right away. GET /ready
+# reports when that is done.
+warm_up_task = None
+
+@app.on_event("startup")
+async def start_background_workers():
+    global warm_up_task, user_store, sessions
+    if user_store is None:
+        user_store = open_user_store()
+    if sessions is None:
+        sessions = open_session_store(SocialSyncAgent)
+    vibe_worker.start()
+    if not email_queue.pool.configured:
+        print("❌ SOCIALSYNC: EMAIL_USER / EMAIL_PASSWORD not set in .env; /send-event-email is disabled.")
+    email_queue.start()
+    warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up))
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await vibe_worker.stop()
+    await email_queue.stop()
 
 # --- AUTH ENDPOINTS ---
 @app.post("/register")
 async def register(req: AuthRequest):
-    if req.email in users_db:
+    name = req.name or req.email.split("@")[0]
+    if not user_store.create(req.email, req.password, name):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    users_db[req.email] = {
-        "password": req.password,
-        "name": req.name or req.email.split("@")[0], 
-        "profile": "" 
-    }
-    save_db()
-    
     return {
         "status": "success", 
         "email": req.email, 
-        "name": users_db[req.email]["name"],
+        "name": name,
         "profile": ""
     }
 
 @app.post("/login")
 async def login(req: AuthRequest):
-    user = users_db.get(req.email)
+    user = user_store.get(req.email)
     if not user or user["password"] != req.password:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
@@ -98,85 +136,77 @@ async def login(req: AuthRequest):
 
 # --- CHAT ENDPOINTS ---
 
-def parse_event_text(raw_text):
-    lines = raw_text.split('\n')
-    info = {}
-    for line in lines:
-        if ": " in line:
-            key, val = line.split(": ", 1)
-            info[key.strip()] = val.strip()
-    return EventData(
-        title=info.get("Event", "Unknown"),
-        date=info.get("Date", "TBD"),
-        location=info.get("Location", "Check Link"),
-        cost=info.get("Cost", "Free"),
-        description=info.get("Description", ""),
-        url=info.get("Source", "#")
-    )
-
-def strip_command_from_text(text):
-    lines = text.split('\n')
-    clean_lines = [line for line in lines if "SEARCH_ACTION" not in line.upper()]
-    return "\n".join(clean_lines).strip()
-
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(req: ChatRequest):
+async def call_llm(agent, emit=None):
+    """
+    One LLM call on the agent's prompt. With `emit` the reply is streamed:
+    tokens go out as `token` frames (minus SEARCH_ACTION commands) while
+    they arrive, and the assembled message is returned as usual.
+    """
+    if emit is None:
+        return await agent.ainvoke(agent.prompt_messages())
+
+    command_filter = CommandStreamFilter()
+    content = []
+    async for chunk in agent.astream(agent.prompt_messages()):
+        content.append(chunk.content)
+        visible = command_filter.feed(chunk.content)
+        if visible:
+            await emit("token", {"text": visible})
+    tail = command_filter.flush()
+    if tail:
+        await emit("token", {"text": tail})
+    return AIMessage(content="".join(content))
+
+async def run_chat_turn(req: ChatRequest, emit=None):
+    """
+    One chat turn, shared by /chat and /chat/stream. `emit(event, data)`
+    is the streaming hook: LLM tokens and the event cards are pushed
+    through it as soon as they exist.
+    """
     # Initialize Session
-    if req.session_id not in sessions:
+    with span("session_load"):
+        session_data = sessions.get(req.session_id)
+    if session_data is None:
         agent = SocialSyncAgent()
         
         # --- INJECT EXISTING VIBE ---
-        if req.email and req.email in users_db:
-            user_profile = users_db[req.email]["profile"]
+        user = user_store.get(req.email) if req.email else None
+        if user:
+            user_profile = user["profile"]
             if user_profile:
-                # We inject this as soft context
-                agent.chat_history.append(SystemMessage(content=f"""
-                [USER CONTEXT]
-                The user has previously enjoyed: "{user_profile}".
-                Use this to guide your tone, but don't obsess over it.
-                """))
+                # We inject this as soft context, after the history (see prompt_messages)
+                agent.set_user_context(user_profile)
         
-        sessions[req.session_id] = {
+        session_data = {
             "agent": agent,
-            "seen_events": set()
+            "seen_events": set(),
+            "retrieval": new_retrieval_stats(),
         }
     
-    session_data = sessions[req.session_id]
     agent = session_data["agent"]
     agent.chat_history.append(HumanMessage(content=req.message))
+
+    # Keep the prompt inside the token budget (folds old turns into a summary)
+    try:
+        with span("compact_history"):
+            await agent.compact_history()
+    except Exception as e:
+        print(f"History compaction skipped: {e}")
     
-    # --- RESTORED CHILL PERSONA (With Stop Condition) ---
-    reminder_msg = SystemMessage(content="""
-    [PERSONA INSTRUCTIONS]
-    You are SocialSync. Your goal is to be a helpful, excited friend who finds events.
-    
-    1. **Start with the VIBE.** Focus on what they feel like doing (mood, activity, energy).
-    2. **Collect Details Naturally.** If you need Location/Time/Budget, ask for them casually in conversation, or assume reasonable defaults if the user is vague.
-    3. **Don't be robotic.** Avoid checklists. Just chat.
-    4. **Search when ready.** If you have a good idea of what they want, output 'SEARCH_ACTION'.
-    
-    [CRITICAL STOP CONDITION]:
-    IF the user confirms they like an event (e.g., "I'll go to that", "Perfect", "That works", "Sounds good"):
-    1. CELEBRATE their choice. 🥳
-    2. DO NOT ask more questions.
-    3. DO NOT output 'SEARCH_ACTION'.
-    4. DO NOT offer more options unless they explicitly ask "what else?".
-    Just say something like: "Awesome choice! Have a blast! 🎆" and stop.
-    """)
-    
-    agent.chat_history.append(reminder_msg)
-    
-    ai_response = agent.llm.invoke(agent.chat_history)
-    ai_text = ai_response.content
-    
-    # Remove reminder to save context window
-    if agent.chat_history and agent.chat_history[-1] == reminder_msg:
+    # The persona instructions are part of the (cached) system prompt
+    try:
+        with span("llm"):
+            ai_response = await call_llm(agent, emit)
+    except asyncio.TimeoutError:
+        # Drop the unanswered message so the user can simply retry
         agent.chat_history.pop()
+        raise HTTPException(status_code=504, detail="The AI took too long to respond. Please try again.")
+
+    ai_text = ai_response.content
 
     events_to_return = []
     final_text = ai_text
     mission_complete = False
-    new_vibe_detected = None 
 
     # --- 0. SATISFACTION CHECK (PRE-FILTER) ---
     # Detect if AI is celebrating a successful choice
@@ -194,19 +224,35 @@ async def chat_endpoint(req: ChatRequest):
         else:
             query = clean_text_for_parsing.replace("SEARCH_ACTION", "").strip()
         
-        raw_events = agent.retrieve_events(query)
+        query, constraints = parse_search_command(query)
+
+        # Embedding + vector search are blocking I/O, keep them off the event loop.
+        # Already-shown events are excluded by the search itself.
+        with span("retrieval"):
+            found_events = await asyncio.to_thread(
+                agent.retrieve_events, query, k=EVENTS_PER_ROUND,
+                exclude_ids=frozenset(session_data["seen_events"]), **constraints
+            )
         
+        # Dedup on the compact event IDs (only matters for index entries without event_id metadata)
         new_events = []
-        for raw in raw_events:
-            if raw not in session_data["seen_events"]:
-                new_events.append(raw)
+        for ev in found_events:
+            if ev.id not in session_data["seen_events"]:
+                new_events.append(ev)
         
-        events_to_show = new_events[:2]
+        events_to_return = new_events[:EVENTS_PER_ROUND]
         
-        for ev in events_to_show:
-            session_data["seen_events"].add(ev)
+        for ev in events_to_return:
+            session_data["seen_events"].add(ev.id)
+
+        stats = session_data.setdefault("retrieval", new_retrieval_stats())
+        for counters in (stats, retrieval_totals):
+            counters["searches"] += 1
+            counters["fetched"] += len(found_events)
+            counters["shown"] += len(events_to_return)
 
-        events_to_return = [parse_event_text(e) for e in events_to_show]
+        if emit is not None:
+            await emit("events", {"events": jsonable_encoder(events_to_return)})
         
         if events_to_return:
             agent.chat_history.append(AIMessage(content="SEARCH_EXECUTED"))
@@ -217,9 +263,17 @@ async def chat_endpoint(req: ChatRequest):
                 sys_msg = "SYSTEM: You just showed the first 2 options. Briefly ask for thoughts."
             
             agent.chat_history.append(SystemMessage(content=sys_msg))
-            follow_up = agent.llm.invoke(agent.chat_history)
-            final_text = follow_up.content
-            agent.chat_history.append(follow_up)
+            if emit is not None:
+                # The follow-up replaces the first reply, as in the final text
+                await emit("reset", {})
+            try:
+                with span("llm_follow_up"):
+                    follow_up = await call_llm(agent, emit)
+                final_text = follow_up.content
+                agent.chat_history.append(follow_up)
+            except asyncio.TimeoutError:
+                final_text = "Here are a couple of picks for you! What do you think? 🔥"
+                agent.chat_history.append(AIMessage(content=final_text))
             
             mission_complete = True
             
@@ -232,83 +286,207 @@ async def chat_endpoint(req: ChatRequest):
         final_text = ai_text
 
     # --- AGGRESSIVE INCREMENTAL VIBE ASSESSMENT ---
-    # This runs on EVERY TURN to capture updates immediately.
-    if req.email and req.email in users_db:
-        try:
-            # Step A: Filter for relevant info
-            # We explicitly ask it to ignore logistics to keep the vibe pure.
-            vibe_check_prompt = SystemMessage(content=f"""
-            [SYSTEM ANALYSIS]
-            Analyze the USER'S last message: "{req.message}"
-            
-            Does this message provide ANY hint about their personality, tastes, or mood?
-            (e.g., "I like jazz", "Something chill", "Not a fan of crowds", "I want to dance")
-            
-            Ignore purely logistic messages like "NYC" or "Tomorrow".
-            
-            Answer ONLY "YES" or "NO".
-            """)
-            
-            # Check context
-            check_messages = agent.chat_history[:-1] + [vibe_check_prompt] 
-            check_response = agent.llm.invoke(check_messages)
-            
-            should_update = "YES" in check_response.content.strip().upper()
-
-            if should_update:
-                # Step B: Create Database Entry
-                assessment_prompt = SystemMessage(content="""
-                [ACTION: DATABASE ENTRY]
-                Role: DATA ANALYST (Not a chatbot).
-                Task: Update the user's "Taste Profile" based on the conversation so far.
-                
-                RULES:
-                1. Write 1 concise sentence summarizing their general tastes/personality.
-                2. DO NOT include Location/Time/Budget.
-                3. DO NOT use conversational language. Be factual.
-                
-                Example: "Enjoys low-key acoustic music and outdoor markets."
-                """)
-                
-                agent.chat_history.append(assessment_prompt)
-                summary_response = agent.llm.invoke(agent.chat_history)
-                new_vibe_detected = summary_response.content.replace('"', '').strip()
-                
-                users_db[req.email]["profile"] = new_vibe_detected
-                save_db()
-                
-                agent.chat_history.pop() 
-                print(f"Profile Updated: {new_vibe_detected}")
-
-        except Exception as e:
-            print(f"Failed to update vibe: {e}")
+    # Queued on EVERY TURN, but runs in the background worker so it never
+    # delays the reply. Clients pick the result up from GET /vibe.
+    if req.email and req.email in user_store:
+        vibe_worker.submit(req.email, agent, req.message, list(agent.chat_history))
 
-    final_text = strip_command_from_text(final_text)
+    final_text = strip_command(final_text)
+    with span("session_save"):
+        sessions.put(req.session_id, session_data)
 
     return ChatResponse(
         text=final_text, 
         events=events_to_return, 
         mission_complete=mission_complete,
-        new_vibe=new_vibe_detected 
     )
 
+@app.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(req: ChatRequest):
+    with telemetry.trace("chat", session_id=req.session_id):
+        return await run_chat_turn(req)
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """
+    Same turn as /chat, as Server-Sent Events:
+      token   {"text"}             reply tokens as the LLM produces them
+      events  {"events": [...]}    event cards, once retrieval finishes
+      reset   {}                   drop the text streamed so far: the
+                                   follow-up to the cards streams next
+      done    ChatResponse         the final text/events/mission_complete
+      profile GET /vibe payload    the updated taste profile, if it lands
+                                   within CHAT_STREAM_PROFILE_WAIT seconds
+      error   {"status", "detail"} instead of done when the turn fails
+    """
+    known_user = bool(req.email) and req.email in user_store
+    since = vibe_worker.status(req.email)["version"] if known_user else 0
+    frames = asyncio.Queue()
+
+    async def emit(event, data):
+        await frames.put(sse_frame(event, data))
+
+    async def produce():
+        try:
+            with telemetry.trace("chat_stream", session_id=req.session_id):
+                response = await run_chat_turn(req, emit)
+            await emit("done", jsonable_encoder(response))
+            if known_user:
+                status = await vibe_worker.wait_for_update(req.email, since, PROFILE_STREAM_WAIT)
+                if status["version"] > since:
+                    await emit("profile", status)
+        except HTTPException as e:
+            await emit("error", {"status": e.status_code, "detail": e.detail})
+        except Exception as e:
+            print(f"❌ Streaming chat turn failed: {e}")
+            await emit("error", {"status": 500, "detail": "Something went wrong. Please try again."})
+        finally:
+            await frames.put(None)
+
+    async def stream():
+        task = asyncio.create_task(produce())
+        try:
+            while (frame := await frames.get()) is not None:
+                yield frame
+        finally:
+            # Client went away: stop the turn (or the profile wait)
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# --- VIBE ENDPOINTS ---
+@app.get("/vibe")
+async def get_vibe(email: str, since: int = 0, wait: float = 0):
+    """
+    Latest taste profile for a user. With `wait` > 0 this long-polls until
+    a profile newer than version `since` lands (or the wait runs out).
+    """
+    user = user_store.get(email)
+    if not user:
+        raise HTTPException(status_code=404, detail="Unknown user")
+
+    if wait > 0:
+        status = await vibe_worker.wait_for_update(email, since, min(wait, 30))
+    else:
+        status = vibe_worker.status(email)
+
+    if status["profile"] is None:
+        status["profile"] = user["profile"]
+    return status
+
+@app.get("/vibe/metrics")
+async def get_vibe_metrics():
+    return vibe_worker.metrics()
+
 @app.post("/reset")
 async def reset_chat(req: ChatRequest):
-    if req.session_id in sessions:
-        del sessions[req.session_id]
+    sessions.delete(req.session_id)
     return {"status": "reset"}
 
+@app.get("/ready")
+async def readiness():
+    status = resources.status()
+    if not status["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
+
+@app.get("/cache/metrics")
+async def get_cache_metrics():
+    return cache_stats()
+
+@app.get("/sessions/metrics")
+async def get_session_metrics():
+    return {**sessions.stats(), "retrieval": with_fetch_ratio(retrieval_totals)}
+
+@app.get("/sessions/{session_id}/metrics")
+async def get_session_retrieval_metrics(session_id: str):
+    session_data = sessions.peek(session_id)
+    if session_data is None:
+        raise HTTPException(status_code=404, detail="Unknown session")
+    return {
+        "seen_events": len(session_data["seen_events"]),
+        "retrieval": with_fetch_ratio(session_data.get("retrieval", new_retrieval_stats())),
+    }
+
 @app.post("/send-event-email")
 async def send_event_email_endpoint(req: EmailRequest):
     if not req.email or "@" not in req.email:
          raise HTTPException(status_code=400, detail="Valid email required")
+    if not email_queue.pool.configured:
+        raise HTTPException(status_code=503, detail="Email is not configured on this server")
     
-    success, message = send_event_email(req.email, req.event.dict())
-    
-    if not success:
-        raise HTTPException(status_code=500, detail=f"Failed to send email: {message}")
+    # Delivery happens in the background, GET /email-jobs/{job_id} tracks it
+    job_id = email_queue.submit(req.email, req.event.dict())
         
-    return {"status": "success", "message": "Ticket info sent to your inbox!"}
+    return {"status": "queued", "job_id": job_id, "message": "Ticket info is on its way to your inbox!"}
+
+@app.get("/email-jobs/{job_id}")
+async def get_email_job(job_id: str):
+    job = email_queue.status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown email job")
+    return job
+
+@app.get("/email/metrics")
+async def get_email_metrics():
+    return email_queue.metrics()
+
+# --- PROMETHEUS ---
+@telemetry.register_collector
+def collect_service_metrics():
+    """Counters and gauges the service already keeps, read at scrape time."""
+    stats = cache_stats()
+    prompt = stats["prompt"]
+    caches = {name: stats[name] for name in ("embeddings", "results")}
+    session_stats = sessions.stats()
+    vibe = vibe_worker.metrics()
+    email = email_queue.metrics()
+    return [
+        ("socialsync_llm_calls_total", "counter", "LLM calls (chat, follow-ups, summaries, vibe checks).",
+         [({}, prompt["calls"])]),
+        ("socialsync_llm_tokens_total", "counter", "LLM tokens by kind (cached is part of prompt).",
+         [({"kind": "prompt"}, prompt["prompt_tokens"]), ({"kind": "cached"}, prompt["cached_tokens"]),
+          ({"kind": "completion"}, prompt["completion_tokens"])]),
+        ("socialsync_cache_hits_total", "counter", "Query cache hits.",
+         [({"cache": name}, cache["hits"]) for name, cache in caches.items()]),
+        ("socialsync_cache_misses_total", "counter", "Query cache misses.",
+         [({"cache": name}, cache["misses"]) for name, cache in caches.items()]),
+        ("socialsync_cache_hit_ratio", "gauge", "Query cache hit ratio since start.",
+         [({"cache": name}, cache["hit_rate"]) for name, cache in caches.items()]),
+        ("socialsync_cache_entries", "gauge", "Entries held by each query cache.",
+         [({"cache": name}, cache["size"]) for name, cache in caches.items()]),
+        ("socialsync_retrievals_total", "counter", "Event searches by how they were answered.",
+         [({"path": path}, count) for path, count in stats["retrieval_paths"].items()]),
+        ("socialsync_events_shown_total", "counter", "Event cards shown to users.",
+         [({}, retrieval_totals["shown"])]),
+        ("socialsync_embedding_api_failures_total", "counter", "Failed query embedding calls.",
+         [({}, stats["embedding_api"]["failures"])]),
+        ("socialsync_active_sessions", "gauge", "Chat sessions held by the session store.",
+         [({"backend": session_stats["backend"]}, session_stats["resident_sessions"])]),
+        ("socialsync_session_bytes", "gauge", "Approximate size of the stored sessions.",
+         [({"backend": session_stats["backend"]}, session_stats["resident_bytes"])]),
+        ("socialsync_vibe_queue_depth", "gauge", "Profile assessments waiting for a worker.",
+         [({}, vibe["queue_depth"])]),
+        ("socialsync_vibe_jobs_total", "counter", "Profile assessments by outcome.",
+         [({"outcome": outcome}, vibe[outcome]) for outcome in ("processed", "updated", "superseded", "failed")]),
+        ("socialsync_vibe_gate_total", "counter", "Local vibe gate decisions (unsure ones go to the LLM).",
+         [({"decision": decision}, vibe[f"gate_{decision}"]) for decision in ("yes", "no", "unsure")]),
+        ("socialsync_vibe_llm_checks_total", "counter", "Vibe relevance checks answered by the LLM.",
+         [({}, vibe["llm_checks"])]),
+        ("socialsync_email_queue_depth", "gauge", "Emails waiting to be sent.",
+         [({}, email["queue_depth"])]),
+        ("socialsync_email_jobs_total", "counter", "Email jobs by final status.",
+         [({"status": status}, email[status]) for status in ("sent", "failed")]),
+    ]
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(telemetry.render(), media_type=telemetry.CONTENT_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
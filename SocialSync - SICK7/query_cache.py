@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from vector_index import index_version
+
+# --- CONFIGURATION ---
+QUERY_CACHE_FILE = os.getenv("QUERY_CACHE_FILE", "query_cache.db")
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "5000"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "2000"))
+
+
+def normalize_query(query):
+    """
+    "Techno party, Old Town!!" and "techno  party old town" are the same search.
+    Lowercase, drop punctuation, collapse whitespace.
+    """
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+class EmbeddingCache:
+    """
+    Level 1: normalized query -> embedding vector.
+    LRU in memory, written through to SQLite so it survives restarts.
+    """
+
+    def __init__(self, model, path=QUERY_CACHE_FILE, max_size=EMBED_CACHE_SIZE):
+        self.model = model
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, query)
+            )
+        """)
+        # Warm the LRU with the most recently stored queries
+        rows = self.conn.execute(
+            "SELECT query, vector FROM query_embeddings WHERE model = ? ORDER BY rowid DESC LIMIT ?",
+            (model, max_size),
+        ).fetchall()
+        for query, blob in reversed(rows):
+            self.entries[query] = array("f", blob).tolist()
+
+    def get(self, query):
+        with self.lock:
+            vector = self.entries.get(query)
+            if vector is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(query)
+            self.hits += 1
+            return vector
+
+    def put(self, query, vector):
+        with self.lock:
+            self.entries[query] = vector
+            self.entries.move_to_end(query)
+            while len(self.entries) > self.max_size:
+                evicted, _ = self.entries.popitem(last=False)
+                self.conn.execute(
+                    "DELETE FROM query_embeddings WHERE model = ? AND query = ?", (self.model, evicted)
+                )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+                (self.model, query, array("f", vector).tobytes()),
+            )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class ResultCache:
+    """
+    Level 2: (embedding, k, filters) -> ordered result IDs.
+    In memory only; emptied whenever ingest.py publishes a new index version.
+    """
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.version = index_version()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(vector, k, filters=None):
+        digest = hashlib.sha1(array("f", vector).tobytes()).hexdigest()
+        return (digest, k, json.dumps(filters, sort_keys=True, default=str) if filters else "")
+
+    def _check_version(self):
+        current = index_version()
+        if current != self.version:
+            self.entries.clear()
+            self.version = current
+            self.invalidations += 1
+
+    def get(self, key):
+        with self.lock:
+            self._check_version()
+            ids = self.entries.get(key)
+            if ids is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return ids
+
+    def put(self, key, ids):
+        with self.lock:
+            self._check_version()
+            self.entries[key] = list(ids)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
@@ -1,34 +1,342 @@
 import os
+import asyncio
+import collections
+import concurrent.futures
 import datetime
+import functools
+import threading
+import time
 from dotenv import load_dotenv
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_core.messages import SystemMessage
+from langchain_core.messages import SystemMessage, HumanMessage
+from vector_index import current_index_path, index_version
+from query_cache import EmbeddingCache, ResultCache, normalize_query
+from event_records import date_key, event_filter, event_from_document, event_from_metadata
+from keyword_index import KeywordIndex
+from telemetry import span
 
 # --- SETUP ---
 load_dotenv(dotenv_path="./.env")
-DB_PATH = "./chroma_db"
+EMBEDDING_MODEL = "text-embedding-3-small"
+CHAT_MODEL = "gpt-4o-mini"
+# "chroma" or "local" (memory-mapped NumPy index written by ingest.py, see local_index.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
 
-print("\n🔋 SOCIALSYNC: Connecting to Neural Core...")
 
-# Initialize Embeddings & Vector DB
-embeddings = OpenAIEmbeddings(model="text-embedding-3-small")
-vector_db = Chroma(persist_directory=DB_PATH, embedding_function=embeddings)
+class Resources:
+    """
+    The clients every agent shares: chat model, embedding model, the live
+    Chroma index and the query caches. Each one is imported and built on
+    first use, so importing this module is cheap, works without credentials
+    and creates no files. main.py warms them up at startup; tests and
+    benchmarks swap in fakes with set_resources().
+    """
 
-# Initialize LLM
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0.7)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._llm = None
+        self._embeddings = None
+        self._vector_db = None
+        self._vector_db_version = None
+        self._vector_db_injected = False
+        self._keyword_index = None
+        self._keyword_index_version = None
+        self._keyword_index_injected = False
+        self._index_info = None
+        self._index_info_for = None
+        self._embedding_cache = None
+        self._result_cache = None
+        self.warmed_up = False
+        self.error = None
 
-print("✅ SOCIALSYNC: Agent Online.")
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self.lock:
+                if self._llm is None:
+                    from langchain_openai import ChatOpenAI
+                    # stream_usage: token counts also arrive on streamed replies
+                    self._llm = ChatOpenAI(model=CHAT_MODEL, temperature=0.7, stream_usage=True)
+        return self._llm
 
-class SocialSyncAgent:
-    def __init__(self):
-        self.llm = llm 
-        today = datetime.datetime.now().strftime("%Y-%m-%d")
-        
-        # --- BASE SYSTEM PROMPT ---
-        self.system_prompt = f"""
+    @property
+    def embeddings(self):
+        if self._embeddings is None:
+            with self.lock:
+                if self._embeddings is None:
+                    from langchain_openai import OpenAIEmbeddings
+                    self._embeddings = OpenAIEmbeddings(model=EMBEDDING_MODEL)
+        return self._embeddings
+
+    @property
+    def vector_db(self):
+        """
+        The live index. ingest.py publishes new builds by swapping chroma_db/CURRENT;
+        when that moves we reopen on the new build.
+        """
+        if self._vector_db_injected:
+            return self._vector_db
+        version = index_version()
+        if version != self._vector_db_version:
+            embeddings = self.embeddings
+            with self.lock:
+                if version != self._vector_db_version:
+                    reopened = self._vector_db is not None
+                    self._vector_db = open_vector_db(current_index_path(), embeddings)
+                    self._vector_db_version = version
+                    if reopened:
+                        print(f"🔁 SOCIALSYNC: Switched to index build {version}.")
+        return self._vector_db
+
+    @property
+    def keyword_index(self):
+        """BM25 index of the live build, or None for builds made before it existed."""
+        if self._keyword_index_injected:
+            return self._keyword_index
+        version = index_version()
+        if version != self._keyword_index_version:
+            with self.lock:
+                if version != self._keyword_index_version:
+                    path = current_index_path()
+                    self._keyword_index = KeywordIndex(path) if KeywordIndex.exists(path) else None
+                    self._keyword_index_version = version
+        return self._keyword_index
+
+    @property
+    def embedding_cache(self):
+        """Normalized query -> vector, persisted in QUERY_CACHE_FILE."""
+        if self._embedding_cache is None:
+            with self.lock:
+                if self._embedding_cache is None:
+                    self._embedding_cache = EmbeddingCache(EMBEDDING_MODEL)
+        return self._embedding_cache
+
+    @property
+    def result_cache(self):
+        """(vector, k, filters) -> result IDs, dropped on every re-index."""
+        if self._result_cache is None:
+            with self.lock:
+                if self._result_cache is None:
+                    self._result_cache = ResultCache()
+        return self._result_cache
+
+    @property
+    def index_info(self):
+        """describe_index() of the live index, worked out once per build."""
+        vector_db = self.vector_db
+        if self._index_info_for is not vector_db:
+            info = describe_index(vector_db)
+            with self.lock:
+                self._index_info, self._index_info_for = info, vector_db
+            if not FILTER_FIELDS <= info["fields"]:
+                print(f"⚠️ SOCIALSYNC: Index build {index_version()} has no date/price/category metadata "
+                      f"(re-run ingest.py); search filters are off.")
+            elif info["latest_date"] < date_key(datetime.date.today()):
+                print(f"⚠️ SOCIALSYNC: Index build {index_version()} has no upcoming events "
+                      f"(latest {info['latest_date']}, re-run the scraper); past events are shown too.")
+        return self._index_info
+
+    def status(self):
+        return {
+            "ready": self.warmed_up,
+            "llm": self._llm is not None,
+            "embeddings": self._embeddings is not None,
+            "vector_db": self._vector_db is not None,
+            "keyword_index": self._keyword_index is not None,
+            "index_version": self._vector_db_version,
+            "error": self.error,
+        }
+
+
+def open_vector_db(path, embeddings):
+    if VECTOR_BACKEND == "local":
+        from local_index import LocalIndex, has_local_index
+        if has_local_index(path):
+            return LocalIndex(path)
+        print(f"⚠️ SOCIALSYNC: No local index in {path} (re-run ingest.py), using Chroma.")
+    from langchain_chroma import Chroma
+    return Chroma(persist_directory=path, embedding_function=embeddings)
+
+
+# Metadata the search filters need; builds from before structured metadata only have "source"
+FILTER_FIELDS = {"date_ts", "price", "category_key"}
+
+
+def describe_index(vector_db):
+    """
+    Metadata fields every event of the index carries, and its latest event
+    date (date_ts). Profile docs only have source/content_hash and never
+    match a search filter, so they are left out.
+    """
+    columns = getattr(vector_db, "fields", None)
+    if columns is not None:
+        # LocalIndex: one column per field, written by ingest.py
+        return {"fields": set(columns), "latest_date": int(columns["date_ts"].max()) if vector_db.count() else 0}
+    metadatas = [m or {} for m in vector_db.get(where={"source": "event"}, include=["metadatas"])["metadatas"]]
+    return {
+        "fields": set.intersection(*(set(m) for m in metadatas)) if metadatas else set(),
+        "latest_date": max((m.get("date_ts") or 0 for m in metadatas), default=0),
+    }
+
+
+def index_size(vector_db):
+    count = getattr(vector_db, "count", None)
+    return count() if count else vector_db._collection.count()
+
+
+resources = Resources()
+
+
+def set_resources(llm=None, embeddings=None, vector_db=None, keyword_index=None):
+    """Injects ready-made clients (fakes in tests/benchmarks). Anything left as None stays lazy."""
+    with resources.lock:
+        if llm is not None:
+            resources._llm = llm
+        if embeddings is not None:
+            resources._embeddings = embeddings
+        if vector_db is not None:
+            resources._vector_db = vector_db
+            resources._vector_db_injected = True
+        if keyword_index is not None:
+            resources._keyword_index = keyword_index
+            resources._keyword_index_injected = True
+
+
+def warm_up():
+    """
+    Builds every client up front (FastAPI startup, in a thread) so the first
+    chat doesn't pay for it. Failures are recorded for /ready, not raised.
+    """
+    print("\n🔋 SOCIALSYNC: Connecting to Neural Core...")
+    start = time.perf_counter()
+    try:
+        resources.llm
+        memories = index_size(resources.vector_db)
+        resources.index_info
+        resources.embedding_cache
+        resources.result_cache
+        get_encoding()
+    except Exception as e:
+        resources.error = f"{type(e).__name__}: {e}"
+        print(f"❌ SOCIALSYNC: Warm-up failed: {resources.error}")
+        return False
+    resources.error = None
+    resources.warmed_up = True
+    print(f"✅ SOCIALSYNC: Agent Online ({memories} memories, {time.perf_counter() - start:.1f}s).")
+    return True
+
+
+# Per-process cap on in-flight LLM calls, plus a per-call timeout (seconds).
+# The timeout also covers the time spent waiting for a free slot.
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+llm_slots = asyncio.Semaphore(LLM_CONCURRENCY)
+
+# Chat history budget: once the history passes HISTORY_TOKEN_BUDGET, everything
+# but the last HISTORY_KEEP_TURNS turns is folded into a rolling summary.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "3000"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))
+SUMMARY_TAG = "[CONVERSATION SUMMARY]"
+
+# Retrieval hides past events unless a date window says otherwise
+RETRIEVAL_UPCOMING_ONLY = os.getenv("RETRIEVAL_UPCOMING_ONLY", "1") == "1"
+# Optional MMR re-ranking: pick k diverse events out of the RETRIEVAL_FETCH_K nearest
+RETRIEVAL_MMR = os.getenv("RETRIEVAL_MMR", "0") == "1"
+RETRIEVAL_FETCH_K = int(os.getenv("RETRIEVAL_FETCH_K", "20"))
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.5"))
+# Keyword fast path: BM25 hits are served right away and fused (RRF) with the
+# vector results only if the query embedding is cached or arrives within
+# EMBED_BUDGET_MS. Queries without keyword hits still wait for the embedding.
+KEYWORD_SEARCH = os.getenv("KEYWORD_SEARCH", "1") == "1"
+EMBED_BUDGET_MS = float(os.getenv("EMBED_BUDGET_MS", "150"))
+RRF_K = 60
+# How each search was answered: "vector" only, "fused" or "keyword" only
+retrieval_paths = {"vector": 0, "fused": 0, "keyword": 0}
+
+class PromptTokenStats:
+    """
+    Cached vs uncached prompt tokens, read from the usage metadata of every
+    LLM call (OpenAI reports prefix-cache hits as input_token_details.cache_read).
+    """
+
+    def __init__(self, recent=50):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.unreported = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.recent = collections.deque(maxlen=recent)
+
+    def record(self, response):
+        usage = getattr(response, "usage_metadata", None)
+        with self.lock:
+            self.calls += 1
+            if not usage:
+                self.unreported += 1
+                return
+            prompt = usage.get("input_tokens", 0)
+            cached = (usage.get("input_token_details") or {}).get("cache_read") or 0
+            self.prompt_tokens += prompt
+            self.cached_tokens += cached
+            self.completion_tokens += usage.get("output_tokens", 0)
+            self.recent.append({"prompt_tokens": prompt, "cached_tokens": cached, "uncached_tokens": prompt - cached})
+
+    def stats(self):
+        with self.lock:
+            return {
+                "calls": self.calls,
+                "unreported": self.unreported,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "uncached_tokens": self.prompt_tokens - self.cached_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_ratio": round(self.cached_tokens / self.prompt_tokens, 3) if self.prompt_tokens else 0.0,
+                "recent": list(self.recent),
+            }
+
+
+prompt_token_stats = PromptTokenStats()
+
+SUMMARIZER_PROMPT = """
+You maintain the running summary of a chat between a user and SocialSync, an event-finding assistant.
+Merge the NEW MESSAGES into the CURRENT SUMMARY.
+Keep: the user's mood/tastes, the personality type assigned, logistics (area, time, budget),
+events already shown and how the user reacted. Drop small talk.
+Answer with the updated summary only, max 120 words.
+"""
+
+_encoding = None
+
+def get_encoding():
+    """tiktoken's o200k_base, loaded on first use (None if tiktoken is unavailable)."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoding = False
+    return _encoding or None
+
+def count_tokens(messages):
+    """
+    Approximate prompt size of a message list (tiktoken if available, else ~4 chars/token).
+    """
+    encoding = get_encoding()
+    total = 0
+    for m in messages:
+        text = str(m.content)
+        total += 4 + (len(encoding.encode(text)) if encoding else len(text) // 4)
+    return total
+
+# --- SYSTEM PROMPT ---
+# Everything static goes first and is byte-identical for every session, so the
+# provider's prompt cache can serve it; only the date line (once a day) and the
+# per-user context (sent last, see SocialSyncAgent.prompt_messages) vary.
+@functools.lru_cache(maxsize=2)
+def system_message_for(today):
+    return SystemMessage(content=f"""
         You are SocialSync, the ultimate AI curator for social events in Bucharest.
-        Current Date: {today}.
 
         --- YOUR MISSION PROTOCOL ---
         Follow these phases in order. Do not skip ahead.
@@ -51,6 +359,8 @@ class SocialSyncAgent:
         PHASE 4: THE REVEAL
         - Once they answer the logistics question (or say "any"), output:
           `SEARCH_ACTION: [concise keywords + city sector/area]`
+        - If they gave hard limits, append them after a `|` (only the ones they gave):
+          `SEARCH_ACTION: [keywords] | max_price=80 | category=Concert, Party | from=2025-12-06 | to=2025-12-07`
 
         --- PERSONALITY TYPES (Assign one of these) ---
         1. 🔊 **The Bass Head:** (Techno, House, Raves, Clubbing)
@@ -64,20 +374,379 @@ class SocialSyncAgent:
         1. **NO LISTING DETAILS:** Never textually list the event name, date, or price. 
         2. **CARDS ONLY:** The system will generate visual cards. Your text is just the "hype man" intro.
         3. **ROLE:** Be a hype man! ("I found the perfect vibe for you! 🔥")
-        """
+
+        --- PERSONA INSTRUCTIONS ---
+        You are SocialSync. Your goal is to be a helpful, excited friend who finds events.
         
-        self.chat_history = [SystemMessage(content=self.system_prompt)]
+        1. **Start with the VIBE.** Focus on what they feel like doing (mood, activity, energy).
+        2. **Collect Details Naturally.** If you need Location/Time/Budget, ask for them casually in conversation, or assume reasonable defaults if the user is vague.
+        3. **Don't be robotic.** Avoid checklists. Just chat.
+        4. **Search when ready.** If you have a good idea of what they want, output 'SEARCH_ACTION'.
+        
+        [CRITICAL STOP CONDITION]:
+        IF the user confirms they like an event (e.g., "I'll go to that", "Perfect", "That works", "Sounds good"):
+        1. CELEBRATE their choice. 🥳
+        2. DO NOT ask more questions.
+        3. DO NOT output 'SEARCH_ACTION'.
+        4. DO NOT offer more options unless they explicitly ask "what else?".
+        Just say something like: "Awesome choice! Have a blast! 🎆" and stop.
+
+        Current Date: {today}.
+        """)
+
+
+def current_system_message():
+    return system_message_for(datetime.date.today().isoformat())
 
-    def retrieve_events(self, search_query, k=5):
+
+class SocialSyncAgent:
+    def __init__(self):
+        self.system_prompt = current_system_message().content
+        # What we know about a returning user; sent after the history, never pinned
+        self.user_context = None
+        self.chat_history = [current_system_message()]
+
+    def set_user_context(self, profile):
+        self.user_context = profile or None
+
+    def prompt_messages(self, history=None):
         """
-        Retrieves the top K matching events from the vector database.
+        The history (chat_history unless given, e.g. a slice of it) plus the
+        per-user context at the tail (keeps the cached prefix stable).
+        """
+        history = self.chat_history if history is None else history
+        if not self.user_context:
+            return list(history)
+        return history + [SystemMessage(content=f"""
+        [USER CONTEXT]
+        The user has previously enjoyed: "{self.user_context}".
+        Use this to guide your tone, but don't obsess over it.
+        """)]
+
+    @property
+    def llm(self):
+        return resources.llm
+
+    async def ainvoke(self, messages):
+        """
+        Non-blocking LLM call, bounded by LLM_CONCURRENCY and LLM_TIMEOUT.
+        Raises asyncio.TimeoutError if no answer arrives in time.
+        """
+        async def _call():
+            async with llm_slots:
+                return await resources.llm.ainvoke(messages)
+
+        response = await asyncio.wait_for(_call(), timeout=LLM_TIMEOUT)
+        prompt_token_stats.record(response)
+        return response
+
+    async def astream(self, messages):
+        """
+        Streaming variant of ainvoke: yields AIMessageChunks as the model
+        produces them. Same slot limit; LLM_TIMEOUT covers the whole reply
+        (including the wait for a slot) and raises asyncio.TimeoutError.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LLM_TIMEOUT
+        await asyncio.wait_for(llm_slots.acquire(), timeout=LLM_TIMEOUT)
+        stream = resources.llm.astream(messages).__aiter__()
+        reply = None
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(stream.__anext__(), timeout=deadline - loop.time())
+                except StopAsyncIteration:
+                    break
+                reply = chunk if reply is None else reply + chunk
+                yield chunk
+        finally:
+            llm_slots.release()
+            if hasattr(stream, "aclose"):
+                await stream.aclose()
+        prompt_token_stats.record(reply)
+
+    # --- HISTORY MANAGEMENT ---
+    def _split_history(self):
+        """
+        Splits chat_history into (pinned system messages, summary text, turns).
+        A turn starts at a HumanMessage and runs until the next one.
+        """
+        pinned = []
+        summary = None
+        turns = []
+        for m in self.chat_history:
+            if isinstance(m, SystemMessage) and str(m.content).startswith(SUMMARY_TAG):
+                summary = str(m.content)[len(SUMMARY_TAG):].strip()
+            elif not turns and isinstance(m, SystemMessage) and summary is None:
+                pinned.append(m)
+            elif isinstance(m, HumanMessage) or not turns:
+                turns.append([m])
+            else:
+                turns[-1].append(m)
+        return pinned, summary, turns
+
+    async def compact_history(self, budget=HISTORY_TOKEN_BUDGET, keep_turns=HISTORY_KEEP_TURNS):
+        """
+        Keeps the history under `budget` tokens: the system prompt (and any
+        other leading system messages) stays pinned, the last `keep_turns`
+        turns stay verbatim, and older turns are merged into the rolling
+        summary. Only the newly folded turns are sent to the summarizer.
+        Returns True if the history was compacted.
+        """
+        if count_tokens(self.chat_history) <= budget:
+            return False
+
+        pinned, summary, turns = self._split_history()
+        if len(turns) <= keep_turns:
+            return False
+
+        folded = [m for turn in turns[:-keep_turns] for m in turn]
+        transcript = "\n".join(f"{m.type.upper()}: {m.content}" for m in folded)
+        response = await self.ainvoke([
+            SystemMessage(content=SUMMARIZER_PROMPT),
+            HumanMessage(content=f"CURRENT SUMMARY:\n{summary or '(empty)'}\n\nNEW MESSAGES:\n{transcript}"),
+        ])
+
+        recent = [m for turn in turns[-keep_turns:] for m in turn]
+        summary_msg = SystemMessage(content=f"{SUMMARY_TAG}\n{response.content.strip()}")
+        self.chat_history = pinned + [summary_msg] + recent
+        return True
+
+    def retrieve_events(self, search_query, k=5, date_from=None, date_to=None, max_price=None,
+                        categories=None, exclude_ids=None, diversify=RETRIEVAL_MMR):
+        """
+        Retrieves the top K matching events from the vector database, as EventData.
+        Date window (upcoming only by default), max price, categories and the
+        already-shown `exclude_ids` are pushed into the Chroma metadata filter,
+        so the ANN search only ranks events that qualify and every result is
+        fresh (old builds without that metadata: see below). With `diversify`,
+        the k results are picked by MMR. Hot queries are served from the
+        caches without any embedding call, and queries with keyword hits don't
+        wait for a slow one (see KEYWORD_SEARCH).
         """
         print(f"   [DEBUG: Searching Vector DB for: '{search_query}']")
-        
-        results = vector_db.similarity_search(f"Event in Bucharest: {search_query}", k=k)
-        
-        events = []
-        for doc in results:
-            events.append(doc.page_content)
-            
-        return events
\ No newline at end of file
+
+        # Old builds can't be filtered, and a stale one has nothing upcoming (see Resources.index_info)
+        info = resources.index_info
+        today = datetime.date.today()
+        if not FILTER_FIELDS <= info["fields"]:
+            date_from = date_to = max_price = categories = None
+        elif date_from is None and RETRIEVAL_UPCOMING_ONLY and info["latest_date"] >= date_key(today):
+            date_from = today
+        # Without event_id metadata the seen events can't be filtered out in the
+        # index: fetch enough extra to drop them here
+        seen = frozenset()
+        if exclude_ids and "event_id" not in info["fields"]:
+            seen, exclude_ids = frozenset(exclude_ids), None
+        where = event_filter(date_from, date_to, max_price, categories, exclude_ids)
+        events = self._search(search_query, k + len(seen), where, diversify)
+        return [event for event in events if event.id not in seen][:k]
+
+    def _search(self, search_query, k, where, diversify):
+        """Keyword fast path, fused with (or falling back to) the vector search."""
+        keyword_index = resources.keyword_index if KEYWORD_SEARCH else None
+        with span("keyword_search"):
+            hits = keyword_index.search(search_query, where, limit=max(k, RETRIEVAL_FETCH_K)) if keyword_index else []
+        if hits:
+            keyword_events = [event_from_metadata(meta) for _, _, meta in hits]
+            with span("embedding"):
+                vector = embed_query_within(search_query, EMBED_BUDGET_MS / 1000)
+            if vector is None:
+                retrieval_paths["keyword"] += 1
+                return keyword_events[:k]
+            # Relevance fusion over both candidate lists (MMR only applies to pure vector searches)
+            retrieval_paths["fused"] += 1
+            with span("vector_search"):
+                vector_events = self._vector_search(vector, max(k, RETRIEVAL_FETCH_K), where, diversify=False)
+            return fuse_rankings(vector_events, keyword_events, k)
+
+        retrieval_paths["vector"] += 1
+        with span("embedding"):
+            vector = embed_query(search_query)
+        with span("vector_search"):
+            return self._vector_search(vector, k, where, diversify)
+
+    def _vector_search(self, vector, k, where, diversify):
+        search_params = {"where": where, "mmr": [RETRIEVAL_FETCH_K, RETRIEVAL_MMR_LAMBDA]} if diversify else where
+        cache_key = ResultCache.make_key(vector, k, search_params)
+        ids = resources.result_cache.get(cache_key)
+
+        if ids is None:
+            if diversify:
+                results = get_vector_db().max_marginal_relevance_search_by_vector(
+                    vector, k=k, fetch_k=max(k, RETRIEVAL_FETCH_K), lambda_mult=RETRIEVAL_MMR_LAMBDA, filter=where
+                )
+            else:
+                results = get_vector_db().similarity_search_by_vector(vector, k=k, filter=where)
+            resources.result_cache.put(cache_key, [doc.id for doc in results])
+            return [event_from_document(doc.page_content, doc.metadata) for doc in results]
+
+        if not ids:
+            return []
+        found = get_vector_db().get(ids=ids)
+        by_id = {
+            doc_id: event_from_document(text, meta)
+            for doc_id, text, meta in zip(found["ids"], found["documents"], found["metadatas"])
+        }
+        return [by_id[i] for i in ids if i in by_id]
+
+
+def fuse_rankings(vector_events, keyword_events, k):
+    """Reciprocal rank fusion of two ranked EventData lists; ties keep the vector order."""
+    scores = {}
+    by_id = {}
+    for ranking in (vector_events, keyword_events):
+        for rank, event in enumerate(ranking):
+            scores[event.id] = scores.get(event.id, 0.0) + 1 / (RRF_K + rank + 1)
+            by_id.setdefault(event.id, event)
+    return [by_id[event_id] for event_id in sorted(scores, key=lambda i: -scores[i])[:k]]
+
+
+def parse_search_command(command):
+    """
+    "jazz old town | max_price=80 | category=Concert, Party | from=2025-12-06"
+    -> ("jazz old town", {"max_price": 80.0, "categories": [...], "date_from": date(...)}).
+    Only the command line itself is read. Unknown or malformed options are
+    ignored; the keywords always survive.
+    """
+    query, *options = command.strip().split("\n", 1)[0].split("|")
+    constraints = {}
+    for option in options:
+        key, _, value = option.partition("=")
+        key, value = key.strip().lower(), value.strip().strip("`*[]")
+        try:
+            if key == "max_price":
+                constraints["max_price"] = float(value.lower().replace("ron", "").replace("lei", "").strip())
+            elif key in ("category", "categories"):
+                constraints["categories"] = [c.strip() for c in value.split(",") if c.strip()]
+            elif key in ("from", "to"):
+                day = datetime.date.fromisoformat(value[:10])
+                constraints["date_from" if key == "from" else "date_to"] = day
+        except ValueError:
+            print(f"   [DEBUG: Ignoring search option '{option.strip()}']")
+    return query.strip(), constraints
+
+
+def get_vector_db():
+    return resources.vector_db
+
+
+def embed_query(search_query):
+    key = normalize_query(search_query)
+    vector = resources.embedding_cache.get(key)
+    if vector is None:
+        vector = fetch_query_embedding(key)
+    return vector
+
+
+def fetch_query_embedding(key):
+    start = time.perf_counter()
+    try:
+        vector = resources.embeddings.embed_query(f"Event in Bucharest: {key}")
+    except Exception:
+        embedding_health.record_failure()
+        raise
+    embedding_health.record(time.perf_counter() - start)
+    resources.embedding_cache.put(key, vector)
+    return vector
+
+
+class EmbeddingHealth:
+    """
+    Recent latency (EWMA), timeouts and failures of the embedding API.
+    While it is slower than the budget, a call is overdue or one failed
+    lately, keyword searches don't wait for it.
+    """
+
+    def __init__(self, alpha=0.3, failure_cooldown=30.0):
+        self.alpha = alpha
+        self.failure_cooldown = failure_cooldown
+        self.latency = None
+        self.failed_at = None
+        self.overdue = False
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+
+    def record(self, seconds):
+        self.calls += 1
+        self.overdue = False
+        self.latency = seconds if self.latency is None else self.alpha * seconds + (1 - self.alpha) * self.latency
+
+    def record_failure(self):
+        self.calls += 1
+        self.failures += 1
+        self.failed_at = time.monotonic()
+
+    def record_timeout(self):
+        """A call outlived its budget; degraded until some call completes."""
+        self.timeouts += 1
+        self.overdue = True
+
+    def degraded(self, budget):
+        if self.overdue:
+            return True
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.failure_cooldown:
+            return True
+        return self.latency is not None and self.latency > budget
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+        }
+
+
+embedding_health = EmbeddingHealth()
+
+
+# Embedding calls that outlive their budget finish here and fill the cache
+embedding_pool = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="embed")
+pending_embeddings = {}
+pending_lock = threading.Lock()
+
+
+def embed_query_within(search_query, budget):
+    """
+    embed_query with a deadline: the vector, or None if it isn't cached and
+    doesn't arrive within `budget` seconds (no wait at all while the API is
+    degraded, or if it fails). A late call keeps running and lands in the
+    embedding cache.
+    """
+    key = normalize_query(search_query)
+    vector = resources.embedding_cache.get(key)
+    if vector is not None:
+        return vector
+    if embedding_health.degraded(budget):
+        budget = 0
+    with pending_lock:
+        future = pending_embeddings.get(key)
+        if future is None:
+            future = embedding_pool.submit(fetch_query_embedding, key)
+            pending_embeddings[key] = future
+
+            def forget(_):
+                with pending_lock:
+                    pending_embeddings.pop(key, None)
+            future.add_done_callback(forget)
+    try:
+        return future.result(timeout=budget)
+    except concurrent.futures.TimeoutError:
+        if budget:
+            embedding_health.record_timeout()
+        return None
+    except Exception as e:
+        print(f"   [DEBUG: Embedding failed, keyword results only: {e}]")
+        return None
+
+
+def cache_stats():
+    return {
+        "embeddings": resources.embedding_cache.stats(),
+        "results": resources.result_cache.stats(),
+        "prompt": prompt_token_stats.stats(),
+        "retrieval_paths": dict(retrieval_paths),
+        "embedding_api": embedding_health.stats(),
+    }
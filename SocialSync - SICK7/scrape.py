@@ -1,23 +1,50 @@
-import sqlite3
-import requests
+import asyncio
+import httpx
 from bs4 import BeautifulSoup
 import os
 import json
 import re
-from urllib.parse import urljoin
-from openai import OpenAI
+from urllib.parse import urljoin, urlsplit
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from scrape_cache import ScrapeCache, text_hash
+from fast_preprocess import AVAILABLE as FAST_PREPROCESS_AVAILABLE, preprocess_html_fast
+from event_store import EVENTS_DB_FILE, EventStore
 
 # --- CONFIGURATION ---
 load_dotenv(dotenv_path="./.env")
 
-if not os.getenv("OPENAI_API_KEY"):
-    raise ValueError("ERROR: OPENAI_API_KEY not found in .env file")
-
 API_KEY = os.getenv("OPENAI_API_KEY")
 DATA_FOLDER = "data_raw"
-DB_NAME = "events.db"
+DB_NAME = EVENTS_DB_FILE
 OUTPUT_TXT_FILE = os.path.join(DATA_FOLDER, "scraped_events.txt")
+# One URL per line; '#' starts a comment. Falls back to urls_to_process.
+SOURCES_FILE = os.path.join(DATA_FOLDER, "sources.txt")
+
+# PIPELINE LIMITS
+PER_HOST_CONCURRENCY = int(os.getenv("SCRAPE_PER_HOST", "2"))
+MAX_CONNECTIONS = int(os.getenv("SCRAPE_MAX_CONNECTIONS", "20"))
+EXTRACT_WORKERS = int(os.getenv("SCRAPE_EXTRACT_WORKERS", "4"))
+PAGE_QUEUE_SIZE = int(os.getenv("SCRAPE_QUEUE_SIZE", "8"))
+FETCH_TIMEOUT = 15
+
+# EXTRACTION CHUNKING (characters of preprocessed text per LLM call)
+EXTRACT_CHUNK_CHARS = int(os.getenv("SCRAPE_CHUNK_CHARS", "14000"))
+EXTRACT_OVERLAP_LINES = 4
+EXTRACT_CHUNK_CONCURRENCY = int(os.getenv("SCRAPE_CHUNK_CONCURRENCY", "4"))
+
+# Streaming preprocessor (fast_preprocess.py); same output, checked by
+# `python bench_scrape.py preprocess`
+FAST_PREPROCESS = os.getenv("SCRAPE_FAST_PREPROCESS", "0") == "1"
+if FAST_PREPROCESS and not FAST_PREPROCESS_AVAILABLE:
+    print("⚠️  SCRAPE_FAST_PREPROCESS: this bs4 version lacks the parser internals it needs; using BeautifulSoup.")
+    FAST_PREPROCESS = False
+
+# gpt-4o-mini list prices, USD per token
+PRICE_PER_INPUT_TOKEN = 0.15 / 1_000_000
+PRICE_PER_OUTPUT_TOKEN = 0.60 / 1_000_000
+
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124 Safari/537.36'}
 
 # LINKS TO SCRAPE
 urls_to_process = [
@@ -27,115 +54,185 @@ urls_to_process = [
     "https://berariah.ro/",
 ]
 
-client = OpenAI(api_key=API_KEY)
+client = None
+
+def get_client():
+    global client
+    if client is None:
+        if not API_KEY:
+            raise ValueError("ERROR: OPENAI_API_KEY not found in .env file")
+        client = AsyncOpenAI(api_key=API_KEY)
+    return client
+
+# --- URL SOURCES ---
+# A URL source is any callable returning the list of listing pages to scrape.
+
+def static_url_source():
+    return list(urls_to_process)
+
+def file_url_source(path=SOURCES_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+def default_url_source():
+    if os.path.exists(SOURCES_FILE):
+        return file_url_source(SOURCES_FILE)
+    return static_url_source()
 
 def setup_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DROP TABLE IF EXISTS events")
-    cursor.execute("""
-        CREATE TABLE events (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            event_name TEXT,
-            price REAL,
-            date_time TEXT,
-            available_seats INTEGER,
-            category TEXT,
-            source_url TEXT
-        )
-    """)
-    conn.commit()
-    return conn
+    """Opens events.db, creating or migrating the schema. Never drops existing rows."""
+    return EventStore(DB_NAME)
+
+EXTRACTION_SYSTEM_PROMPT = """
+You are a Data Miner. Extract events from the provided text.
+
+OUTPUT MUST BE A VALID JSON OBJECT.
+
+CRITICAL RULES:
+1. LINKS: The text contains links in the format '[URL: http...]'. 
+   You MUST extract this specific URL for the event. Do NOT use the generic source URL.
+2. PRICES: Look for 'RON', 'Lei', 'Bilet', 'Pret'. 
+   - If a range (e.g., '50-100 RON'), use the LOWEST number (50).
+   - If 'Free', 'Intrare libera', use 0.
+   - If no price is found, estimate based on context or put 0.
 
-def extract_structured_data(raw_text):
+Required JSON Structure:
+{
+    "events": [
+        {
+            "name": "Event Title",
+            "price": number,
+            "date": "YYYY-MM-DD HH:MM",
+            "location": "Venue Name",
+            "category": "Concert/Theater/Party/Workshop",
+            "description": "Short summary (max 15 words)",
+            "event_url": "The specific [URL: ...] you found next to the title"
+        }
+    ]
+}
+"""
+
+def split_for_extraction(text, max_chars=EXTRACT_CHUNK_CHARS, overlap_lines=EXTRACT_OVERLAP_LINES):
     """
-    FIXED: Explicitly mentions 'JSON' to satisfy OpenAI API requirements.
+    Splits preprocessed page text into chunks of at most max_chars.
+    Cuts land just before a '[URL: ...]' line where possible (the start of
+    the next event), and each chunk repeats the last few lines of the
+    previous one so an event straddling the cut is still seen whole. The
+    repeated lines are dropped when they don't fit the budget (long lines).
     """
-    system_prompt = """
-    You are a Data Miner. Extract events from the provided text.
-    
-    OUTPUT MUST BE A VALID JSON OBJECT.
-    
-    CRITICAL RULES:
-    1. LINKS: The text contains links in the format '[URL: http...]'. 
-       You MUST extract this specific URL for the event. Do NOT use the generic source URL.
-    2. PRICES: Look for 'RON', 'Lei', 'Bilet', 'Pret'. 
-       - If a range (e.g., '50-100 RON'), use the LOWEST number (50).
-       - If 'Free', 'Intrare libera', use 0.
-       - If no price is found, estimate based on context or put 0.
-    
-    Required JSON Structure:
-    {
-        "events": [
-            {
-                "name": "Event Title",
-                "price": number,
-                "date": "YYYY-MM-DD HH:MM",
-                "location": "Venue Name",
-                "category": "Concert/Theater/Party/Workshop",
-                "description": "Short summary (max 15 words)",
-                "event_url": "The specific [URL: ...] you found next to the title"
-            }
-        ]
-    }
+    chunks = []
+    current = []
+    size = 0
+    cut_at = 0  # index in `current` of the last line starting with an anchor
+
+    for line in text.split("\n"):
+        # Hard-wrap pathological single lines
+        while len(line) > max_chars:
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+
+        while current and size + len(line) + 1 > max_chars:
+            cut = cut_at if cut_at > overlap_lines else len(current)
+            chunks.append("\n".join(current[:cut]))
+            rest = current[cut:]
+            # Overlap from the end of the emitted chunk, as much as fits next to the rest and the new line
+            room = max_chars - sum(len(l) + 1 for l in rest) - len(line) - 1
+            overlap = []
+            for previous in reversed(current[max(0, cut - overlap_lines):cut]):
+                room -= len(previous) + 1
+                if room < 0:
+                    break
+                overlap.insert(0, previous)
+            current = overlap + rest
+            size = sum(len(l) + 1 for l in current)
+            cut_at = max((i for i, l in enumerate(current) if "[URL:" in l), default=0)
+
+        if "[URL:" in line:
+            cut_at = len(current)
+        current.append(line)
+        size += len(line) + 1
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+async def extract_chunk(chunk_text):
     """
-    
-    user_message = f"Analyze this text and extract events:\n{raw_text[:14000]}"
+    FIXED: Explicitly mentions 'JSON' to satisfy OpenAI API requirements.
+    Returns (parsed JSON, token usage dict).
+    """
+    user_message = f"Analyze this text and extract events:\n{chunk_text}"
     
     try:
-        response = client.chat.completions.create(
+        response = await get_client().chat.completions.create(
             model="gpt-4o-mini",
             messages=[
-                {"role": "system", "content": system_prompt},
+                {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
                 {"role": "user", "content": user_message}
             ],
             response_format={"type": "json_object"}, 
             temperature=0.1
         )
-        return json.loads(response.choices[0].message.content)
+        usage = {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+        }
+        return json.loads(response.choices[0].message.content), usage
     except Exception as e:
         print(f"   [OpenAI Error] {e}")
-        return {"events": []}
-
-def append_to_txt_file(event_data, main_source_url):
-    name = event_data.get("name", "Unknown")
-    cat = event_data.get("category", "General")
-    desc = event_data.get("description", "No description available.")
-    date = event_data.get("date", "Upcoming")
-    loc = event_data.get("location", "Bucharest")
-    
-    # Handle Price Display
-    price_val = event_data.get("price", 0)
-    if price_val == 0:
-        price_str = "Free / Check Link"
-    else:
-        price_str = f"{price_val} RON"
+        return {"events": []}, {"prompt_tokens": 0, "completion_tokens": 0}
 
-    # Use specific URL if found, else fallback to main list
-    specific_url = event_data.get("event_url")
-    if not specific_url or "http" not in specific_url:
-        specific_url = main_source_url
+def event_dedup_key(ev):
+    url = (ev.get("event_url") or "").strip().rstrip("/").lower()
+    if url.startswith("http"):
+        return url
+    return f"{(ev.get('name') or '').strip().lower()}|{ev.get('date')}"
 
-    entry = f"""Event: {name}
-Category: {cat}
-Description: {desc}
-Target Audience: General.
-Date: {date}
-Location: {loc}
-Cost: {price_str}
-Source: {specific_url}
+def extraction_cost(usage):
+    return (usage["prompt_tokens"] * PRICE_PER_INPUT_TOKEN
+            + usage["completion_tokens"] * PRICE_PER_OUTPUT_TOKEN)
 
-------------------------------------------------
+async def extract_structured_data(raw_text, chunk_extractor=extract_chunk):
+    """
+    Extracts every event on the page: the text is split into overlapping
+    chunks that are extracted in parallel, then merged (dedup by event URL).
+    """
+    chunks = split_for_extraction(raw_text)
+    limit = asyncio.Semaphore(EXTRACT_CHUNK_CONCURRENCY)
 
-"""
-    with open(OUTPUT_TXT_FILE, "a", encoding="utf-8") as f:
-        f.write(entry)
+    async def run(chunk):
+        async with limit:
+            return await chunk_extractor(chunk)
+
+    results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+
+    merged = {}
+    usage = {"prompt_tokens": 0, "completion_tokens": 0}
+    for data, chunk_usage in results:
+        for ev in data.get("events", []):
+            merged.setdefault(event_dedup_key(ev), ev)
+        usage["prompt_tokens"] += chunk_usage["prompt_tokens"]
+        usage["completion_tokens"] += chunk_usage["completion_tokens"]
+
+    print(f"      [AI] {len(chunks)} chunk(s) -> {len(merged)} unique events, "
+          f"{usage['prompt_tokens'] + usage['completion_tokens']} tokens (~${extraction_cost(usage):.4f})")
+    return {"events": list(merged.values()), "usage": usage, "chunks": len(chunks)}
 
 def preprocess_html(html_content, base_url):
     """
     Injects URLs directly into the visible text so GPT can see them.
     Turns <a href="/xyz">Event</a> into "Event [URL: https://base.com/xyz]"
     """
+    if FAST_PREPROCESS:
+        text, count = preprocess_html_fast(html_content, base_url)
+    else:
+        text, count = preprocess_html_soup(html_content, base_url)
+    print(f"      [Pre-Process] Injected {count} URLs into text stream.")
+    return text
+
+
+def preprocess_html_soup(html_content, base_url):
+    """The reference BeautifulSoup implementation. Returns (text, injected count)."""
     soup = BeautifulSoup(html_content, 'html.parser')
 
     # 1. Remove noise
@@ -155,73 +252,144 @@ def preprocess_html(html_content, base_url):
             a.string = new_text
             count += 1
 
-    print(f"      [Pre-Process] Injected {count} URLs into text stream.")
-    
     text = soup.get_text(separator="\n")
     lines = [line.strip() for line in text.splitlines() if line.strip()]
-    return "\n".join(lines)
+    return "\n".join(lines), count
 
-def run_ingestion_process():
-    if not os.path.exists(DATA_FOLDER):
-        os.makedirs(DATA_FOLDER)
-    
-    if os.path.exists(OUTPUT_TXT_FILE):
-        os.remove(OUTPUT_TXT_FILE)
+# --- ASYNC PIPELINE ---
+# Fetching and extraction overlap: fetchers push pages into a bounded queue
+# while extraction workers drain it.
 
-    conn = setup_db()
-    cursor = conn.cursor()
-    
-    print(f"\n--- 🌍 STARTING SMART SCRAPER ({len(urls_to_process)} sites) ---")
-    
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/91.0.4472.124 Safari/537.36'}
-
-    for url in urls_to_process:
+async def fetch_page(http, url, host_limits, cache=None):
+    host = urlsplit(url).netloc
+    limit = host_limits.setdefault(host, asyncio.Semaphore(PER_HOST_CONCURRENCY))
+    headers = cache.conditional_headers(url) if cache else {}
+    async with limit:
         print(f"   🔗 Scraping: {url}...")
+        response = await http.get(url, headers=headers)
+
+    if cache:
+        cache.counters["fetches"] += 1
+        if response.status_code == 304:
+            body = cache.cached_body(url)
+            if body is not None:
+                cache.counters["fetch_hits"] += 1
+                print(f"      [Cache] Not modified: {url}")
+                return body
+
+    if response.status_code != 200:
+        print(f"      [!] Failed to connect: {url}")
+        return None
+
+    if cache:
+        cache.store_response(url, response.headers.get("ETag"),
+                             response.headers.get("Last-Modified"), response.content)
+    return response.content
+
+async def fetch_stage(http, urls, pages, cache=None):
+    host_limits = {}
+
+    async def fetch_one(url):
         try:
-            response = requests.get(url, headers=headers, timeout=15)
-            if response.status_code != 200:
-                print("      [!] Failed to connect.")
-                continue
-            
-            clean_text_with_links = preprocess_html(response.content, url)
-            
-            print("      [AI] Extracting structured data...")
-            json_data = extract_structured_data(clean_text_with_links)
+            html = await fetch_page(http, url, host_limits, cache)
+            if html is not None:
+                await pages.put((url, html))
+        except Exception as e:
+            print(f"      [Error] {url}: {e}")
+
+    await asyncio.gather(*(fetch_one(url) for url in urls))
+
+async def extract_with_cache(url, text, extractor, cache):
+    """Reuses the events of an identical cleaned page instead of calling the model."""
+    if not cache:
+        print(f"      [AI] Extracting structured data from {url}...")
+        return await extractor(text)
+
+    key = text_hash(text)
+    cache.counters["extractions"] += 1
+    cached = cache.get_extraction(key)
+    if cached:
+        data, usage = cached
+        cache.counters["extraction_hits"] += 1
+        cache.counters["dollars_saved"] += extraction_cost(usage)
+        print("      [Cache] Page text unchanged, reusing extracted events.")
+        return data
+
+    print(f"      [AI] Extracting structured data from {url}...")
+    data = await extractor(text)
+    if data.get("events"):
+        usage = data.get("usage") or {"prompt_tokens": 0, "completion_tokens": 0}
+        cache.put_extraction(key, {"events": data["events"]}, usage)
+    return data
+
+async def extract_stage(pages, extractor, on_events, cache=None):
+    while True:
+        item = await pages.get()
+        try:
+            if item is None:
+                return
+            url, html = item
+            # BeautifulSoup is CPU-bound; keep it off the event loop
+            clean_text_with_links = await asyncio.to_thread(preprocess_html, html, url)
+
+            json_data = await extract_with_cache(url, clean_text_with_links, extractor, cache)
             found_events = json_data.get("events", [])
-            
+
             if not found_events:
-                print("      [!] No events found.")
+                print(f"      [!] No events found on {url}.")
                 continue
-
-            count = 0
-            for ev in found_events:
-                if ev.get("name"):
-                    # SQL (Student 1)
-                    cursor.execute("""
-                        INSERT INTO events (event_name, price, date_time, available_seats, category, source_url)
-                        VALUES (?, ?, ?, ?, ?, ?)
-                    """, (
-                        ev.get("name"), 
-                        ev.get("price", 0), 
-                        ev.get("date"), 
-                        50, 
-                        ev.get("category"), 
-                        ev.get("event_url", url)
-                    ))
-                    
-                    # TXT (Student 2 - RAG)
-                    append_to_txt_file(ev, url)
-                    count += 1
-            
-            print(f"      [OK] Successfully saved {count} events.")
-
+            on_events(url, found_events)
         except Exception as e:
             print(f"      [Error] {e}")
+        finally:
+            pages.task_done()
+
+async def scrape_sources(urls, on_events, extractor=extract_structured_data,
+                         extract_workers=EXTRACT_WORKERS, cache=None):
+    pages = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+
+    async with httpx.AsyncClient(headers=HEADERS, timeout=FETCH_TIMEOUT,
+                                 limits=limits, follow_redirects=True) as http:
+        workers = [asyncio.create_task(extract_stage(pages, extractor, on_events, cache))
+                   for _ in range(extract_workers)]
+        await fetch_stage(http, urls, pages, cache)
+        for _ in workers:
+            await pages.put(None)
+        await asyncio.gather(*workers)
+
+def run_ingestion_process(url_source=default_url_source):
+    urls = url_source()
+    get_client()
+
+    if not os.path.exists(DATA_FOLDER):
+        os.makedirs(DATA_FOLDER)
+    
+    # Upserts into the existing table: readers never see it empty mid-run
+    store = setup_db()
+    totals = {"new": 0, "updated": 0}
+    
+    print(f"\n--- 🌍 STARTING SMART SCRAPER ({len(urls)} sites) ---")
+
+    def save_events(url, found_events):
+        # SQL (Student 1): one transaction per page
+        new, updated = store.upsert_many(found_events, url)
+        totals["new"] += new
+        totals["updated"] += updated
+        print(f"      [OK] Saved {new + updated} events from {url} ({new} new, {updated} updated).")
+
+    cache = ScrapeCache()
+    asyncio.run(scrape_sources(urls, save_events, cache=cache))
 
-    conn.commit()
-    conn.close()
+    # TXT (Student 2 - RAG): regenerated from the DB, swapped in atomically
+    exported = store.export_txt(OUTPUT_TXT_FILE)
+    store.close()
     print(f"\n✅ SCRAPING COMPLETE.")
+    print(f"   🗄️  events.db: {totals['new']} new, {totals['updated']} updated; "
+          f"{exported} current events written to {OUTPUT_TXT_FILE}")
+    print(f"   📦 Cache: {cache.report()}")
+    cache.close()
     print("👉 Now run 'python ingest.py'!")
 
 if __name__ == "__main__":
-    run_ingestion_process()
\ No newline at end of file
+    run_ingestion_process()
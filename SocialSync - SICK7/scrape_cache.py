@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+SCRAPE_CACHE_FILE = os.getenv("SCRAPE_CACHE_FILE", "scrape_cache.db")
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ScrapeCache:
+    """
+    On-disk cache for the scraper:
+    - HTTP: body + ETag/Last-Modified per URL, for conditional re-fetches.
+    - Extraction: events keyed by the hash of the preprocessed page text,
+      so an unchanged page never goes back to the model.
+    Only used from the scraper's event loop thread.
+    """
+
+    def __init__(self, path=SCRAPE_CACHE_FILE):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS http_cache (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                text_hash TEXT PRIMARY KEY,
+                result TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.counters = {
+            "fetches": 0,
+            "fetch_hits": 0,
+            "extractions": 0,
+            "extraction_hits": 0,
+            "dollars_saved": 0.0,
+        }
+
+    # --- HTTP ---
+    def conditional_headers(self, url):
+        row = self.conn.execute(
+            "SELECT etag, last_modified FROM http_cache WHERE url = ?", (url,)
+        ).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def cached_body(self, url):
+        row = self.conn.execute("SELECT body FROM http_cache WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def store_response(self, url, etag, last_modified, body):
+        self.conn.execute("""
+            INSERT OR REPLACE INTO http_cache (url, etag, last_modified, body, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (url, etag, last_modified, body, time.time()))
+        self.conn.commit()
+
+    # --- EXTRACTION ---
+    def get_extraction(self, key):
+        row = self.conn.execute(
+            "SELECT result, prompt_tokens, completion_tokens FROM extraction_cache WHERE text_hash = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        return json.loads(row[0]), {"prompt_tokens": row[1], "completion_tokens": row[2]}
+
+    def put_extraction(self, key, result, usage):
+        self.conn.execute("""
+            INSERT OR REPLACE INTO extraction_cache (text_hash, result, prompt_tokens, completion_tokens, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (key, json.dumps(result), usage["prompt_tokens"], usage["completion_tokens"], time.time()))
+        self.conn.commit()
+
+    def report(self):
+        c = self.counters
+        return (f"fetch hits {c['fetch_hits']}/{c['fetches']} | "
+                f"extraction hits {c['extraction_hits']}/{c['extractions']} | "
+                f"saved ~${c['dollars_saved']:.4f}")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,236 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+# --- CONFIGURATION ---
+# SESSION_STORE picks the backend: "memory" (default, per process) or
+# "sqlite" (shared by every uvicorn worker on the machine)
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL = float(os.getenv("SESSION_TTL", str(6 * 3600)))
+SESSION_MAX = int(os.getenv("SESSION_MAX", "5000"))
+SESSION_MEMORY_MB = float(os.getenv("SESSION_MEMORY_MB", "256"))
+SESSIONS_DB_FILE = os.getenv("SESSIONS_DB_FILE", "sessions.db")
+
+# Rough fixed cost of an agent + bookkeeping on top of the message text
+SESSION_BASE_BYTES = 4096
+
+
+def estimate_session_bytes(session):
+    history = session["agent"].chat_history
+    return (
+        SESSION_BASE_BYTES
+        + sum(len(str(m.content)) for m in history)
+        + 64 * len(session["seen_events"])
+    )
+
+
+class SessionStore(ABC):
+    """
+    Interface for chat sessions. A session is the dict main.py works with:
+    {"agent": SocialSyncAgent, "seen_events": set(), "retrieval": {...counters}}.
+    Callers must `put` the session back after every turn.
+    """
+
+    @abstractmethod
+    def get(self, session_id):
+        ...
+
+    @abstractmethod
+    def peek(self, session_id):
+        """Like get(), but leaves the counters and LRU order alone (for metrics endpoints)."""
+
+    @abstractmethod
+    def put(self, session_id, session):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id):
+        ...
+
+    @abstractmethod
+    def stats(self):
+        ...
+
+
+class MemorySessionStore(SessionStore):
+    """In-process LRU with idle TTL, a session cap and an approximate memory budget."""
+
+    def __init__(self, max_sessions=SESSION_MAX, ttl=SESSION_TTL, memory_mb=SESSION_MEMORY_MB):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = int(memory_mb * 1024 * 1024)
+        self.sessions = OrderedDict()  # session_id -> (session, size, last_used)
+        self.resident_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def _drop(self, session_id):
+        _, size, _ = self.sessions.pop(session_id)
+        self.resident_bytes -= size
+
+    def _expire(self):
+        # Entries are kept in last-used order, so idle ones sit at the cold end
+        cutoff = time.monotonic() - self.ttl
+        while self.sessions:
+            oldest = next(iter(self.sessions))
+            if self.sessions[oldest][2] >= cutoff:
+                break
+            self._drop(oldest)
+            self.counters["expired"] += 1
+
+    def get(self, session_id):
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            self.counters["misses"] += 1
+            return None
+        if time.monotonic() - entry[2] > self.ttl:
+            self._drop(session_id)
+            self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return None
+        self.sessions[session_id] = (entry[0], entry[1], time.monotonic())
+        self.sessions.move_to_end(session_id)
+        self.counters["hits"] += 1
+        return entry[0]
+
+    def peek(self, session_id):
+        entry = self.sessions.get(session_id)
+        if entry is None or time.monotonic() - entry[2] > self.ttl:
+            return None
+        return entry[0]
+
+    def put(self, session_id, session):
+        if session_id in self.sessions:
+            self._drop(session_id)
+        self._expire()
+        size = estimate_session_bytes(session)
+        self.sessions[session_id] = (session, size, time.monotonic())
+        self.resident_bytes += size
+
+        # Evict least recently used until we are back under both limits
+        while len(self.sessions) > 1 and (
+            len(self.sessions) > self.max_sessions or self.resident_bytes > self.max_bytes
+        ):
+            oldest = next(iter(self.sessions))
+            self._drop(oldest)
+            self.counters["evictions"] += 1
+
+    def delete(self, session_id):
+        if session_id in self.sessions:
+            self._drop(session_id)
+
+    def stats(self):
+        self._expire()
+        return {
+            "backend": "memory",
+            "resident_sessions": len(self.sessions),
+            "resident_bytes": self.resident_bytes,
+            **self.counters,
+        }
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Serialized sessions in a shared SQLite file, so any worker process can
+    pick up any session. Agents are rebuilt from their stored chat history.
+    """
+
+    def __init__(self, agent_factory, path=SESSIONS_DB_FILE, ttl=SESSION_TTL):
+        self.agent_factory = agent_factory
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        self.puts = 0
+
+    def _row(self, session_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+
+    def _session(self, data):
+        agent = self.agent_factory()
+        agent.chat_history = messages_from_dict(data["chat_history"])
+        agent.user_context = data.get("user_context")
+        session = {"agent": agent, "seen_events": set(data["seen_events"])}
+        if "retrieval" in data:
+            session["retrieval"] = data["retrieval"]
+        return session
+
+    def get(self, session_id):
+        row = self._row(session_id)
+        if row is None:
+            self.counters["misses"] += 1
+            return None
+        if time.time() - row[1] > self.ttl:
+            self.delete(session_id)
+            self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return self._session(json.loads(row[0]))
+
+    def peek(self, session_id):
+        row = self._row(session_id)
+        if row is None or time.time() - row[1] > self.ttl:
+            return None
+        return self._session(json.loads(row[0]))
+
+    def put(self, session_id, session):
+        data = json.dumps({
+            "chat_history": messages_to_dict(session["agent"].chat_history),
+            "user_context": session["agent"].user_context,
+            "seen_events": list(session["seen_events"]),
+            "retrieval": session.get("retrieval"),
+        })
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    data = excluded.data,
+                    updated_at = excluded.updated_at
+            """, (session_id, data, time.time()))
+            self.puts += 1
+            # Sweep idle sessions every so often instead of on every write
+            if self.puts % 100 == 0:
+                cursor = self.conn.execute(
+                    "DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl,)
+                )
+                self.counters["evictions"] += cursor.rowcount
+
+    def delete(self, session_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def stats(self):
+        with self.lock:
+            count, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions"
+            ).fetchone()
+        return {
+            "backend": "sqlite",
+            "resident_sessions": count,
+            "resident_bytes": size,
+            **self.counters,
+        }
+
+
+def open_session_store(agent_factory):
+    if SESSION_STORE == "sqlite":
+        return SqliteSessionStore(agent_factory)
+    return MemorySessionStore()
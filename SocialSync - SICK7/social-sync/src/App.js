@@ -7,6 +7,17 @@ import { Send, Bot, User, LogIn, LogOut, Database, Mail } from 'lucide-react'; /
 
 const SESSION_ID = "user-session-1";
 
+// One Server-Sent Events frame from /chat/stream: "event: x\ndata: {json}"
+const parseSseFrame = (raw) => {
+  let event = 'message';
+  let data = '';
+  raw.split('\n').forEach(line => {
+    if (line.startsWith('event: ')) event = line.slice(7);
+    else if (line.startsWith('data: ')) data += line.slice(6);
+  });
+  return { event, data: data ? JSON.parse(data) : null };
+};
+
 function App() {
 
   // --- EMAIL HANDLER ---
@@ -37,8 +48,8 @@ function App() {
       });
 
       const data = await response.json();
-      if (data.status === 'success') {
-        alert("Email sent successfully! 📬");
+      if (data.status === 'queued') {
+        alert("Email is on its way! 📬");
       } else {
         alert("Failed to send email.");
       }
@@ -80,6 +91,7 @@ function App() {
   
   const messagesEndRef = useRef(null);
   const inputRef = useRef(null);
+  const vibeVersionRef = useRef(0);
 
   useEffect(() => {
     localStorage.setItem("chat_history", JSON.stringify(messages));
@@ -142,47 +154,109 @@ function App() {
     handleReset(null);
   };
 
+  // --- VIBE POLLING ---
+  // The profile is assessed in the background, so we long-poll for it
+  // instead of waiting on the chat response.
+  const pollVibe = async (email) => {
+    try {
+      const params = new URLSearchParams({ email, since: vibeVersionRef.current, wait: 15 });
+      const response = await fetch(`http://localhost:8000/vibe?${params}`);
+      if (!response.ok) return;
+      applyVibe(email, await response.json());
+    } catch (error) {
+      console.error("Vibe poll error:", error);
+    }
+  };
+
+  const applyVibe = (email, data) => {
+    if (data.version > vibeVersionRef.current) {
+      vibeVersionRef.current = data.version;
+      setUser(prevUser => prevUser && prevUser.email === email
+        ? { ...prevUser, profile: data.profile }
+        : prevUser);
+    }
+  };
+
   // --- CHAT HANDLERS ---
+  // Replies stream in from /chat/stream: tokens first, then the event cards,
+  // then the final text; the updated profile may follow on the same stream.
   const handleSend = async () => {
     if (!input.trim()) return;
 
     const userMsg = { role: 'user', text: input };
+    const email = user ? user.email : null;
     setMessages(prev => [...prev, userMsg]);
     setInput('');
     setIsLoading(true);
 
+    let replyStarted = false;
+    let streamedText = '';
+    let gotProfile = false;
+
+    // The streaming reply is always the last message
+    const updateReply = (patch) => {
+      if (!replyStarted) {
+        replyStarted = true;
+        setMessages(prev => [...prev, { role: 'assistant', text: '', events: [], ...patch }]);
+      } else {
+        setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], ...patch }]);
+      }
+    };
+
+    const handleFrame = ({ event, data }) => {
+      if (event === 'token') {
+        streamedText += data.text;
+        updateReply({ text: streamedText });
+      } else if (event === 'reset') {
+        streamedText = '';
+        updateReply({ text: '' });
+      } else if (event === 'events') {
+        updateReply({ events: data.events });
+      } else if (event === 'done') {
+        updateReply({ text: data.text, events: data.events });
+        if (data.mission_complete) setIsComplete(true);
+        setIsLoading(false);
+      } else if (event === 'profile') {
+        gotProfile = true;
+        applyVibe(email, data);
+      } else if (event === 'error') {
+        throw new Error(data.detail);
+      }
+    };
+
     try {
-      const response = await fetch('http://localhost:8000/chat', {
+      const response = await fetch('http://localhost:8000/chat/stream', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ 
             message: userMsg.text, 
             session_id: SESSION_ID,
-            email: user ? user.email : null 
+            email: email 
         })
       });
-
-      const data = await response.json();
-      
-      setMessages(prev => [...prev, {
-        role: 'assistant',
-        text: data.text,
-        events: data.events
-      }]);
-
-      if (data.mission_complete) setIsComplete(true);
+      if (!response.ok || !response.body) throw new Error(`HTTP ${response.status}`);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end;
+        while ((end = buffer.indexOf('\n\n')) !== -1) {
+          handleFrame(parseSseFrame(buffer.slice(0, end)));
+          buffer = buffer.slice(end + 2);
+        }
+      }
 
       // --- LIVE VIBE UPDATE ---
-      if (data.new_vibe && user) {
-        setUser(prevUser => ({
-            ...prevUser,
-            profile: data.new_vibe
-        }));
-      }
+      // The profile didn't land while the stream was open, keep long-polling
+      if (email && !gotProfile) pollVibe(email);
 
     } catch (error) {
       console.error("Error:", error);
-      setMessages(prev => [...prev, { role: 'assistant', text: "Sorry, I'm having trouble connecting to the brain." }]);
+      updateReply({ text: "Sorry, I'm having trouble connecting to the brain.", events: [] });
     } finally {
       setIsLoading(false);
     }
@@ -0,0 +1,197 @@
+import bisect
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+
+# Span timing per request stage and a Prometheus text endpoint (GET /metrics).
+# Spans feed the socialsync_stage_seconds histogram; the spans of one chat
+# turn are also collected into a trace, printed as one JSON line with
+# TRACE_LOG=1. Gauges and totals kept elsewhere (caches, sessions, queues)
+# are read by collectors when /metrics is scraped, so they cost nothing
+# per request. Standard library only: no prometheus_client needed.
+
+# --- CONFIGURATION ---
+# SOCIALSYNC_TRACING=0 turns spans and request timing off (collectors still work)
+TRACING = os.getenv("SOCIALSYNC_TRACING", "1") == "1"
+TRACE_LOG = os.getenv("TRACE_LOG", "0") == "1"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# --- METRIC TYPES ---
+class Histogram:
+    """Fixed buckets, one series per label combination. Thread-safe (retrieval runs in threads)."""
+
+    def __init__(self, name, description, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = labels
+        self.buckets = buckets
+        self.series = {}   # label values -> [per-bucket counts..., overflow, sum]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[bisect.bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = {labels: list(series) for labels, series in self.series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, {'le': _number(bound)})} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+metrics = []
+collectors = []
+
+
+def register(metric):
+    metrics.append(metric)
+    return metric
+
+
+def register_collector(collect):
+    """
+    `collect()` runs on every scrape and returns [(name, type, description,
+    [(labels dict, value), ...])] for gauges/counters kept elsewhere.
+    """
+    collectors.append(collect)
+    return collect
+
+
+def render():
+    lines = []
+    for metric in metrics:
+        lines += metric.render()
+    for collect in collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            print(f"⚠️ Metrics collector failed: {e}")
+            continue
+        for name, kind, description, samples in families:
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            for labels, value in samples:
+                names = tuple(labels)
+                lines.append(f"{name}{_labels(names, [labels[n] for n in names])} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = register(Histogram(
+    "socialsync_stage_seconds", "Time spent in each stage of a request or background job.", ("stage",)))
+request_seconds = register(Histogram(
+    "socialsync_http_request_seconds", "HTTP request latency, until the last body byte.",
+    ("method", "route", "status")))
+
+
+# --- SPANS ---
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Span:
+    """What span() returns while tracing is on (a class: cheaper than @contextmanager)."""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        stage_seconds.observe(elapsed, self.stage)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.append((self.stage, elapsed))
+        return False
+
+
+_no_span = contextlib.nullcontext()
+
+
+def span(stage):
+    """Times the block into socialsync_stage_seconds{stage} and the current trace, if any."""
+    return Span(stage) if TRACING else _no_span
+
+
+@contextlib.contextmanager
+def trace(name, **attributes):
+    """
+    Collects the spans opened inside the block (threads started with
+    asyncio.to_thread included). With TRACE_LOG=1 they are printed as JSON.
+    """
+    if not TRACING:
+        yield
+        return
+    spans = []
+    token = current_trace.set(spans)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        current_trace.reset(token)
+        if TRACE_LOG:
+            print(json.dumps({
+                "trace": name,
+                **attributes,
+                "total_ms": round((time.perf_counter() - start) * 1000, 2),
+                "spans": [{"stage": stage, "ms": round(elapsed * 1000, 2)} for stage, elapsed in spans],
+            }))
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by route template (not raw path) and status."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            request_seconds.observe(time.perf_counter() - start, scope["method"], route, str(status))
@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+
+# --- CONFIGURATION ---
+# USER_STORE picks the backend: "sqlite" (default) or "json" (legacy users.json)
+USER_STORE = os.getenv("USER_STORE", "sqlite")
+JSON_DB_FILE = "users.json"
+SQLITE_DB_FILE = os.getenv("USERS_DB_FILE", "users.db")
+
+
+class UserStore(ABC):
+    """
+    Interface for user persistence. Users are plain dicts:
+    {"password": ..., "name": ..., "profile": ...}, keyed by email.
+    """
+
+    @abstractmethod
+    def get(self, email):
+        ...
+
+    @abstractmethod
+    def create(self, email, password, name):
+        """Returns False if the email is already registered."""
+
+    @abstractmethod
+    def update_profile(self, email, profile):
+        ...
+
+    @abstractmethod
+    def count(self):
+        ...
+
+    def __contains__(self, email):
+        return self.get(email) is not None
+
+
+class JsonUserStore(UserStore):
+    """
+    The original users.json store. Every write rewrites the whole file, so
+    it only makes sense for small installs; writes go through a temp file
+    so a crash can't leave a truncated users.json behind.
+    """
+
+    def __init__(self, path=JSON_DB_FILE):
+        self.path = path
+        self.users = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.users = json.load(f)
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.users, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def get(self, email):
+        user = self.users.get(email)
+        return dict(user) if user else None
+
+    def create(self, email, password, name):
+        with self.lock:
+            if email in self.users:
+                return False
+            self.users[email] = {"password": password, "name": name, "profile": ""}
+            self._save()
+            return True
+
+    def update_profile(self, email, profile):
+        with self.lock:
+            if email not in self.users:
+                return
+            self.users[email]["profile"] = profile
+            self._save()
+
+    def count(self):
+        return len(self.users)
+
+
+class SqliteUserStore(UserStore):
+    """
+    SQLite-backed store (WAL mode). Email is the primary key, so every
+    register / profile update touches a single row.
+    """
+
+    def __init__(self, path=SQLITE_DB_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        # One shared connection; the API calls us from the event loop and from threads
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                email TEXT PRIMARY KEY,
+                password TEXT NOT NULL,
+                name TEXT NOT NULL,
+                profile TEXT NOT NULL DEFAULT '',
+                updated_at REAL
+            ) WITHOUT ROWID
+        """)
+
+    def get(self, email):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT password, name, profile FROM users WHERE email = ?", (email,)
+            ).fetchone()
+        if not row:
+            return None
+        return {"password": row[0], "name": row[1], "profile": row[2]}
+
+    def create(self, email, password, name):
+        with self.lock:
+            cursor = self.conn.execute("""
+                INSERT INTO users (email, password, name, profile, updated_at)
+                VALUES (?, ?, ?, '', ?)
+                ON CONFLICT(email) DO NOTHING
+            """, (email, password, name, time.time()))
+            return cursor.rowcount == 1
+
+    def update_profile(self, email, profile):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE users SET profile = ?, updated_at = ? WHERE email = ?",
+                (profile, time.time(), email),
+            )
+
+    def upsert_many(self, users):
+        """Bulk UPSERT of {email: user} in one transaction (used by the migrator)."""
+        now = time.time()
+        rows = [
+            (email, u.get("password", ""), u.get("name") or email.split("@")[0], u.get("profile", ""), now)
+            for email, u in users.items()
+        ]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                self.conn.executemany("""
+                    INSERT INTO users (email, password, name, profile, updated_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(email) DO UPDATE SET
+                        password = excluded.password,
+                        name = excluded.name,
+                        profile = excluded.profile,
+                        updated_at = excluded.updated_at
+                """, rows)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+
+def migrate_json_to_sqlite(json_path=JSON_DB_FILE, sqlite_path=SQLITE_DB_FILE):
+    """One-shot import of users.json into the SQLite store. Safe to re-run."""
+    with open(json_path, "r") as f:
+        users = json.load(f)
+    store = SqliteUserStore(sqlite_path)
+    count = store.upsert_many(users)
+    print(f"✅ Migrated {count} users from {json_path} to {sqlite_path}.")
+    return store
+
+
+def open_user_store():
+    if USER_STORE == "json":
+        return JsonUserStore(JSON_DB_FILE)
+
+    is_new = not os.path.exists(SQLITE_DB_FILE)
+    if is_new and os.path.exists(JSON_DB_FILE):
+        # First start after the switch: carry the existing accounts over
+        return migrate_json_to_sqlite(JSON_DB_FILE, SQLITE_DB_FILE)
+    return SqliteUserStore(SQLITE_DB_FILE)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        migrate_json_to_sqlite()
+    else:
+        print("Usage: python user_store.py [migrate]")
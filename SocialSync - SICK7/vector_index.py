@@ -0,0 +1,65 @@
+import os
+import shutil
+import time
+
+# Where the vector index lives. Shared by ingest.py (writer) and rag_logic.py (reader).
+#
+# Layout:
+#   chroma_db/CURRENT          -> name of the live build (atomically replaced)
+#   chroma_db/builds/<version> -> one complete Chroma store per build
+# Indexes built before versioning live directly in chroma_db/ with no CURRENT file.
+DB_PATH = "./chroma_db"
+BUILDS_PATH = os.path.join(DB_PATH, "builds")
+VERSION_FILE = os.path.join(DB_PATH, "CURRENT")
+
+
+def index_version():
+    """
+    Identifies the current build of the index. Anything cached against the
+    index (e.g. retrieval results) must be dropped when this changes.
+    """
+    try:
+        with open(VERSION_FILE, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "0"
+
+
+def current_index_path():
+    version = index_version()
+    if version == "0":
+        return DB_PATH
+    return os.path.join(BUILDS_PATH, version)
+
+
+def create_staging_build(copy_current=True):
+    """
+    Allocates a new build directory, optionally seeded with a copy of the
+    live index so it can be updated incrementally. Returns (version, path).
+    """
+    version = str(time.time_ns())
+    path = os.path.join(BUILDS_PATH, version)
+    current = current_index_path()
+
+    if copy_current and os.path.exists(os.path.join(current, "chroma.sqlite3")):
+        shutil.copytree(current, path, ignore=shutil.ignore_patterns("builds", "CURRENT*", "INDEX_VERSION"))
+    else:
+        os.makedirs(path)
+    return version, path
+
+
+def publish_build(version):
+    """
+    Atomically points readers at `version`, then prunes older builds. The
+    previously live build is kept, readers may still be holding it open.
+    """
+    previous = index_version()
+    tmp_path = f"{VERSION_FILE}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, VERSION_FILE)
+
+    for old in os.listdir(BUILDS_PATH):
+        # Newer directories may be another ingest run still in progress
+        if old not in (version, previous) and int(old) < int(version):
+            shutil.rmtree(os.path.join(BUILDS_PATH, old), ignore_errors=True)
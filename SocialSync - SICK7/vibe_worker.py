@@ -0,0 +1,219 @@
+import asyncio
+import os
+import time
+from langchain_core.messages import SystemMessage
+from telemetry import span
+from vibe_gate import VIBE_GATE, VibeGate
+
+# Number of assessments processed in parallel (each one is 1-2 LLM calls)
+VIBE_WORKERS = int(os.getenv("VIBE_WORKERS", "2"))
+
+
+def build_vibe_check_prompt(message):
+    # We explicitly ask it to ignore logistics to keep the vibe pure.
+    return SystemMessage(content=f"""
+    [SYSTEM ANALYSIS]
+    Analyze the USER'S last message: "{message}"
+
+    Does this message provide ANY hint about their personality, tastes, or mood?
+    (e.g., "I like jazz", "Something chill", "Not a fan of crowds", "I want to dance")
+
+    Ignore purely logistic messages like "NYC" or "Tomorrow".
+
+    Answer ONLY "YES" or "NO".
+    """)
+
+
+ASSESSMENT_PROMPT = SystemMessage(content="""
+[ACTION: DATABASE ENTRY]
+Role: DATA ANALYST (Not a chatbot).
+Task: Update the user's "Taste Profile" based on the conversation so far.
+
+RULES:
+1. Write 1 concise sentence summarizing their general tastes/personality.
+2. DO NOT include Location/Time/Budget.
+3. DO NOT use conversational language. Be factual.
+
+Example: "Enjoys low-key acoustic music and outdoor markets."
+""")
+
+
+class VibeWorker:
+    """
+    Background profile extraction, kept off the /chat critical path.
+
+    Jobs are debounced per user: while an assessment for an email is still
+    queued, a newer chat turn replaces it instead of queueing a second one.
+    Results are published through `profiles` (with a version counter) so
+    clients can poll / long-poll for them.
+    """
+
+    def __init__(self, save_profile, workers=VIBE_WORKERS, gate=None):
+        self.save_profile = save_profile  # callback(email, vibe)
+        self.workers = workers
+        # Local relevance check in front of the LLM one (None: LLM only)
+        self.gate = gate or (VibeGate.load() if VIBE_GATE else None)
+        self.queue = asyncio.Queue()
+        self.pending = {}   # email -> latest job not yet picked up
+        self.profiles = {}  # email -> {"profile", "version", "updated_at"}
+        self.changed = asyncio.Condition()
+        self.tasks = []
+        self.seq = 0
+        self.stats = {
+            "submitted": 0,
+            "superseded": 0,
+            "processed": 0,
+            "updated": 0,
+            "failed": 0,
+            "gate_yes": 0,
+            "gate_no": 0,
+            "gate_unsure": 0,
+            "llm_checks": 0,
+            "last_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+
+    # --- LIFECYCLE ---
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    # --- PRODUCER SIDE ---
+    def submit(self, email, agent, message, history):
+        """
+        Queue an assessment. `history` must be a snapshot (a copy) of
+        agent.chat_history, the session keeps mutating its own list while the
+        job waits. The user context is added here (agent.prompt_messages).
+        """
+        self.seq += 1
+        self.stats["submitted"] += 1
+        if email in self.pending:
+            self.stats["superseded"] += 1
+        else:
+            self.queue.put_nowait(email)
+        self.pending[email] = {
+            "seq": self.seq,
+            "agent": agent,
+            "message": message,
+            "history": history,
+            "queued_at": time.monotonic(),
+        }
+
+    def status(self, email):
+        entry = self.profiles.get(email, {})
+        return {
+            "email": email,
+            "profile": entry.get("profile"),
+            "version": entry.get("version", 0),
+            "pending": email in self.pending,
+        }
+
+    async def wait_for_update(self, email, since, timeout):
+        """Long-poll helper: waits until the profile version moves past `since`."""
+        async with self.changed:
+            try:
+                await asyncio.wait_for(
+                    self.changed.wait_for(lambda: self.status(email)["version"] > since),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                pass
+        return self.status(email)
+
+    def metrics(self):
+        now = time.monotonic()
+        oldest = min((job["queued_at"] for job in self.pending.values()), default=None)
+        return {
+            "queue_depth": len(self.pending),
+            "oldest_pending_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+            "workers": len(self.tasks),
+            **self.stats,
+        }
+
+    # --- CONSUMER SIDE ---
+    async def _run(self):
+        while True:
+            email = await self.queue.get()
+            job = self.pending.pop(email, None)
+            try:
+                if job:
+                    await self._assess(email, job)
+            finally:
+                self.queue.task_done()
+
+    async def _assess(self, email, job):
+        agent = job["agent"]
+        history = job["history"]
+        try:
+            # Step A: Filter for relevant info
+            if await self._is_relevant(agent, history, job["message"]):
+                # Step B: Create Database Entry
+                with span("vibe_assess"):
+                    summary_response = await agent.ainvoke(agent.prompt_messages(history) + [ASSESSMENT_PROMPT])
+                new_vibe = summary_response.content.replace('"', '').strip()
+                await self._publish(email, job["seq"], new_vibe)
+
+            self.stats["processed"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"Failed to update vibe: {e}")
+        finally:
+            lag = time.monotonic() - job["queued_at"]
+            self.stats["last_lag_seconds"] = round(lag, 3)
+            self.stats["max_lag_seconds"] = max(self.stats["max_lag_seconds"], round(lag, 3))
+
+    async def _is_relevant(self, agent, history, message):
+        """
+        Does the message say anything about the user's taste? The local gate
+        answers when it is confident; otherwise (and for a small shadow
+        sample, to keep labels coming) the LLM decides.
+        """
+        decision, p = self.gate.decide(message) if self.gate else (None, None)
+        if self.gate:
+            self.stats[{True: "gate_yes", False: "gate_no", None: "gate_unsure"}[decision]] += 1
+            if decision is not None and not self.gate.shadow():
+                await self._log_gate(message, p, decision)
+                return decision
+
+        # Without the last reply, as before; the user context stays at the tail
+        check_messages = agent.prompt_messages(history[:-1]) + [build_vibe_check_prompt(message)]
+        start = time.perf_counter()
+        with span("vibe_check"):
+            check_response = await agent.ainvoke(check_messages)
+        self.stats["llm_checks"] += 1
+        relevant = "YES" in check_response.content.strip().upper()
+        if self.gate:
+            usage = getattr(check_response, "usage_metadata", None) or {}
+            await self._log_gate(message, p, decision, "YES" if relevant else "NO",
+                                 round((time.perf_counter() - start) * 1000), usage.get("input_tokens"))
+        return relevant
+
+    async def _log_gate(self, *row):
+        # File I/O, keep it off the event loop
+        if self.gate.log_path:
+            await asyncio.to_thread(self.gate.log, *row)
+
+    async def _publish(self, email, seq, new_vibe):
+        current = self.profiles.get(email)
+        # Two workers can race on the same user; never let an older turn win
+        if current and current["seq"] > seq:
+            return
+
+        with span("profile_save"):
+            self.save_profile(email, new_vibe)
+        self.stats["updated"] += 1
+        async with self.changed:
+            self.profiles[email] = {
+                "profile": new_vibe,
+                "version": (current["version"] if current else 0) + 1,
+                "seq": seq,
+                "updated_at": time.time(),
+            }
+            self.changed.notify_all()
+        print(f"Profile Updated: {new_vibe}")